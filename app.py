@@ -1,10 +1,31 @@
 import streamlit as st
-import pandas as pd
+import datetime
 import os
+import subprocess
+import sys
 
 # --- Import Your Existing Modules ---
-from modules import prompt_orchestrator, generate_content, post_processor, article_storage_manager
-from modules.wordpress_publisher import create_wordpress_post, upload_image_to_wordpress
+from modules import (
+    prompt_orchestrator,
+    generate_content_stream,
+    StreamingPostProcessor,
+    article_storage_manager,
+)
+from modules.bulk_jobs import BulkJobManager
+from modules.export import FORMATS, export_database, export_file_name
+from modules.search import get_article_search
+from modules.publish_outbox import get_publish_outbox
+from modules.storage import PublishRequest, get_article, get_article_catalog
+from modules.topic_source import iter_topics, preview_rows, read_columns
+
+PUBLISHER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "publisher.py")
+
+
+@st.cache_resource
+def publisher_daemon() -> dict:
+    """The publisher daemon started from this server process, if any; shared by all sessions."""
+    return {"process": None}
+
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -21,21 +42,26 @@ st.markdown("Your AI-powered content creation and publishing assistant.")
 with st.sidebar:
     # --- NEW: Download Database Section ---
     st.header("Export Data")
-    db_file_path = 'articles.db'  # Assuming the DB is in the root directory
-    # Check if the database file exists before showing the button
-    if os.path.exists(db_file_path):
-        # Read the file content in binary mode
-        with open(db_file_path, 'rb') as f:
-            db_bytes = f.read()
-
-        st.download_button(
-            label="Download articles.db",
-            data=db_bytes,
-            file_name="articles.db",
-            mime="application/octet-stream"  # A generic mime type for binary files
-        )
-    else:
-        st.info("No database file found. Generate an article first to create it.")
+    # Exports are built on request from a consistent snapshot and reused until
+    # the database changes, so reruns never read the database file.
+    export_format = st.selectbox("Format", list(FORMATS), format_func=lambda fmt: FORMATS[fmt][1])
+    if st.button("Prepare export"):
+        with st.spinner("Preparing export..."):
+            st.session_state["export_path"] = export_database(export_format)
+        if st.session_state["export_path"] is None:
+            st.info("No database file found. Generate an article first to create it.")
+
+    # Offered once per prepared export; the file is only read for that run
+    export_path = st.session_state.pop("export_path", None)
+    if export_path:
+        with open(export_path, "rb") as f:
+            st.download_button(
+                label=f"Download {export_file_name(export_path)}",
+                data=f,
+                file_name=export_file_name(export_path),
+                mime=FORMATS[export_format][0],
+                on_click="ignore",
+            )
 
     st.markdown("---")  # Visual separator
 
@@ -58,8 +84,75 @@ with st.sidebar:
 
     # --- END of new section ---
 
+    st.markdown("---")
+
+    # --- Publisher: articles to publish wait in the outbox until the daemon posts them ---
+    st.header("Publishing")
+    outbox_counts = get_publish_outbox().counts()
+    st.caption(f"{outbox_counts.get('pending', 0) + outbox_counts.get('leased', 0)} articles waiting, "
+               f"{outbox_counts.get('done', 0)} published, {outbox_counts.get('failed', 0)} failed.")
+    daemon = publisher_daemon()
+    if daemon["process"] is not None and daemon["process"].poll() is None:
+        st.success(f"Publisher daemon running (pid {daemon['process'].pid}).")
+        if st.button("Stop publisher daemon"):
+            daemon["process"].terminate()  # finishes the batches in flight
+            st.rerun()
+    else:
+        st.caption("Start it here with the credentials above, or run `python publisher.py` with them in `.env`.")
+        if st.button("Start publisher daemon", disabled=not all([wp_url, wp_user, wp_password])):
+            # A process of its own, inheriting the credentials set above; it outlives this session
+            daemon["process"] = subprocess.Popen([sys.executable, PUBLISHER_SCRIPT], env=dict(os.environ))
+            st.rerun()
+    if outbox_counts.get("failed") and st.button("Retry failed publications"):
+        get_publish_outbox().retry_failed()
+        st.rerun()
+
+# --- Background Bulk Jobs ---
+@st.cache_resource
+def get_bulk_manager() -> BulkJobManager:
+    """One executor per server process, shared by all sessions and kept across reruns."""
+    return BulkJobManager()
+
+
+@st.fragment(run_every=2)
+def show_bulk_job(job_id: str):
+    job = get_bulk_manager().get(job_id)
+    if job is None:
+        st.info("This job is no longer available.")
+        return
+    progress = job.snapshot()
+    finished = progress["done"] + progress["failed"] + progress["duplicates"]
+
+    st.progress(finished / progress["total"] if progress["total"] else 1.0)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Status", progress["state"].capitalize())
+    col2.metric("Done", f"{progress['done']} / {progress['total']}")
+    col3.metric("Failed / duplicates", f"{progress['failed']} / {progress['duplicates']}")
+    col4.metric("Throughput", f"{progress['throughput']:.2f} articles/s")
+    limits = progress["concurrency"]
+    st.caption(f"Gemini concurrency limit: {limits['limit']} (adaptive), {limits['in_flight']} requests in flight, "
+               f"{limits['waiting']} waiting, {limits['throttled']} throttled so far.")
+    if progress["error"]:
+        st.error(f"Job crashed: {progress['error']}")
+
+    if progress["state"] in ("queued", "running"):
+        if st.button("Cancel job", key=f"cancel_{job_id}"):
+            job.cancel()
+            st.warning("Cancelling: no new topics are started, articles in flight are finished.")
+
+    with st.expander("Results", expanded=True):
+        for topic, (state, title, error) in progress["results"].items():
+            if state == "failed":
+                st.error(f"❌ **{topic}**: Failed with error - {error}")
+            elif state == "duplicate":
+                st.warning(f"⏭️ **{topic}**: Skipped, {error}.")
+            elif state in ("stored", "published"):
+                done = "Stored and queued for publishing" if progress["publish"] else state.capitalize()
+                st.markdown(f"✅ **{topic}**: {done} '{title}'.")
+
+
 # --- Main Content Area with Tabs ---
-tab1, tab2 = st.tabs(["Single Topic Generation", "Excel Bulk Processing"])
+tab1, tab2, tab3, tab4 = st.tabs(["Single Topic Generation", "Excel Bulk Processing", "Search Articles", "History"])
 
 # (The rest of your code for the tabs remains exactly the same)
 # ...
@@ -68,121 +161,179 @@ with tab1:
     st.header("Generate a Single Article")
 
     topic = st.text_input("Enter the main topic or keyword", placeholder="e.g., 'Benefits of Solar Energy'")
-    publish_to_wp = st.checkbox("Publish directly to WordPress", key="single_publish")
+    publish_to_wp = st.checkbox("Publish to WordPress", key="single_publish")
+    publish_at = None
+    if publish_to_wp and st.checkbox("Schedule for later", key="single_schedule"):
+        col1, col2 = st.columns(2)
+        publish_day = col1.date_input("Publish on", key="single_publish_day")
+        publish_time = col2.time_input("at", key="single_publish_time")
+        publish_at = datetime.datetime.combine(publish_day, publish_time).timestamp()
 
     generate_button = st.button("Generate Article")
 
     if generate_button and topic:
-        # Check for credentials if publishing
-        if publish_to_wp and not all([wp_url, wp_user, wp_password]):
-            st.error("Please provide all WordPress credentials in the sidebar to publish.")
-        else:
-            with st.spinner("Generating content... Please wait."):
-                try:
-                    # 1. Generate Content
-                    prompt = prompt_orchestrator(topic)
-                    raw_content = generate_content(prompt)
-                    title, html_content = post_processor(raw_content)
-
-                    # 2. Store in Database
-                    article_storage_manager(title, html_content, topic)
+        with st.spinner("Generating content... Please wait."):
+            try:
+                # 1. Stream the content: the title and finished sections render as they arrive
+                prompt = prompt_orchestrator(topic)
+                with st.container(border=True):
+                    title_placeholder = st.empty()
+                    body_placeholder = st.empty()
+                    caption_placeholder = st.empty()
+
+                    stream = StreamingPostProcessor()
+                    preview_sections = []
+                    # Pressing the button again asks for a new article, not the cached one
+                    for chunk in generate_content_stream(prompt, use_cache=False):
+                        new_title, sections = stream.feed(chunk)
+                        if new_title:
+                            title_placeholder.subheader(new_title)
+                        if sections:
+                            preview_sections.extend(sections)
+                            body_placeholder.markdown("\n".join(preview_sections), unsafe_allow_html=True)
+
+                    # 2. Replace the preview with the final, fully post-processed article
+                    title, html_content = stream.finish()
+                    title_placeholder.subheader(title)
+                    body_placeholder.markdown(html_content, unsafe_allow_html=True)
+                    caption_placeholder.caption(f"Word Count: {len(html_content.split())}")
+
+                # 3. Store in Database, queued for the publisher daemon in the same transaction if publishing
+                publish = None
+                if publish_to_wp:
+                    # NOTE: Hardcoded image path from your original code.
+                    # Consider adding a file uploader for this in the future.
+                    image_path = "/home/runner/workspace/font.PNG" # Adjust the location or link of your image here
+                    publish = PublishRequest("publish", image_path if os.path.exists(image_path) else None, publish_at)
+                article_id = article_storage_manager(title, html_content, topic, publish)
+                if not article_id:
+                    st.error("The article could not be stored.")
+                elif publish is None:
                     st.success("Article generated and stored in the database!")
+                elif publish_at:
+                    st.success(f"Article stored and scheduled for publishing on "
+                               f"{datetime.datetime.fromtimestamp(publish_at):%Y-%m-%d %H:%M}.")
+                else:
+                    st.success("Article stored and queued for publishing; the publisher daemon posts it shortly.")
 
-                    # 3. Display Result
-                    with st.container(border=True):
-                        st.subheader(title)
-                        st.markdown(html_content, unsafe_allow_html=True)
-                        st.caption(f"Word Count: {len(html_content.split())}")
-
-                    # 4. Publish to WordPress
-                    if publish_to_wp:
-                        with st.spinner("Publishing to WordPress..."):
-                            try:
-                                # NOTE: Hardcoded image path from your original code.
-                                # Consider adding a file uploader for this in the future.
-                                image_path = "/home/runner/workspace/font.PNG" # Adjust the location or link of your image here
-                                featured_media_id = None
-                                if os.path.exists(image_path):
-                                    featured_media_id = upload_image_to_wordpress(image_path, title)
-
-                                success = create_wordpress_post(title, html_content, "publish", featured_media_id)
-                                if success:
-                                    st.success("✅ Successfully published to WordPress!")
-                                else:
-                                    st.error("❌ Failed to publish to WordPress.")
-                            except Exception as wp_error:
-                                st.error(f"WordPress publishing error: {wp_error}")
-
-                except Exception as e:
-                    st.error(f"An error occurred during generation: {e}")
+            except Exception as e:
+                st.error(f"An error occurred during generation: {e}")
 
 # --- Excel Bulk Processing Tab ---
 with tab2:
     st.header("Generate Articles in Bulk from Excel")
 
-    uploaded_file = st.file_uploader("Upload an Excel file (.xlsx, .xls)", type=["xlsx", "xls"])
+    uploaded_file = st.file_uploader("Upload a topics file (.xlsx, .csv, .jsonl)", type=["xlsx", "csv", "jsonl"])
 
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file)
-            st.success(f"Successfully uploaded `{uploaded_file.name}` with {len(df)} rows.")
+            # Only the first rows are read here; topics are streamed when processing starts
+            columns = read_columns(uploaded_file)
+            st.success(f"Successfully uploaded `{uploaded_file.name}`.")
 
             with st.expander("Preview Data", expanded=True):
-                st.dataframe(df.head())
+                st.dataframe(preview_rows(uploaded_file, 5))
 
             # Column selection
-            column_name = st.selectbox("Select the column containing the topics:", df.columns)
+            column_name = st.selectbox("Select the column containing the topics:", columns)
 
             publish_bulk_to_wp = st.checkbox("Publish all articles to WordPress", key="bulk_publish")
 
             process_button = st.button("Generate All Articles from Excel")
 
             if process_button:
-                if publish_bulk_to_wp and not all([wp_url, wp_user, wp_password]):
-                    st.error("Please provide all WordPress credentials in the sidebar to publish.")
-                else:
-                    topics = df[column_name].dropna().tolist()
-                    st.info(f"Starting to process {len(topics)} topics...")
-
-                    results_container = st.container()
-                    progress_bar = st.progress(0)
-
-                    for i, topic in enumerate(topics):
-                        try:
-                            # 1. Generate
-                            prompt = prompt_orchestrator(topic)
-                            raw_content = generate_content(prompt)
-                            title, html_content = post_processor(raw_content)
-
-                            # 2. Store
-                            article_storage_manager(title, html_content, topic)
-
-                            result_msg = f"✅ **{topic}**: Generated '{title}' ({len(html_content.split())} words)."
-
-                            # 3. Publish
-                            if publish_bulk_to_wp:
-                                try:
-                                    # NOTE: Using the same hardcoded image path
-                                    image_path = "/home/runner/workspace/font.PNG"
-                                    featured_media_id = None
-                                    if os.path.exists(image_path):
-                                        featured_media_id = upload_image_to_wordpress(image_path, title)
-
-                                    success = create_wordpress_post(title, html_content, "publish", featured_media_id)
-                                    if success:
-                                        result_msg += " Published to WordPress."
-                                    else:
-                                        result_msg += " WP publishing failed."
-                                except Exception as wp_e:
-                                    result_msg += f" WP Error: {wp_e}"
-
-                            results_container.markdown(result_msg)
-
-                        except Exception as e:
-                            results_container.error(f"❌ **{topic}**: Failed with error - {e}")
-
-                        # Update progress bar
-                        progress_bar.progress((i + 1) / len(topics))
+                topics = list(iter_topics(uploaded_file, column_name))
+                # NOTE: Using the same hardcoded image path
+                image_path = "/home/runner/workspace/font.PNG"
+                # The job runs in the background; reruns and other tabs do not interrupt it.
+                # Articles to publish are queued for the publisher daemon as they are stored.
+                st.session_state["bulk_job_id"] = get_bulk_manager().submit(
+                    topics, publish_bulk_to_wp, image_path if os.path.exists(image_path) else None)
+                st.info(f"Started processing {len(topics)} topics in the background.")
 
         except Exception as e:
-            st.error(f"Error processing Excel file: {e}")
\ No newline at end of file
+            st.error(f"Error processing Excel file: {e}")
+
+    # --- Background jobs: progress of the selected job, refreshed without rerunning the page ---
+    bulk_jobs = get_bulk_manager().jobs()
+    if bulk_jobs:
+        st.markdown("---")
+        job_ids = [job.job_id for job in bulk_jobs]
+        current = st.session_state.get("bulk_job_id")
+        st.session_state["bulk_job_id"] = st.selectbox(
+            "Bulk job", job_ids, index=job_ids.index(current) if current in job_ids else 0)
+        show_bulk_job(st.session_state["bulk_job_id"])
+
+# --- Search Tab ---
+with tab3:
+    st.header("Search Stored Articles")
+    st.markdown("Check whether a subject is already covered before generating it again.")
+
+    query = st.text_input("Search titles, topics and content", placeholder="e.g., 'solar panels'")
+    if query:
+        try:
+            search = get_article_search()
+            results = search.search(query, limit=20)
+            st.caption(f"{search.count(query)} matching articles, best 20 shown.")
+            for result in results:
+                with st.expander(f"{result['title']}  ·  {result['topic']}  ·  {result['published_at']}"):
+                    st.markdown(result["snippet"].replace("[[", "**").replace("]]", "**"))
+                    if st.checkbox("Show full article", key=f"search_full_{result['id']}"):
+                        article = get_article(result["id"])
+                        if article:
+                            st.markdown(article[1], unsafe_allow_html=True)
+            if not results:
+                st.info("No stored article matches this search.")
+        except Exception as e:
+            st.error(f"Search failed: {e}")
+
+# --- History Tab ---
+with tab4:
+    st.header("Stored Articles")
+    st.markdown("Browse everything stored so far, newest first.")
+
+    col1, col2, col3, col4 = st.columns([3, 2, 3, 1])
+    with col1:
+        history_topic = st.text_input("Topic (exact)", key="history_topic").strip() or None
+    with col2:
+        history_status = {"All": None, "Stored only": "stored", "Published": "published"}[
+            st.selectbox("Status", ["All", "Stored only", "Published"], key="history_status")]
+    with col3:
+        history_dates = st.date_input("Stored between", value=(), key="history_dates")
+    with col4:
+        page_size = st.selectbox("Per page", [25, 50, 100], key="history_page_size")
+
+    since = until = None
+    if len(history_dates) == 2:
+        since, until = history_dates[0], history_dates[1] + datetime.timedelta(days=1)
+    filters = {"topic": history_topic, "since": since, "until": until, "status": history_status}
+
+    # One cursor per page visited, so "Previous" can go back; new filters start over
+    if st.session_state.get("history_filters") != (filters, page_size):
+        st.session_state["history_filters"] = (filters, page_size)
+        st.session_state["history_cursors"] = [None]
+    cursors = st.session_state["history_cursors"]
+
+    try:
+        catalog = get_article_catalog()
+        articles, next_cursor = catalog.page(**filters, limit=page_size, after=cursors[-1])
+        st.caption(f"{catalog.count(**filters)} articles · page {len(cursors)}")
+        for article in articles:
+            status = f"published (post {article['post_id']})" if article["post_id"] else article["status"]
+            with st.expander(f"{article['title']}  ·  {article['topic']}  ·  {article['published_at']}  ·  {status}"):
+                if st.checkbox("Show full article", key=f"history_full_{article['id']}"):
+                    stored = get_article(article["id"])
+                    if stored:
+                        st.markdown(stored[1], unsafe_allow_html=True)
+        if not articles:
+            st.info("No stored article matches these filters.")
+
+        prev_col, next_col = st.columns(2)
+        if prev_col.button("← Previous", disabled=len(cursors) == 1, key="history_prev"):
+            cursors.pop()
+            st.rerun()
+        if next_col.button("Next →", disabled=next_cursor is None, key="history_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+    except Exception as e:
+        st.error(f"Could not load the article history: {e}")
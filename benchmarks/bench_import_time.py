@@ -0,0 +1,164 @@
+# File: benchmarks/bench_import_time.py
+"""
+Measures how long the entry points take to import in a fresh interpreter
+(what a worker process or a restarted Streamlit server pays before doing any
+work) and what the imports cost a Streamlit rerun once they are loaded.
+
+    python benchmarks/bench_import_time.py [--runs 5] [--reruns 1000] [--top 10]
+
+Each cold start runs in a new subprocess; the best and median of --runs are
+reported, with whether google.generativeai got imported. --top lists the
+modules with the largest cumulative import time (python -X importtime) for
+the app's imports. If streamlit is installed, full runs of app.py are also
+timed with streamlit's AppTest.
+"""
+
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT, "app.py")
+HEAVY_MODULES = ("google.generativeai", "requests", "httpx", "dotenv", "openpyxl", "pandas")
+
+
+def app_imports(path: str = APP_FILE, skip: tuple[str, ...] = ()) -> str:
+    """The top-level import statements of app.py, which run again on every rerun."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias for alias in node.names if alias.name.split(".")[0] not in skip]
+            if names:
+                lines.append(ast.unparse(ast.Import(names=names)))
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] not in skip:
+            lines.append(ast.unparse(node))
+    return "\n".join(lines)
+
+
+def _installed(module: str) -> bool:
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, capture_output=True)
+    return result.returncode == 0
+
+
+def cold_start(code: str, runs: int) -> tuple[list[float], list[str]]:
+    """Seconds to run `code` in `runs` fresh interpreters, and the heavy modules it loaded."""
+    probe = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"exec({code!r})\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"'{code}' failed:\n{result.stderr.strip()}")
+        elapsed, _, modules = result.stdout.strip().splitlines()[-1].partition(" ")
+        timings.append(float(elapsed))
+        loaded = [m for m in modules.split(",") if m]
+    return timings, loaded
+
+
+def rerun_overhead(code: str, reruns: int) -> float:
+    """Seconds the import statements cost per rerun once every module is loaded."""
+    probe = (
+        "import time\n"
+        f"code = compile({code!r}, 'app.py', 'exec')\n"
+        "exec(code, {})\n"
+        "started = time.perf_counter()\n"
+        f"for _ in range({reruns}):\n"
+        "    exec(code, {})\n"
+        f"print((time.perf_counter() - started) / {reruns})\n"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def top_imports(code: str, count: int) -> list[tuple[int, str]]:
+    """The `count` modules with the largest cumulative import time, in microseconds."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def app_runs(reruns: int) -> tuple[float, float]:
+    """Seconds for the first run of app.py and the median of the following reruns (needs streamlit)."""
+    probe = (
+        "import statistics, time\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "started = time.perf_counter()\n"
+        f"app = AppTest.from_file({APP_FILE!r}, default_timeout=60).run()\n"
+        "first = time.perf_counter() - started\n"
+        "timings = []\n"
+        f"for _ in range({reruns}):\n"
+        "    started = time.perf_counter()\n"
+        "    app.run()\n"
+        "    timings.append(time.perf_counter() - started)\n"
+        "print(first, statistics.median(timings))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    first, rerun = result.stdout.strip().splitlines()[-1].split()
+    return float(first), float(rerun)
+
+
+def _report(label: str, timings: list[float], loaded: list[str]):
+    print(f"{label:<34} best {min(timings) * 1000:7.1f} ms   median {statistics.median(timings) * 1000:7.1f} ms   "
+          f"heavy: {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start and per-rerun import cost of the entry points.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per cold start")
+    parser.add_argument("--reruns", type=int, default=1000, help="repetitions for the per-rerun overhead")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list (0 to skip)")
+    args = parser.parse_args()
+
+    has_streamlit = _installed("streamlit")
+    # Without streamlit the rest of app.py's imports are still measured
+    app_code = app_imports(skip=() if has_streamlit else ("streamlit",))
+    entry_points = {
+        "python (empty interpreter)": "pass",
+        "import modules": "import modules",
+        "import modules.storage": "import modules.storage",
+        "worker.py": "import worker",
+        "main.py": "import main",
+        "main_sync.py": "import main_sync",
+        "coordinator.py": "import coordinator",
+        "app.py imports": app_code,
+        "first Gemini client (get_model)": "import os\nos.environ.setdefault('GOOGLE_API_KEY', 'benchmark')\n"
+                                           "from modules.generation import get_model\nget_model()",
+    }
+
+    print(f"--- Cold start, {args.runs} fresh interpreters each ---")
+    for label, code in entry_points.items():
+        try:
+            _report(label, *cold_start(code, args.runs))
+        except RuntimeError as e:
+            print(f"{label:<34} skipped: {str(e).splitlines()[-1]}")
+
+    print(f"\n--- Per rerun, once loaded ({args.reruns} repetitions) ---")
+    print(f"app.py imports                     {rerun_overhead(app_code, args.reruns) * 1e6:7.1f} µs")
+    if has_streamlit:
+        first, rerun = app_runs(min(args.reruns, 20))
+        print(f"app.py first run (AppTest)         {first * 1000:7.1f} ms")
+        print(f"app.py rerun (AppTest, median)     {rerun * 1000:7.1f} ms")
+    else:
+        print("streamlit is not installed: full app.py runs not measured.")
+
+    if args.top:
+        print("\n--- Slowest imports of app.py (cumulative) ---")
+        for cumulative, name in top_imports(app_code, args.top):
+            print(f"{cumulative / 1000:8.1f} ms  {name}")
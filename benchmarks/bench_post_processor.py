@@ -0,0 +1,139 @@
+# File: benchmarks/bench_post_processor.py
+"""
+Checks that post_processor gives the same output as the original multi-regex
+implementation and measures the per-article cost of both.
+
+    python benchmarks/bench_post_processor.py [--articles 2000] [--from-cache response_cache.db]
+
+--from-cache adds every raw model answer stored in the response cache to the corpus.
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.processing import post_processor  # noqa: E402
+
+
+def legacy_post_processor(raw_text: str) -> tuple[str | None, str | None]:
+    """The post_processor as it was before the single-pass rewrite, kept verbatim as the reference."""
+    if not raw_text:
+        return None, None
+    cleaned_text = raw_text.strip()
+    if cleaned_text.startswith('```'):
+        cleaned_text = re.sub(r'^```(html)?\n', '', cleaned_text)
+        cleaned_text = re.sub(r'\n```$', '', cleaned_text)
+    cleaned_text = cleaned_text.replace("<body>", "").replace("</body>", "")
+    cleaned_text = cleaned_text.replace("<html>", "").replace("</html>", "")
+    title_match = re.search(r'<h1.*?>(.*?)</h1>', cleaned_text, re.IGNORECASE | re.DOTALL)
+    if title_match:
+        title_text = re.sub('<[^<]+?>', '', title_match.group(1))
+        title = title_text.strip()
+    else:
+        h2_match = re.search(r'<h2.*?>(.*?)</h2>', cleaned_text, re.IGNORECASE | re.DOTALL)
+        if h2_match:
+            title_text = re.sub('<[^<]+?>', '', h2_match.group(1))
+            title = title_text.strip()
+        else:
+            p_match = re.search(r'<p.*?>(.*?)</p>', cleaned_text, re.IGNORECASE | re.DOTALL)
+            if p_match:
+                title_text = re.sub('<[^<]+?>', '', p_match.group(1))
+                title = title_text.strip()[:50] + "..." if len(title_text.strip()) > 50 else title_text.strip()
+            else:
+                text_content = re.sub('<[^<]+?>', '', cleaned_text)
+                lines = [line.strip() for line in text_content.split('\n') if line.strip()]
+                if lines:
+                    title = lines[0][:50] + "..." if len(lines[0]) > 50 else lines[0]
+                else:
+                    title = "Untitled Article"
+    content_without_h1 = re.sub(r'<h1.*?>.*?</h1>', '', cleaned_text, flags=re.IGNORECASE | re.DOTALL)
+    if not title_match and h2_match:
+        content_without_h1 = re.sub(r'<h2.*?>.*?</h2>', '', content_without_h1, flags=re.IGNORECASE | re.DOTALL)
+    full_html_content = content_without_h1.strip()
+    if not full_html_content:
+        return None, None
+    return title, full_html_content
+
+
+WORDS = ("solar energy panels efficiency homeowners savings install grid battery storage "
+         "climate incentives roof maintenance warranty inverter sunlight cost return").split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+
+def _article(rng: random.Random) -> str:
+    """A ~600 word answer shaped like the ones the prompt asks for, with the usual model quirks."""
+    parts = []
+    heading = rng.choice(["h1", "h1", "h1", "H1", "h2", None])
+    if heading:
+        parts.append(f'<{heading} class="title">The <em>Complete</em> Guide to {rng.choice(WORDS).title()}</{heading}>')
+    parts.append(f"<p>{_sentence(rng)} {_sentence(rng)}</p>")
+    for _ in range(rng.randint(3, 5)):
+        parts.append(f"<h2>{_sentence(rng)[:40]}</h2>")
+        parts.append(f"<p>{_sentence(rng)} {_sentence(rng)} {_sentence(rng)}</p>")
+        if rng.random() < 0.5:
+            parts.append(f"<h3>{_sentence(rng)[:30]}</h3>")
+            parts.append("<ul>" + "".join(f"<li>{_sentence(rng)}</li>" for _ in range(4)) + "</ul>")
+    parts.append(f"<h2>Conclusion</h2><p>{_sentence(rng)} <strong>{_sentence(rng)}</strong></p>")
+    body = "\n".join(parts)
+    if rng.random() < 0.3:
+        body = f"<html><body>\n{body}\n</body></html>"
+    if rng.random() < 0.3:
+        body = f"```{rng.choice(['html', ''])}\n{body}\n```"
+    return body
+
+
+def build_corpus(count: int, cache_file: str | None) -> list[str]:
+    rng = random.Random(42)
+    corpus = [_article(rng) for _ in range(count)]
+    corpus += ["", "   ", "Just a line of text\nand another", "<p>short</p>", "<h1>Only a title</h1>",
+               "<h1>unterminated", "```html\n<h2>Fenced</h2><p>x</p>\n```", "<BODY><H1>Caps</H1><p>y</p></BODY>"]
+    if cache_file:
+        conn = sqlite3.connect(cache_file)
+        corpus += [row[0] for row in conn.execute("SELECT response FROM responses")]
+        conn.close()
+    return corpus
+
+
+def time_per_article(function, corpus: list[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in corpus:
+            function(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=2000, help="number of synthetic articles")
+    parser.add_argument("--rounds", type=int, default=5, help="timing rounds, the best one is reported")
+    parser.add_argument("--from-cache", metavar="DB", help="also use the raw answers stored in this response cache")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.articles, args.from_cache)
+
+    mismatches = [text for text in corpus if post_processor(text) != legacy_post_processor(text)]
+    if mismatches:
+        print(f"FAILED: {len(mismatches)} of {len(corpus)} samples differ from the original output.")
+        print(repr(mismatches[0][:300]))
+        sys.exit(1)
+    print(f"Output identical on {len(corpus)} samples.")
+
+    legacy = time_per_article(legacy_post_processor, corpus, args.rounds)
+    current = time_per_article(post_processor, corpus, args.rounds)
+    print(f"legacy post_processor:  {legacy * 1e6:8.1f} us/article")
+    print(f"current post_processor: {current * 1e6:8.1f} us/article ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# File: benchmarks/fake_servers.py
+"""
+Local stand-ins for the Gemini REST API and the WordPress REST API, used by
+the load tests so they never spend quota or touch a real site.
+
+    python benchmarks/fake_servers.py --gemini-port 8765 --wp-port 8766 --latency 0.8
+
+Point the app at them with:
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 GEMINI_TRANSPORT=rest WP_URL=http://127.0.0.1:8766
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_GENERATE_PATH = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+
+class Behaviour:
+    """Latency and failure injection shared by both servers."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: int = 1, seed: int | None = None,
+                 capacity: int | None = None, batch_limit: int | None = 25):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        # Like a quota: requests beyond `capacity` in flight at once get a 429
+        self.capacity = capacity
+        # WordPress: requests accepted per /batch/v1 call; None for a site without the endpoint (before 5.6)
+        self.batch_limit = batch_limit
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Passed to the server process by load_test.py; the lock is recreated there
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        """Counts a request as in flight; False if that exceeds the capacity."""
+        with self._lock:
+            if self.capacity is not None and self.in_flight >= self.capacity:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self._random.gauss(self.latency, self.jitter) if self.jitter else self.latency)
+
+    def failure(self) -> int | None:
+        """Returns 429 or 500 for an injected failure, None for a normal answer."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+def fake_article(topic: str, words: int = 600) -> str:
+    """An answer shaped like a real one: h1 title, intro, h2 sections, a list and a conclusion."""
+    filler = ("practical guide readers benefit strategy example results planning budget quality "
+              "experience simple effective approach common mistakes tips long term value").split()
+    rng = random.Random(topic)
+
+    def sentence():
+        return " ".join(rng.choice(filler) for _ in range(rng.randint(10, 18))).capitalize() + "."
+
+    parts = [f"<h1>{topic}: A Complete Guide</h1>", f"<p>{sentence()} {sentence()}</p>"]
+    count = 30
+    section = 1
+    while count < words:
+        parts.append(f"<h2>Section {section}: {sentence()[:40]}</h2>")
+        parts.append(f"<p>{sentence()} {sentence()} {sentence()}</p>")
+        parts.append("<ul>" + "".join(f"<li>{sentence()}</li>" for _ in range(3)) + "</ul>")
+        count += 100
+        section += 1
+    parts.append(f"<h2>Conclusion</h2><p>{sentence()} Start today.</p>")
+    return "\n".join(parts)
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    behaviour: Behaviour
+
+    def log_message(self, format, *args):
+        pass  # the load test prints its own report
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, payload, headers: dict | None = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _injected_failure(self) -> bool:
+        if not self.behaviour.enter():
+            status = 429
+        else:
+            try:
+                time.sleep(self.behaviour.delay())
+                status = self.behaviour.failure()
+            finally:
+                self.behaviour.leave()
+        if status == 429:
+            self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                            "status": "RESOURCE_EXHAUSTED"}},
+                            {"Retry-After": str(self.behaviour.retry_after)})
+            return True
+        if status == 500:
+            self._send_json(500, {"error": {"code": 500, "message": "Internal error.", "status": "INTERNAL"}})
+            return True
+        return False
+
+
+class FakeGeminiHandler(_JSONHandler):
+    """
+    Answers generateContent (and streamGenerateContent as a single SSE event)
+    with a fake article, or with one delimited article per topic for a
+    multi-topic prompt.
+    """
+
+    def do_POST(self):
+        match = _GENERATE_PATH.match(urlparse(self.path).path)
+        body = self._body()
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+        if self._injected_failure():
+            return
+
+        request = json.loads(body or b"{}")
+        prompt = "".join(part.get("text", "") for content in request.get("contents", [])
+                         for part in content.get("parts", []))
+        batch_topics = re.findall(r'Topic (\d+): "(.*?)"', prompt)
+        if batch_topics:  # a multi-topic prompt: answer with delimited short articles
+            text = "\n".join(f"<!-- ARTICLE {number} START -->\n{fake_article(topic, words=300)}\n"
+                             f"<!-- ARTICLE {number} END -->" for number, topic in batch_topics)
+        else:
+            topic_match = re.search(r'Topic: "(.*?)"', prompt)
+            text = fake_article(topic_match.group(1) if topic_match else "Untitled")
+        response = {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                            "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": (len(prompt) + len(text)) // 4},
+        }
+        if match.group("method") == "streamGenerateContent":
+            data = f"data: {json.dumps(response)}\r\n\r\n".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._send_json(200, response)
+
+
+class FakeWordPressHandler(_JSONHandler):
+    """
+    Implements POST /posts, POST /media and GET /media/<id> of /wp-json/wp/v2,
+    and POST /wp-json/batch/v1 for posts (one latency for the whole batch,
+    failures injected per item).
+    """
+
+    _ids = itertools.count(1)
+    _media = set()
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path.endswith("/batch/v1") and self.behaviour.batch_limit is not None:
+            self._batch(json.loads(body or b"{}"))
+            return
+        if self._injected_failure():
+            return
+        with self._lock:
+            new_id = next(self._ids)
+            if path.endswith("/wp/v2/media"):
+                self._media.add(new_id)
+        if path.endswith("/wp/v2/posts") or path.endswith("/wp/v2/media"):
+            self._send_json(201, {"id": new_id, "status": "publish"})
+        else:
+            self._send_json(404, {"code": "rest_no_route", "message": "No route was found."})
+
+    def _batch(self, request: dict):
+        items = request.get("requests", [])
+        if len(items) > self.behaviour.batch_limit:
+            self._send_json(400, {"code": "rest_batch_max_requests",
+                                  "message": f"Batch limit is {self.behaviour.batch_limit} requests."})
+            return
+        if self._injected_failure():
+            return
+        responses = []
+        for item in items:
+            if not item.get("path", "").endswith("/wp/v2/posts"):
+                responses.append({"status": 400, "body": {"code": "rest_batch_not_allowed",
+                                                           "message": "The requested route does not support batch requests."}})
+            elif (status := self.behaviour.failure()) == 429:
+                responses.append({"status": 429, "body": {"code": "rest_too_many_requests",
+                                                           "message": "Injected throttling, nothing was created."}})
+            elif status == 500:
+                # Like a request that failed after saving the post: it exists, the client only sees the error
+                with self._lock:
+                    next(self._ids)
+                responses.append({"status": 500, "body": {"code": "internal_error", "message": "Injected failure."}})
+            else:
+                with self._lock:
+                    new_id = next(self._ids)
+                responses.append({"status": 201, "body": {"id": new_id, "status": "publish"}})
+        self._send_json(207, {"responses": responses})
+
+    def do_GET(self):
+        match = re.search(r"/wp/v2/media/(\d+)$", urlparse(self.path).path)
+        with self._lock:
+            exists = bool(match) and int(match.group(1)) in self._media
+        if exists:
+            self._send_json(200, {"id": int(match.group(1))})
+        else:
+            self._send_json(404, {"code": "rest_post_invalid_id", "message": "Invalid post ID."})
+
+
+def make_server(handler: type, port: int, behaviour: Behaviour) -> ThreadingHTTPServer:
+    handler_class = type(handler.__name__, (handler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    server.daemon_threads = True
+    return server
+
+
+def serve(gemini_port: int, wp_port: int, gemini: Behaviour, wordpress: Behaviour):
+    """Runs both servers until the process is stopped."""
+    servers = [make_server(FakeGeminiHandler, gemini_port, gemini),
+               make_server(FakeWordPressHandler, wp_port, wordpress)]
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gemini-port", type=int, default=8765)
+    parser.add_argument("--wp-port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.8, help="mean Gemini latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="standard deviation of the Gemini latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Gemini requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of Gemini requests answered with 429")
+    parser.add_argument("--capacity", type=int, help="Gemini requests in flight at once before answering 429")
+    parser.add_argument("--wp-latency", type=float, default=0.1, help="mean WordPress latency in seconds")
+    parser.add_argument("--no-wp-batch", action="store_true", help="answer /batch/v1 with 404, like WordPress < 5.6")
+    args = parser.parse_args()
+    print(f"Fake Gemini on http://127.0.0.1:{args.gemini_port}, fake WordPress on http://127.0.0.1:{args.wp_port}")
+    serve(args.gemini_port, args.wp_port,
+          Behaviour(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, capacity=args.capacity),
+          Behaviour(args.wp_latency, args.wp_latency / 4, batch_limit=None if args.no_wp_batch else 25))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# File: benchmarks/load_test.py
+"""
+Offline load test: runs the real pipelines against the local fake Gemini and
+WordPress servers from fake_servers.py and reports throughput, per-stage
+latency percentiles and peak RSS.
+
+    python benchmarks/load_test.py --topics 200 --latency 0.8 --rate-limit-rate 0.02
+
+Scenarios (--scenario, default all):
+    async    main.py's staged pipeline, including the publishing stage
+    sync     main_sync.py's per-topic loop (without its fixed 2 s pause) plus a sync publish
+    publish  bulk publishing of already generated articles, as in the app.py bulk tab
+
+Each scenario runs in a fresh process inside a temporary directory, so
+databases start empty and the RSS figures do not mix.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import Behaviour, fake_article, serve  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Fake server on port {port} did not start.")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def configure_environment(args, gemini_port: int, wp_port: int):
+    """Must run before any `modules` import, which read their settings at import time."""
+    os.environ.update({
+        "GOOGLE_API_KEY": "load-test",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{gemini_port}",
+        "GEMINI_TRANSPORT": "rest",
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_TPM": str(args.tpm),
+        "RESPONSE_CACHE": "0",
+        "WP_URL": f"http://127.0.0.1:{wp_port}",
+        "WP_USER": "load-test",
+        "WP_PASSWORD": "load-test",
+        "GEMINI_CONCURRENCY": str(args.concurrency),
+        "GEMINI_MAX_CONCURRENCY": str(args.max_concurrency),
+        "GENERATION_BATCH_SIZE": str(args.batch_size),
+        "WP_PUBLISH_PARALLELISM": str(args.publish_workers),
+        "WP_BATCH_SIZE": str(args.wp_batch_size),
+    })
+
+
+def summarize(latencies: dict) -> dict:
+    """{stage: (count, p50, p95, p99)} from raw samples."""
+    return {stage: (len(values), percentile(values, 50), percentile(values, 95), percentile(values, 99))
+            for stage, values in latencies.items() if values}
+
+
+def instrumented_summary() -> dict:
+    """
+    {row: (count, p50, p95, p99)} from the app's own metrics: per-stage
+    pipeline latency plus request and storage timings. Percentiles are
+    estimated from histogram buckets.
+    """
+    from modules.metrics import metrics
+
+    rows = {}
+    for name, prefix in (("pipeline_stage_seconds", ""), ("gemini_request_seconds", "gemini "),
+                         ("wordpress_request_seconds", "wp "), ("storage_batch_seconds", "storage batch")):
+        for labels, histogram in metrics.histograms(name).items():
+            label = prefix + " ".join(str(value) for _, value in labels)
+            rows[label.strip()] = (histogram.count, histogram.quantile(0.5), histogram.quantile(0.95),
+                                   histogram.quantile(0.99))
+    return rows
+
+
+def _timed(latencies: dict, stage: str, function, *args):
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        latencies.setdefault(stage, []).append(time.perf_counter() - started)
+
+
+def scenario_async(args, topics: list[str]) -> tuple[int, dict]:
+    from modules.generation import concurrency
+    from modules.pipeline import ContentPipeline, wordpress_batch_publisher
+    from modules.wordpress_publisher import PUBLISH_BATCH_SIZE, AsyncWordPressPublisher
+
+    async def run():
+        async with AsyncWordPressPublisher(max_parallel=args.publish_workers) as publisher:
+            pipeline = ContentPipeline(topics, publisher=wordpress_batch_publisher(publisher),
+                                       publish_workers=args.publish_workers, publish_batch_size=PUBLISH_BATCH_SIZE)
+            stats = await pipeline.run()
+        limits = concurrency.snapshot()
+        print(f"   [load test] Gemini concurrency ended at {limits['limit']} "
+              f"({limits['increases']} increases, {limits['decreases']} decreases, {limits['throttled']} throttled)")
+        return stats["published"], instrumented_summary()
+
+    return asyncio.run(run())
+
+
+def scenario_sync(args, topics: list[str]) -> tuple[int, dict]:
+    from modules import article_storage_manager, generate_content, post_processor, prompt_orchestrator
+    from modules.wordpress_publisher import create_wordpress_post
+
+    latencies = {}
+    done = 0
+    for topic in topics:
+        try:
+            prompt = _timed(latencies, "prompt", prompt_orchestrator, topic)
+            raw_content = _timed(latencies, "generation", generate_content, prompt)
+            title, html_content = _timed(latencies, "processing", post_processor, raw_content)
+            _timed(latencies, "storage", article_storage_manager, title, html_content, topic)
+            if _timed(latencies, "publishing", create_wordpress_post, title, html_content, "publish", None):
+                done += 1
+        except Exception as e:
+            print(f"   [load test] '{topic}' failed: {e}")
+    return done, {**summarize(latencies), **instrumented_summary()}
+
+
+def scenario_publish(args, topics: list[str]) -> tuple[int, dict]:
+    from modules.processing import post_processor
+    from modules.wordpress_publisher import publish_articles
+
+    articles = [post_processor(fake_article(topic)) for topic in topics]
+    post_ids = publish_articles(articles, "publish", None, max_parallel=args.publish_workers)
+    return sum(1 for post_id in post_ids if post_id), instrumented_summary()
+
+
+SCENARIOS = {"async": scenario_async, "sync": scenario_sync, "publish": scenario_publish}
+
+
+def _run_scenario(name: str, args, gemini_port: int, wp_port: int, results):
+    configure_environment(args, gemini_port, wp_port)
+    workdir = tempfile.mkdtemp(prefix=f"cfai-load-{name}-")
+    os.chdir(workdir)
+    topics = [f"Load test topic {i}" for i in range(args.topics)]
+    started = time.perf_counter()
+    completed, rows = SCENARIOS[name](args, topics)
+    elapsed = time.perf_counter() - started
+    results.put((name, completed, elapsed, rows, peak_rss_mb()))
+
+
+def print_report(name: str, completed: int, elapsed: float, rows: dict, rss_mb: float, total: int):
+    print(f"\n=== {name}: {completed}/{total} articles in {elapsed:.2f} s "
+          f"({completed / elapsed if elapsed else 0:.2f} articles/s), peak RSS {rss_mb:.1f} MB ===")
+    print(f"{'stage':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, (count, p50, p95, p99) in rows.items():
+        print(f"{stage:<20}{count:>8}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{p99 * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.8, help="mean fake Gemini latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Gemini requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of Gemini requests failing with 429")
+    parser.add_argument("--wp-latency", type=float, default=0.1, help="mean fake WordPress latency in seconds")
+    parser.add_argument("--capacity", type=int, help="fake Gemini requests in flight at once before it answers 429")
+    parser.add_argument("--concurrency", type=int, default=10, help="initial adaptive Gemini concurrency limit")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="upper bound of the adaptive limit")
+    parser.add_argument("--batch-size", type=int, default=1, help="topics per request in the async scenario")
+    parser.add_argument("--publish-workers", type=int, default=8)
+    parser.add_argument("--wp-batch-size", type=int, default=25, help="posts per WordPress batch request (1: none)")
+    parser.add_argument("--no-wp-batch", action="store_true", help="fake WordPress without the batch endpoint")
+    parser.add_argument("--rpm", type=int, default=100000, help="GEMINI_RPM for the client under test")
+    parser.add_argument("--tpm", type=int, default=10 ** 9, help="GEMINI_TPM for the client under test")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    gemini_port, wp_port = free_port(), free_port()
+    servers = context.Process(
+        target=serve, daemon=True,
+        args=(gemini_port, wp_port,
+              Behaviour(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, capacity=args.capacity),
+              Behaviour(args.wp_latency, args.wp_latency / 4, batch_limit=None if args.no_wp_batch else 25)))
+    servers.start()
+    try:
+        wait_for_port(gemini_port)
+        wait_for_port(wp_port)
+        names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+        for name in names:
+            results = context.Queue()
+            worker = context.Process(target=_run_scenario, args=(name, args, gemini_port, wp_port, results))
+            worker.start()
+            # Read before join: a large result could otherwise block the child on exit
+            result = None
+            while result is None and (worker.is_alive() or not results.empty()):
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+            worker.join()
+            if result is None:
+                print(f"\n=== {name}: crashed (exit code {worker.exitcode}) ===")
+                continue
+            print_report(*result, total=args.topics)
+    finally:
+        servers.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# File: /content_automation/coordinator.py
+
+import argparse
+
+from modules.topic_source import iter_topics
+from modules.work_queue import WORK_QUEUE_URL, open_work_queue
+
+# Topics inserted per transaction, so workers can start claiming while a big sheet is still loading
+ENQUEUE_CHUNK = 1000
+
+
+def enqueue_topics(path: str, column: str, queue: str, url: str = WORK_QUEUE_URL) -> int:
+    """Streams the topics of a sheet into the queue; topics already in it are left alone. Returns how many were new."""
+    work_queue = open_work_queue(url)
+    added = 0
+    chunk = []
+    try:
+        for topic in iter_topics(path, column):
+            chunk.append(topic)
+            if len(chunk) >= ENQUEUE_CHUNK:
+                added += work_queue.enqueue(queue, chunk)
+                chunk = []
+        if chunk:
+            added += work_queue.enqueue(queue, chunk)
+    finally:
+        work_queue.close()
+    return added
+
+
+def print_status(queue: str, url: str = WORK_QUEUE_URL):
+    work_queue = open_work_queue(url)
+    try:
+        counts = work_queue.counts(queue)
+    finally:
+        work_queue.close()
+    total = sum(counts.values())
+    print(f"Queue '{queue}': {total} topics, " + ", ".join(f"{state}: {count}" for state, count in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the shared work queue from a sheet and report its progress.")
+    parser.add_argument("file", nargs="?", default="topics.xlsx", help="Excel, CSV or JSONL file with topics")
+    parser.add_argument("--column", default="Topics", help="column holding the topics (default: %(default)s)")
+    parser.add_argument("--queue", help="queue name (default: file and column, as main.py names its job)")
+    parser.add_argument("--url", default=WORK_QUEUE_URL, help="work queue location (default: %(default)s)")
+    parser.add_argument("--status", action="store_true", help="only print how many topics are in each state")
+    parser.add_argument("--retry-failed", action="store_true", help="put topics that ran out of attempts back")
+    args = parser.parse_args()
+    queue = args.queue or f"{args.file}:{args.column}"
+
+    if args.retry_failed:
+        work_queue = open_work_queue(args.url)
+        try:
+            print(f"Requeued {work_queue.retry_failed(queue)} failed topics.")
+        finally:
+            work_queue.close()
+    elif not args.status:
+        added = enqueue_topics(args.file, args.column, queue, args.url)
+        print(f"Enqueued {added} new topics from {args.file} into '{queue}'.")
+        print(f"Start workers with: python worker.py --queue '{queue}' [--processes N]")
+    print_status(queue, args.url)
@@ -1,91 +1,109 @@
 # File: /content_automation/main.py
 
-import pandas as pd
+import argparse
 import asyncio
 import time
 
 # Import the functions from our new 'content_system' package
-from modules import (
-    generate_content_async,
-    prompt_orchestrator,
-    post_processor,
-    article_storage_manager
-)
-
-def load_topics_from_excel(file_path: str, column_name: str) -> list:
-    """Loads topics from a specified column in an Excel file."""
-    try:
-        df = pd.read_excel(file_path)
-        if column_name not in df.columns:
-            print(f"Error: Column '{column_name}' not found in {file_path}.")
-            return []
-        return df[column_name].dropna().tolist()
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found.")
-        return []
-    except Exception as e:
-        print(f"An error occurred while reading the Excel file: {e}")
-        return []
-
-# --- NEW: Asynchronous Worker Function ---
-async def process_single_topic(topic: str, semaphore: asyncio.Semaphore):
-    """
-    Defines the full async workflow for a single topic, controlled by a semaphore.
-    """
-    async with semaphore: # This will wait until a "slot" is free
-        print(f"Processing topic: '{topic}'")
-
-        # 1. Build the prompt (sync, fast)
-        prompt = prompt_orchestrator(topic)
-
-        # 2. Generate content (async, slow)
-        raw_content = await generate_content_async(prompt, topic)
-        if not raw_content:
-            print(f"Failed to generate content for '{topic}'. Skipping.")
-            return # Exit this task
-
-        # 3. Process and format (sync, fast)
-        title, html_content = post_processor(raw_content)
-
-        # 4. Store the article (sync, fast)
-        # Note: Database writes can be blocking. For extreme scale, you might
-        # use an async database driver, but for now, this is fine.
-        article_storage_manager(title, html_content, topic)
-
-# --- UPDATED: Main function is now async ---
-async def main():
+from modules.dedup import open_dedup_index
+from modules.generation import concurrency
+from modules.job_state import JobTracker
+from modules.metrics import METRICS_PORT, metrics, start_metrics_server
+from modules.pipeline import ContentPipeline, wordpress_batch_publisher
+from modules.response_cache import get_response_cache
+from modules.topic_source import iter_topics
+
+# --- UPDATED: Main function runs the staged pipeline ---
+async def main(resume: bool = False, job_name: str | None = None, metrics_port: int | None = None):
     """The main async function to run the content generation pipeline."""
     # --- Configuration ---
     EXCEL_FILE_PATH = "topics.xlsx"
     TOPIC_COLUMN_NAME = "Topics"
-    # Set how many articles to generate at the same time.
-    # Start with a lower number (e.g., 10-25) and increase carefully.
-    CONCURRENT_LIMIT = 10
+    # How many articles are generated at the same time adapts to the API key's
+    # quota (GEMINI_CONCURRENCY / GEMINI_MIN_CONCURRENCY / GEMINI_MAX_CONCURRENCY).
+    # Post-processing is fast; storage workers only wait on the batched writer.
+    PROCESSING_WORKERS = 2
+    STORAGE_WORKERS = 32
+    # Publishing runs in its own stage so a slow site never holds generation slots.
+    PUBLISH_TO_WORDPRESS = False
+    PUBLISH_WORKERS = 4
+
+    # 1. Stream topics lazily; generation starts on the first row
+    topics = iter_topics(EXCEL_FILE_PATH, TOPIC_COLUMN_NAME)
+
+    # Every topic's progress is checkpointed, so --resume only does the remaining work
+    tracker = JobTracker(job_name or f"{EXCEL_FILE_PATH}:{TOPIC_COLUMN_NAME}")
+
+    # One pooled keep-alive client shared by all publish workers; posts are
+    # created through the REST batch endpoint, WP_BATCH_SIZE per request
+    wp_publisher = None
+    publish_batch_size = None
+    if PUBLISH_TO_WORDPRESS:
+        from modules.wordpress_publisher import PUBLISH_BATCH_SIZE, AsyncWordPressPublisher
+        wp_publisher = AsyncWordPressPublisher(max_parallel=PUBLISH_WORKERS)
+        publish_batch_size = PUBLISH_BATCH_SIZE
+
+    # Paraphrased repeats of stored articles (or of each other) are not generated twice
+    dedup = await asyncio.to_thread(open_dedup_index)
+
+    pipeline = ContentPipeline(
+        topics,
+        publisher=wordpress_batch_publisher(wp_publisher) if wp_publisher else None,
+        processing_workers=PROCESSING_WORKERS,
+        storage_workers=STORAGE_WORKERS,
+        publish_workers=PUBLISH_WORKERS,
+        publish_batch_size=publish_batch_size,
+        tracker=tracker,
+        resume=resume,
+        dedup=dedup,
+    )
+
+    # Live Prometheus/JSON metrics while the run is in progress
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    print(f"--- Starting async content generation from {EXCEL_FILE_PATH} ---")
+    limits = concurrency.snapshot()
+    print(f"--- Gemini concurrency: adaptive, starting at {limits['limit']} "
+          f"({concurrency.min_limit}-{concurrency.max_limit}), storage workers: {STORAGE_WORKERS}, "
+          f"topics per request: {pipeline.batch_sizes['generation']} ---")
+    if resume:
+        print(f"--- Resuming job '{tracker.job}': finished topics are skipped ---")
+    start_time = time.time()
 
-    # 1. Load topics
-    topics = load_topics_from_excel(EXCEL_FILE_PATH, TOPIC_COLUMN_NAME)
-    if not topics:
+    # 2. Run every stage until the source is exhausted and the queues are drained
+    try:
+        stats = await pipeline.run()
+    finally:
+        if wp_publisher:
+            await wp_publisher.aclose()
+    if not stats["topics"]:
         print("No topics found. Exiting.")
         return
 
-    # Create a semaphore to limit concurrent requests
-    semaphore = asyncio.Semaphore(CONCURRENT_LIMIT)
-
-    print(f"--- Starting async content generation for {len(topics)} topics ---")
-    print(f"--- Concurrency limit set to {CONCURRENT_LIMIT} tasks ---")
-    start_time = time.time()
-
-    # 2. Create a list of tasks to run
-    tasks = [process_single_topic(topic, semaphore) for topic in topics]
-
-    # 3. Run all tasks concurrently
-    await asyncio.gather(*tasks)
-
     end_time = time.time()
     print("-" * 50)
-    print("Asynchronous content generation process finished.")
+    print(f"Asynchronous content generation process finished for {stats['topics']} topics.")
+    print(f"Generated: {stats['generated']}, stored: {stats['stored']}, published: {stats['published']}, "
+          f"failed: {stats['failed']}, skipped (already done): {stats['skipped']}, "
+          f"near-duplicates: {stats['duplicates']}, requeued after transient errors: {stats['requeued']}.")
+    print(f"Job '{tracker.job}' state: {await asyncio.to_thread(tracker.summary)}")
     print(f"Total time taken: {end_time - start_time:.2f} seconds.")
+    limits = concurrency.snapshot()
+    print(f"Gemini concurrency settled at {limits['limit']} in-flight requests "
+          f"({limits['increases']} increases, {limits['decreases']} decreases, {limits['throttled']} throttled).")
+    print(metrics.report())
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries stored.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate articles for every topic in the Excel file.")
+    parser.add_argument("--resume", action="store_true", help="skip topics finished by an earlier run of the same job")
+    parser.add_argument("--job", help="name of the job to record progress under (default: file and column)")
+    parser.add_argument("--metrics-port", type=int, default=int(METRICS_PORT) if METRICS_PORT else None,
+                        help="serve /metrics (Prometheus) and /metrics.json on this port during the run")
+    args = parser.parse_args()
     # Use asyncio.run() to execute the async main function
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(resume=args.resume, job_name=args.job, metrics_port=args.metrics_port))
\ No newline at end of file
@@ -1,6 +1,7 @@
 # File: /content_automation/main.py
 
-import pandas as pd
+import argparse
+import itertools
 import time
 
 # Import the functions from our new 'content_system' package
@@ -10,60 +11,114 @@ from modules import (
     post_processor,
     article_storage_manager
 )
+from modules.dedup import open_dedup_index
+from modules.job_state import DUPLICATE, FAILED, GENERATED, PENDING, STORED, JobTracker
+from modules.metrics import METRICS_PORT, metrics, start_metrics_server
+from modules.response_cache import get_response_cache
+from modules.topic_source import iter_topics
 
-def load_topics_from_excel(file_path: str, column_name: str) -> list:
-    """Loads topics from a specified column in an Excel file."""
-    try:
-        df = pd.read_excel(file_path)
-        if column_name not in df.columns:
-            print(f"Error: Column '{column_name}' not found in {file_path}.")
-            return []
-        return df[column_name].dropna().tolist()
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found.")
-        return []
-    except Exception as e:
-        print(f"An error occurred while reading the Excel file: {e}")
-        return []
-
-def main():
+def main(resume: bool = False, job_name: str | None = None, metrics_port: int | None = None):
     """The main function to run the automated content generation pipeline."""
     # Configuration
     EXCEL_FILE_PATH = "topics.xlsx"
     TOPIC_COLUMN_NAME = "Topics"
 
-    # 1. Load topics from the external Excel file
-    topics = load_topics_from_excel(EXCEL_FILE_PATH, TOPIC_COLUMN_NAME)
-    if not topics:
+    # Every topic's progress is checkpointed, so --resume only does the remaining work
+    tracker = JobTracker(job_name or f"{EXCEL_FILE_PATH}:{TOPIC_COLUMN_NAME}")
+    # Paraphrased repeats of stored articles (or of each other) are not generated twice
+    dedup = open_dedup_index()
+
+    # 1. Stream topics from the external Excel file, one row at a time
+    topics = iter_topics(EXCEL_FILE_PATH, TOPIC_COLUMN_NAME)
+    first_topic = next(topics, None)
+    if first_topic is None:
         print("No topics found. Exiting.")
         return
 
-    print(f"--- Starting content generation for {len(topics)} topics ---")
+    # Live Prometheus/JSON metrics while the run is in progress
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    print(f"--- Starting content generation from {EXCEL_FILE_PATH} ---")
+    if resume:
+        print(f"--- Resuming job '{tracker.job}': finished topics are skipped ---")
 
     # The main workflow orchestrator
-    for topic in topics:
+    for topic in itertools.chain([first_topic], topics):
+        if resume and tracker.is_done(topic, publishing=False):
+            print(f"Skipping '{topic}' (already stored by an earlier run).")
+            continue
+
+        duplicate = dedup.claim_topic(topic) if dedup else None
+        if duplicate:
+            print(f"Near-duplicate topic: '{topic}' is {duplicate}.")
+            if dedup.skip:
+                tracker.record(topic, DUPLICATE, str(duplicate))
+                continue
+
         time.sleep(2)
         print("-" * 50)
         print(f"Processing topic: '{topic}'")
+        tracker.record(topic, PENDING)
 
-        # 2. Build the prompt (from generation module)
-        prompt = prompt_orchestrator(topic)
+        try:
+            # 2. Build the prompt (from generation module)
+            prompt = prompt_orchestrator(topic)
 
-        # 3. Generate the raw content (from generation module)
-        raw_content = generate_content(prompt)
-        if not raw_content:
-            print(f"Failed to generate content for '{topic}'. Skipping.")
-            continue
+            # 3. Generate the raw content (from generation module)
+            raw_content = generate_content(prompt)
+            if not raw_content:
+                print(f"Failed to generate content for '{topic}'. Skipping.")
+                if dedup:
+                    dedup.release(topic)
+                tracker.record(topic, FAILED, "generation produced no result")
+                continue
+            tracker.record(topic, GENERATED)
 
-        # 4. Process and format the content (from processing module)
-        title, html_content = post_processor(raw_content)
+            # 4. Process and format the content (from processing module)
+            started = time.perf_counter()
+            title, html_content = post_processor(raw_content)
+            metrics.observe("post_processor_seconds", time.perf_counter() - started)
 
-        # 5. Store the final article (from storage module)
-        article_storage_manager(title, html_content, topic)
+            # 5. Store the final article (from storage module), unless it repeats a stored one
+            duplicate = dedup.claim_article(topic, html_content) if dedup else None
+            if duplicate:
+                print(f"Near-duplicate article: '{topic}' is {duplicate}.")
+                if dedup.skip:
+                    dedup.release(topic)
+                    tracker.record(topic, DUPLICATE, str(duplicate))
+                    continue
+            article_id = article_storage_manager(title, html_content, topic)
+            if article_id is None:
+                if dedup:
+                    dedup.release(topic)
+                tracker.record(topic, FAILED, "storage produced no result")
+                continue
+            if dedup:
+                dedup.add(article_id, topic, html_content)
+            tracker.record(topic, STORED, article_id=article_id)
+        except Exception as e:
+            # Recorded so a later --resume retries this topic
+            print(f"Failed to process '{topic}': {e}")
+            if dedup:
+                dedup.release(topic)
+            tracker.record(topic, FAILED, str(e))
 
     print("-" * 50)
     print("Content generation process finished.")
+    print(f"Job '{tracker.job}' state: {tracker.summary()}")
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries stored.")
+    print(metrics.report())
     time.sleep(2)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate articles for every topic in the Excel file, one at a time.")
+    parser.add_argument("--resume", action="store_true", help="skip topics finished by an earlier run of the same job")
+    parser.add_argument("--job", help="name of the job to record progress under (default: file and column)")
+    parser.add_argument("--metrics-port", type=int, default=int(METRICS_PORT) if METRICS_PORT else None,
+                        help="serve /metrics (Prometheus) and /metrics.json on this port during the run")
+    args = parser.parse_args()
+    main(resume=args.resume, job_name=args.job, metrics_port=args.metrics_port)
\ No newline at end of file
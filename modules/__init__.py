@@ -1,5 +1,51 @@
 # File: /content_automation/content_system/__init__.py
 
-from .generation import prompt_orchestrator, generate_content_async, generate_content
-from .processing import post_processor
-from .storage import article_storage_manager
\ No newline at end of file
+import importlib
+import os
+
+# Submodules are imported when one of their names is first used, so importing
+# the package (or a light submodule like modules.storage) does not pull in the
+# Gemini SDK. Names re-exported from the package and the submodule defining them:
+_EXPORTS = {
+    "prompt_orchestrator": "generation",
+    "generate_content_async": "generation",
+    "generate_content": "generation",
+    "generate_content_stream": "generation",
+    "post_processor": "processing",
+    "StreamingPostProcessor": "processing",
+    "article_storage_manager": "storage",
+    "article_storage_manager_async": "storage",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def _load_dotenv():
+    """Loads the nearest .env above this package; python-dotenv is only imported if there is one."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+
+# Before any submodule reads its settings from the environment
+_load_dotenv()
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,162 @@
+# File: modules/bulk_jobs.py
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+
+from .dedup import open_dedup_index
+from .generation import concurrency
+from .job_state import DUPLICATE, FAILED, STORED, JobTracker
+from .pipeline import Article, ContentPipeline
+from .storage import PublishRequest
+
+# How many bulk jobs may run at once; each one runs its own bounded pipeline.
+MAX_RUNNING_JOBS = int(os.getenv("BULK_MAX_RUNNING_JOBS", "2"))
+# Finished jobs kept in memory for the UI.
+KEEP_FINISHED_JOBS = 20
+
+
+class BulkJob:
+    """Progress and per-topic results of one background bulk run, safe to read from any thread."""
+
+    def __init__(self, job_id: str, topics: list[str], publish: bool):
+        self.job_id = job_id
+        self.topics = topics
+        self.publish = publish
+        self.state = "queued"  # queued -> running -> finished | cancelled | crashed
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.results = {}  # topic -> (state, title, error)
+        self._pipeline = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.topics)
+
+    def _on_state(self, article: Article, state: str, error: str | None):
+        with self._lock:
+            self.results[article.topic] = (state, article.title, error)
+
+    def snapshot(self) -> dict:
+        """A consistent copy of the progress for rendering."""
+        with self._lock:
+            results = dict(self.results)
+        # Articles to publish are done once stored: they are in the publish outbox then
+        done = sum(1 for state, _, _ in results.values() if state == STORED)
+        failed = sum(1 for state, _, _ in results.values() if state == FAILED)
+        duplicates = sum(1 for state, _, _ in results.values() if state == DUPLICATE)
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "publish": self.publish,
+            "error": self.error,
+            "total": self.total,
+            "done": done,
+            "failed": failed,
+            "duplicates": duplicates,
+            "elapsed": elapsed,
+            "throughput": done / elapsed if elapsed else 0.0,
+            "concurrency": concurrency.snapshot(),  # shared by all running jobs
+            "results": results,
+        }
+
+    def cancel(self):
+        """Stops feeding new topics; articles already in flight are finished."""
+        self._cancelled = True
+        if self._pipeline:
+            self._pipeline.stop()
+
+
+class BulkJobManager:
+    """
+    Runs bulk generation jobs on one background event loop, outside the
+    Streamlit script rerun cycle. It is meant to be created once per process
+    (e.g. with st.cache_resource), so jobs survive reruns and page interactions.
+
+    All jobs share a single loop because the async Gemini client is bound to
+    the loop it was first used on.
+    """
+
+    def __init__(self, max_running_jobs: int = MAX_RUNNING_JOBS):
+        self.max_running_jobs = max_running_jobs
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._slots = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bulk-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, topics: list[str], publish: bool = False, image_path: str | None = None) -> str:
+        """Queues a job and returns its id."""
+        with self._lock:
+            job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._ids)}"
+            job = BulkJob(job_id, topics, publish)
+            self._jobs[job_id] = job
+            self._forget_old_jobs()
+        asyncio.run_coroutine_threadsafe(self._run(job, image_path), self._loop)
+        return job_id
+
+    def get(self, job_id: str) -> BulkJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[BulkJob]:
+        """All known jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def _forget_old_jobs(self):
+        finished = [job for job in self._jobs.values() if job.finished_at]
+        for job in sorted(finished, key=lambda job: job.finished_at)[:-KEEP_FINISHED_JOBS]:
+            del self._jobs[job.job_id]
+
+    async def _run(self, job: BulkJob, image_path: str | None):
+        if self._slots is None:  # created on the loop it is used on
+            self._slots = asyncio.Semaphore(self.max_running_jobs)
+        async with self._slots:
+            if job._cancelled:
+                job.state = "cancelled"
+                job.finished_at = time.time()
+                return
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                await self._run_pipeline(job, image_path)
+                job.state = "cancelled" if job._cancelled else "finished"
+            except Exception as e:
+                job.state = "crashed"
+                job.error = str(e)
+                print(f"Bulk job {job.job_id} crashed: {e}")
+            finally:
+                job.finished_at = time.time()
+
+    async def _run_pipeline(self, job: BulkJob, image_path: str | None):
+        # Articles to publish go to the publish outbox with their rows; the
+        # publisher daemon posts them, so a slow site never holds up generation
+        tracker = JobTracker(f"streamlit:{job.job_id}")
+        dedup = None
+        try:
+            dedup = await asyncio.to_thread(open_dedup_index)
+            job._pipeline = ContentPipeline(
+                job.topics,
+                tracker=tracker,
+                on_state=job._on_state,
+                dedup=dedup,
+                publish_request=PublishRequest("publish", image_path) if job.publish else None,
+            )
+            if job._cancelled:
+                job._pipeline.stop()
+            await job._pipeline.run()
+        finally:
+            # The Streamlit server outlives its jobs; release their read connections
+            tracker.close()
+            if dedup is not None:
+                dedup.close()
@@ -0,0 +1,153 @@
+# File: modules/concurrency.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from .resilience import status_code
+
+# Multiplicative decrease after a throttled (429) or failed (5xx) request.
+BACKOFF = 0.5
+# Gentler decrease when the window's p95 latency drifts above the baseline.
+LATENCY_BACKOFF = 0.9
+# The window's p95 may reach this multiple of the baseline before it counts as congestion.
+LATENCY_TOLERANCE = 2.0
+
+
+def error_kind(error: BaseException) -> str | None:
+    """'throttled' for 429, 'server' for 5xx, None for errors that say nothing about load."""
+    code = status_code(error)
+    if code == 429:
+        return "throttled"
+    if code is not None and 500 <= code < 600:
+        return "server"
+    return None
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests, shared by every coroutine in the process.
+
+    After every `limit` successful requests (one "round") the limit grows by
+    one, unless the round's p95 latency is well above the best p95 seen so far,
+    which means requests queue up on the server side and the limit shrinks a
+    little instead. A 429 or 5xx halves it. Failures of requests that were
+    started before the last decrease do not shrink it again, so one burst of
+    errors counts once.
+
+    Slots are handed over with `call_soon_threadsafe`, so waiters on different
+    event loops (e.g. the batch scripts and the Streamlit bulk executor) can
+    share one instance.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64, backoff: float = BACKOFF,
+                 latency_backoff: float = LATENCY_BACKOFF, latency_tolerance: float = LATENCY_TOLERANCE,
+                 on_change=None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.latency_tolerance = latency_tolerance
+        self.on_change = on_change  # called with (limit, reason) whenever the integer limit changes
+        self.baseline = None  # lowest round p95 seen, drifting slowly towards healthy rounds
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = deque()  # (loop, future) in arrival order
+        self._round = []
+        self._last_decrease = float("-inf")
+        self.stats = {"increases": 0, "decreases": 0, "throttled": 0, "server_errors": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"limit": int(self.limit), "in_flight": self._in_flight, "waiting": len(self._waiters),
+                    "baseline_p95": self.baseline, **self.stats}
+
+    async def acquire(self):
+        """Waits (without blocking the event loop) until a request slot is free and takes it."""
+        with self._lock:
+            if self._in_flight < int(self.limit) and not self._waiters:
+                self._in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:  # the slot was already handed over; pass it on
+                    self._in_flight -= 1
+                    self._wake()
+            raise
+
+    def release(self, started: float, error: BaseException | None = None, units: int = 1):
+        """
+        Frees the slot of a request started at `started` (time.perf_counter())
+        and adjusts the limit. `units` is the number of articles the request
+        asked for, so batched requests are compared per article.
+        """
+        now = time.perf_counter()
+        kind = error_kind(error) if error is not None else None
+        with self._lock:
+            self._in_flight -= 1
+            before = int(self.limit)
+            reason = None
+            if kind:
+                self.stats["throttled" if kind == "throttled" else "server_errors"] += 1
+                if started >= self._last_decrease:
+                    reason = "429" if kind == "throttled" else "5xx"
+                    self._decrease(self.backoff, now)
+            elif error is None:
+                self._round.append((now - started) / max(units, 1))
+                if len(self._round) >= before:
+                    reason = self._end_round(now)
+            self._wake()
+            after = int(self.limit)
+        if after != before and self.on_change:
+            self.on_change(after, reason)
+
+    def _decrease(self, factor: float, now: float):
+        self.limit = max(self.min_limit, self.limit * factor)
+        self._last_decrease = now
+        self._round = []
+        self.stats["decreases"] += 1
+
+    def _end_round(self, now: float) -> str:
+        samples = sorted(self._round)
+        self._round = []
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        if self.baseline is None or p95 < self.baseline or self.limit <= self.min_limit:
+            # At the minimum limit there is no load of ours to blame, so a slower
+            # round means the model itself got slower (e.g. longer answers)
+            self.baseline = p95
+        elif p95 > self.baseline * self.latency_tolerance:
+            self._decrease(self.latency_backoff, now)
+            return "latency"
+        else:
+            self.baseline += (p95 - self.baseline) * 0.01
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self.stats["increases"] += 1
+        return "healthy"
+
+    def _wake(self):
+        # Caller holds the lock
+        while self._waiters and self._in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            if loop.is_closed():  # its event loop has ended; nobody is waiting any more
+                continue
+            self._in_flight += 1
+            loop.call_soon_threadsafe(_grant, future)
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
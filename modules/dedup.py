@@ -0,0 +1,259 @@
+# File: modules/dedup.py
+
+import hashlib
+import os
+import random
+import re
+import struct
+import threading
+from dataclasses import dataclass
+
+from .storage import DB_FILE, connect, get_storage_engine
+
+# "flag" (the default) reports near-duplicates and generates them anyway, so a
+# topic entered again on purpose is not silently dropped; "skip" drops them
+# before they cost a generation call (or, for article bodies, before they are
+# stored); "off" disables the check.
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag")
+# Estimated Jaccard similarity from which two topics / two article bodies
+# count as near-duplicates. Values below ~0.5 lose recall (see BANDS).
+TOPIC_THRESHOLD = float(os.getenv("DEDUP_TOPIC_THRESHOLD", "0.75"))
+ARTICLE_THRESHOLD = float(os.getenv("DEDUP_ARTICLE_THRESHOLD", "0.7"))
+
+# MinHash signature length, split into BANDS bands of ROWS values for LSH.
+# Two sets with similarity s share at least one band with probability
+# 1 - (1 - s^ROWS)^BANDS: 0.998 at s=0.75, 0.65 at s=0.5.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Article bodies keep only every n-th word trigram (by hash), which keeps
+# the similarity estimate while hashing a fraction of the text.
+ARTICLE_SHINGLE_SAMPLE = 4
+
+TOPIC = "topic"
+ARTICLE = "article"
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)  # fixed: signatures are persisted and must stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}Q")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_STOPWORDS = frozenset(
+    "a an and are as at be best by can do for from guide how in is it of on or the this to top vs what when "
+    "where which why with your you".split())
+
+
+@dataclass
+class Duplicate:
+    """A stored article (or a topic earlier in the same run) that a new topic or body is too similar to."""
+    kind: str
+    topic: str
+    similarity: float
+    article_id: int | None = None  # None while the earlier topic is still in flight
+
+    def __str__(self) -> str:
+        where = f"article {self.article_id}" if self.article_id else "an earlier topic of this run"
+        return f"{self.similarity:.0%} similar to '{self.topic}' ({where})"
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _stem(word: str) -> str:
+    # Just enough to match plurals and "-ing" forms ("gardens", "gardening" -> "garden")
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def topic_shingles(topic: str) -> set[int]:
+    """Content words of a topic, so reordered or reworded titles compare equal."""
+    words = {_stem(word) for word in _WORD_RE.findall(topic.lower()) if word not in _STOPWORDS}
+    return {_hash(word) for word in words}
+
+
+def article_shingles(content: str) -> set[int]:
+    """Sampled word trigrams of an article's text, ignoring markup."""
+    words = _WORD_RE.findall(_TAG_RE.sub(" ", content).lower())
+    shingles = {_hash(" ".join(words[i:i + 3])) for i in range(max(len(words) - 2, 1))}
+    sampled = {shingle for shingle in shingles if shingle % ARTICLE_SHINGLE_SAMPLE == 0}
+    return sampled if len(sampled) >= NUM_PERM else shingles
+
+
+def minhash(shingles: set[int]) -> tuple[int, ...] | None:
+    """The signature of a shingle set, or None for an empty one (which is never a duplicate)."""
+    if not shingles:
+        return None
+    values = list(shingles)
+    return tuple(min([(a * value + b) % _PRIME for value in values]) for a, b in _PERMUTATIONS)
+
+
+def similarity(first: tuple[int, ...], second: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def band_buckets(signature: tuple[int, ...]) -> list[int]:
+    """One signed 64-bit bucket key per band."""
+    packed = _SIGNATURE.pack(*signature)
+    width = ROWS * 8
+    return [
+        int.from_bytes(hashlib.blake2b(packed[band * width:(band + 1) * width], digest_size=8).digest(),
+                       "little", signed=True)
+        for band in range(BANDS)
+    ]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH index over the topics and bodies of stored articles,
+    persisted in `articles.db` (minhash_signatures / minhash_buckets).
+
+    `claim_topic` / `claim_article` check a new topic or body against the
+    archive and against everything claimed earlier in the same run, and
+    reserve it when it is unique, so two paraphrases in flight at the same
+    time are caught as well. Claims of topics that fail are `release`d;
+    stored articles are persisted with `add`.
+    """
+
+    def __init__(self, db_file: str = DB_FILE, mode: str = DEDUP_MODE, topic_threshold: float = TOPIC_THRESHOLD,
+                 article_threshold: float = ARTICLE_THRESHOLD, backfill: bool = True):
+        self.skip = mode == "skip"
+        self.thresholds = {TOPIC: topic_threshold, ARTICLE: article_threshold}
+        self._reader = connect(db_file)
+        self._lock = threading.Lock()
+        # Claims of this run: kind -> topic -> (signature, article_id), and their buckets
+        self._claims = {TOPIC: {}, ARTICLE: {}}
+        self._claim_buckets = {}
+        if backfill:
+            self.backfill()
+
+    def _signature(self, kind: str, text: str) -> tuple[int, ...] | None:
+        return minhash(topic_shingles(text) if kind == TOPIC else article_shingles(text))
+
+    def _stored_candidates(self, kind: str, buckets: list[int]) -> list[tuple[int, bytes, str]]:
+        params = [kind, kind]
+        for band, bucket in enumerate(buckets):
+            params += [band, bucket]
+        return self._reader.execute(
+            f"""
+            SELECT s.ref, s.signature, a.topic FROM minhash_signatures s
+            JOIN articles a ON a.id = s.ref
+            WHERE s.kind = ? AND s.ref IN (
+                SELECT ref FROM minhash_buckets
+                WHERE kind = ? AND (band, bucket) IN (VALUES {", ".join("(?, ?)" for _ in buckets)})
+            )
+            """, params).fetchall()
+
+    def _find(self, kind: str, signature: tuple[int, ...], buckets: list[int]) -> Duplicate | None:
+        best = None
+        threshold = self.thresholds[kind]
+        for article_id, packed, topic in self._stored_candidates(kind, buckets):
+            score = similarity(signature, _SIGNATURE.unpack(packed))
+            if score >= threshold and (best is None or score > best.similarity):
+                best = Duplicate(kind, topic, score, article_id)
+        claimed = set()
+        for band, bucket in enumerate(buckets):
+            claimed.update(self._claim_buckets.get((kind, band, bucket), ()))
+        for topic in claimed:
+            other, article_id = self._claims[kind][topic]
+            score = similarity(signature, other)
+            if score >= threshold and (best is None or score > best.similarity):
+                best = Duplicate(kind, topic, score, article_id)
+        return best
+
+    def _claim(self, kind: str, topic: str, text: str) -> Duplicate | None:
+        signature = self._signature(kind, text)
+        if signature is None:
+            return None
+        buckets = band_buckets(signature)
+        with self._lock:
+            if topic in self._claims[kind]:  # e.g. a retry of the same topic
+                return None
+            duplicate = self._find(kind, signature, buckets)
+            if duplicate is None:
+                self._claims[kind][topic] = (signature, None)
+                for band, bucket in enumerate(buckets):
+                    self._claim_buckets.setdefault((kind, band, bucket), set()).add(topic)
+            return duplicate
+
+    def claim_topic(self, topic: str) -> Duplicate | None:
+        """Returns the near-duplicate of `topic`, or None after reserving it for this run."""
+        return self._claim(TOPIC, topic, topic)
+
+    def claim_article(self, topic: str, content: str) -> Duplicate | None:
+        """Returns the near-duplicate of an article body, or None after reserving it for this run."""
+        return self._claim(ARTICLE, topic, content)
+
+    def release(self, topic: str):
+        """Drops the claims of a topic that did not make it to storage."""
+        with self._lock:
+            for kind in (TOPIC, ARTICLE):
+                claim = self._claims[kind].pop(topic, None)
+                if claim is None:
+                    continue
+                for band, bucket in enumerate(band_buckets(claim[0])):
+                    self._claim_buckets.get((kind, band, bucket), set()).discard(topic)
+
+    def add(self, article_id: int, topic: str, content: str):
+        """Persists the signatures of a stored article (queued on the storage engine)."""
+        for kind, text in ((TOPIC, topic), (ARTICLE, content)):
+            with self._lock:
+                claim = self._claims[kind].get(topic)
+            signature = claim[0] if claim else self._signature(kind, text)
+            if claim:
+                with self._lock:
+                    self._claims[kind][topic] = (signature, article_id)
+            self._persist(kind, article_id, signature)
+
+    def _persist(self, kind: str, article_id: int, signature: tuple[int, ...] | None):
+        if signature is None:
+            return
+        engine = get_storage_engine()
+        engine.execute("INSERT OR REPLACE INTO minhash_signatures (kind, ref, signature) VALUES (?, ?, ?)",
+                       (kind, article_id, _SIGNATURE.pack(*signature)))
+        rows = [(kind, band, bucket, article_id) for band, bucket in enumerate(band_buckets(signature))]
+        engine.execute(
+            "INSERT OR IGNORE INTO minhash_buckets (kind, band, bucket, ref) VALUES "
+            + ", ".join("(?, ?, ?, ?)" for _ in rows),
+            tuple(value for row in rows for value in row))
+
+    def backfill(self, batch_size: int = 500) -> int:
+        """Indexes stored articles that have no signatures yet (e.g. from before this index existed)."""
+        count = 0
+        last_id = 0
+        while True:
+            rows = self._reader.execute(
+                """
+                SELECT id, topic, content FROM article_text
+                WHERE id > ? AND id NOT IN (SELECT ref FROM minhash_signatures WHERE kind = ?)
+                ORDER BY id LIMIT ?
+                """, (last_id, ARTICLE, batch_size)).fetchall()
+            if not rows:
+                break
+            for article_id, topic, content in rows:
+                for kind, text in ((TOPIC, topic or ""), (ARTICLE, content)):
+                    self._persist(kind, article_id, self._signature(kind, text))
+            last_id = rows[-1][0]
+            count += len(rows)
+            print(f"Near-duplicate index: backfilled {count} stored articles...")
+        if count:
+            get_storage_engine().flush()
+        return count
+
+    def close(self):
+        self._reader.close()
+
+
+def open_dedup_index() -> NearDuplicateIndex | None:
+    """A fresh index for one run, or None when DEDUP_MODE is "off"."""
+    if DEDUP_MODE == "off":
+        return None
+    return NearDuplicateIndex()
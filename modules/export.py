@@ -0,0 +1,140 @@
+# File: modules/export.py
+
+import csv
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .storage import DB_FILE, BodyCodec, register_body_functions
+
+# Finished exports are kept here and reused until the database changes.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+# Rows read from the snapshot per fetch while writing JSONL/CSV.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+
+FORMATS = {
+    "db": ("application/octet-stream", "SQLite database"),
+    "jsonl.gz": ("application/gzip", "JSON Lines, gzip"),
+    "csv.gz": ("application/gzip", "CSV, gzip"),
+}
+
+_COLUMNS = ("id", "title", "content", "topic", "published_at")
+
+_build_lock = threading.Lock()
+
+
+def database_version(db_file: str = DB_FILE) -> str | None:
+    """
+    A cheap marker that changes whenever the database does, or None if it
+    does not exist. In WAL mode commits only touch the -wal file until a
+    checkpoint, so both files are taken into account.
+    """
+    parts = []
+    for path in (db_file, db_file + "-wal"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if path == db_file:
+                return None
+            continue
+        parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
+
+
+def snapshot(destination: str, db_file: str = DB_FILE):
+    """
+    Copies a consistent snapshot of the database to `destination` with the
+    online backup API. In WAL mode the copy reads one committed state while
+    writers carry on.
+    """
+    source = sqlite3.connect(db_file)
+    target = sqlite3.connect(destination)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _iter_rows(snapshot_file: str):
+    conn = sqlite3.connect(snapshot_file)
+    # Bodies are decompressed one fetched chunk at a time
+    register_body_functions(conn, BodyCodec(snapshot_file))
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM article_text ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+
+def _write_jsonl(snapshot_file: str, destination: str):
+    with gzip.open(destination, "wt", encoding="utf-8", newline="\n") as out:
+        for row in _iter_rows(snapshot_file):
+            out.write(json.dumps(dict(zip(_COLUMNS, row)), ensure_ascii=False))
+            out.write("\n")
+
+
+def _write_csv(snapshot_file: str, destination: str):
+    with gzip.open(destination, "wt", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(_COLUMNS)
+        for row in _iter_rows(snapshot_file):
+            writer.writerow(row)
+
+
+def export_database(fmt: str = "db", db_file: str = DB_FILE, export_dir: str = EXPORT_DIR) -> str | None:
+    """
+    Returns the path of an export of the database in `fmt` (see FORMATS),
+    or None if there is no database yet.
+
+    The export is built from a backup snapshot, written in chunks, and kept
+    on disk keyed by `database_version()`, so repeated calls for an
+    unchanged database cost one stat() instead of a copy.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+    version = database_version(db_file)
+    if version is None:
+        return None
+    name = os.path.splitext(os.path.basename(db_file))[0]
+    path = os.path.join(export_dir, f"{name}-{version}.{fmt}")
+    if os.path.exists(path):
+        return path
+
+    with _build_lock:
+        if os.path.exists(path):
+            return path
+        os.makedirs(export_dir, exist_ok=True)
+        partial = path + ".partial"
+        if fmt == "db":
+            snapshot(partial, db_file)
+        else:
+            snapshot_file = os.path.join(export_dir, f"{name}-{version}.snapshot")
+            try:
+                snapshot(snapshot_file, db_file)
+                (_write_jsonl if fmt == "jsonl.gz" else _write_csv)(snapshot_file, partial)
+            finally:
+                if os.path.exists(snapshot_file):
+                    os.remove(snapshot_file)
+        os.replace(partial, path)
+
+        # Older exports of the same format are stale now
+        for old in glob.glob(os.path.join(export_dir, f"{name}-*.{fmt}")):
+            if old != path:
+                os.remove(old)
+    print(f"Exported {db_file} to {path}")
+    return path
+
+
+def export_file_name(path: str) -> str:
+    """The download name for an export, without the version tag."""
+    name, _, fmt = os.path.basename(path).partition(".")
+    return f"{name.rsplit('-', 1)[0]}.{fmt}"
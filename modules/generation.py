@@ -1,18 +1,68 @@
 # File: modules/generation.py
 
+import asyncio
 import os
-import google.generativeai as genai
+import threading
 import time
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Iterator
 
-load_dotenv()
+from .concurrency import AdaptiveConcurrency
+from .metrics import SIZE_BUCKETS, metrics
+from .processing import BATCH_END, BATCH_START, split_batch_response
+from .rate_limiter import RateLimiter
+from .resilience import call_with_retry, call_with_retry_async, get_breaker
+from .response_cache import CACHE_REFRESH, get_response_cache
+
+# Settings come from the environment; modules/__init__.py has loaded any .env file.
+# google.generativeai takes about a second to import, so it is only imported by
+# get_model(), when the first request is made.
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 # Define the model to use from an environment variable for flexibility
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash-lite")  # Provide a default model
 
+# Quota of the API key. Defaults match the free tier of gemini-2.0-flash-lite.
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_RPM", "30"))
+TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TPM", "1000000"))
+# In-flight async requests: the limit starts at GEMINI_CONCURRENCY and adapts
+# (AIMD) between the bounds, growing while latency is steady and backing off
+# on 429, 5xx or rising p95 latency, so it settles at what the key's quota allows.
+CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "10"))
+MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+# Used to reserve tokens before the response (and its real usage) is known.
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", "1200"))
+# Topics packed into one request by the batch pipeline (1 = one request per
+# topic). Batched articles are short-form; keep BATCH_SIZE * BATCH_WORDS well
+# inside the model's output limit (~8k tokens for gemini-2.0-flash-lite).
+BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "1"))
+BATCH_WORDS = int(os.getenv("GENERATION_BATCH_WORDS", "300"))
+# Optional overrides, e.g. to point the client at benchmarks/fake_servers.py
+API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+TRANSPORT = os.getenv("GEMINI_TRANSPORT")  # "grpc" (SDK default) or "rest"
+
+
+
+def _report_concurrency(limit: int, reason: str | None):
+    metrics.set("gemini_concurrency_limit", limit)
+    metrics.inc("gemini_concurrency_changes_total", reason=reason or "unknown")
+    if reason not in (None, "healthy"):
+        print(f"   [Concurrency] Limit lowered to {limit} after {reason}.")
+
+
+# One limiter and one model per process, shared by the sync and async paths.
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+concurrency = AdaptiveConcurrency(CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY, on_change=_report_concurrency)
+metrics.set("gemini_concurrency_limit", concurrency.snapshot()["limit"])
+_model = None
+_model_key = None
+_model_lock = threading.Lock()
+
 
 def prompt_orchestrator(topic: str) -> str:
     """Builds a detailed and effective prompt for the LLM."""
+    started = time.perf_counter()
     prompt = f"""
     You are an expert content creator and SEO specialist.
     Your task is to generate a high-quality, comprehensive article about the given topic.
@@ -43,23 +93,184 @@ def prompt_orchestrator(topic: str) -> str:
     Do not mention AI, artificial intelligence, or that this content was generated by a bot.
     Write as if you are a knowledgeable expert in the field.
     """
+    metrics.observe("prompt_build_seconds", time.perf_counter() - started, kind="single")
     return prompt
 
 
-def generate_content(prompt: str) -> str:
-    """Sends the prompt to the Gemini API and returns the raw text response."""
-    try:
-        # --- Configuration is now done here, using the latest environment variables ---
-        API_KEY = os.getenv("GOOGLE_API_KEY")
-        if not API_KEY:
-            raise ValueError("API key not found. Please set the GOOGLE_API_KEY in the sidebar.")
+def batch_prompt_orchestrator(topics: list[str], words: int = BATCH_WORDS) -> str:
+    """
+    Builds one prompt for several short articles. The instructions are sent
+    once, and every article must be wrapped in numbered delimiters so
+    `split_batch_response` can separate the answer again.
+    """
+    started = time.perf_counter()
+    topic_lines = "\n".join(f'    Topic {number}: "{topic}"' for number, topic in enumerate(topics, 1))
+    prompt = f"""
+    You are an expert content creator and SEO specialist.
+    Your task is to generate {len(topics)} separate, high-quality short articles, one for each topic below.
+
+{topic_lines}
+
+    Requirements for every article:
+    - Write an engaging, informative article that provides real value to readers
+    - Start with the article title in an <h1> header, then use <h2> headers for the main sections
+    - Include a short introduction and a conclusion with a call-to-action
+    - Maintain a professional yet engaging tone throughout
+    - Target length: {words} words
+    - Use HTML formatting for structure (<h2>, <h3>, <p>, <ul>, <li>, etc.)
+    - Include relevant keywords naturally without keyword stuffing
+    - Only include the body and not the whole html document. Do not include any markdown or other formatting like backticks etc.
+
+    Output format:
+    - Write the articles in the order of the topics
+    - Put the line {BATCH_START.format(number="N")} before and the line {BATCH_END.format(number="N")} after article N
+    - Write nothing outside these delimiters
+
+    Do not mention AI, artificial intelligence, or that this content was generated by a bot.
+    Write as if you are a knowledgeable expert in the field.
+    """
+    metrics.observe("prompt_build_seconds", time.perf_counter() - started, kind="batch")
+    return prompt
+
+
+def estimate_tokens(prompt: str, articles: int = 1) -> int:
+    """Rough token cost of one request: ~4 characters per prompt token plus the expected answer."""
+    return len(prompt) // 4 + EXPECTED_OUTPUT_TOKENS * articles
+
+
+def get_model() -> "genai.GenerativeModel":
+    """
+    Returns the process-wide GenerativeModel.
+
+    The client is configured once and only rebuilt when the API key changes
+    (e.g. when it is entered in the Streamlit sidebar).
+    """
+    global _model, _model_key
+    API_KEY = os.getenv("GOOGLE_API_KEY")
+    if not API_KEY:
+        raise ValueError("API key not found. Please set the GOOGLE_API_KEY in the sidebar.")
+
+    with _model_lock:
+        if _model is None or _model_key != (API_KEY, MODEL_NAME):
+            import google.generativeai as genai
+
+            options = {}
+            if API_ENDPOINT:
+                options["client_options"] = {"api_endpoint": API_ENDPOINT}
+            if TRANSPORT:
+                options["transport"] = TRANSPORT
+            genai.configure(api_key=API_KEY, **options)
+            _model = genai.GenerativeModel(MODEL_NAME)
+            _model_key = (API_KEY, MODEL_NAME)
+        return _model
+
+
+async def _get_model_async() -> "genai.GenerativeModel":
+    """get_model() without stalling the event loop on the first call, which imports the SDK."""
+    if _model is not None and _model_key == (os.getenv("GOOGLE_API_KEY"), MODEL_NAME):
+        return _model
+    return await asyncio.to_thread(get_model)
+
+
+def _total_tokens(response) -> int | None:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
 
-        genai.configure(api_key=API_KEY)
-        # --- End of new configuration block ---
+def _record_cache_lookup(hit: bool):
+    metrics.inc("response_cache_lookups_total", result="hit" if hit else "miss")
 
-        model = genai.GenerativeModel(MODEL_NAME)
-        time.sleep(4)  # This is kept from your original code
+
+async def _timed_acquire(estimated: int):
+    started = time.perf_counter()
+    await rate_limiter.acquire_async(estimated)
+    metrics.observe("gemini_rate_limit_wait_seconds", time.perf_counter() - started)
+
+
+def _record_request(mode: str, started: float, response=None):
+    """Records a finished (response given) or failed Gemini request and its token usage."""
+    metrics.observe("gemini_request_seconds", time.perf_counter() - started, mode=mode)
+    metrics.inc("gemini_requests_total", mode=mode, outcome="ok" if response is not None else "error")
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count"),
+                        ("total", "total_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            metrics.inc("gemini_tokens_total", count, kind=kind)
+            metrics.observe("gemini_tokens", count, SIZE_BUCKETS, kind=kind)
+
+
+def _release_tokens(estimated: int, response=None):
+    """
+    Gives back the tokens reserved for a request that failed, less whatever
+    usage it reported, so errors and retries (when 429s are likely) do not
+    shrink the token budget.
+    """
+    rate_limiter.settle(estimated, _total_tokens(response) or 0)
+
+
+def _request(model, prompt: str, estimated: int):
+    """One attempt of a blocking request: waits for quota, sends it and books its usage."""
+    waited = time.perf_counter()
+    rate_limiter.acquire(estimated)
+    metrics.observe("gemini_rate_limit_wait_seconds", time.perf_counter() - waited)
+    started = time.perf_counter()
+    try:
         response = model.generate_content(prompt)
+    except Exception:
+        _record_request("sync", started)
+        _release_tokens(estimated)
+        raise
+    _record_request("sync", started, response)
+    rate_limiter.settle(estimated, _total_tokens(response))
+    return response
+
+
+async def _request_async(model, prompt: str, topic: str, estimated: int, articles: int):
+    """One attempt of an async request; the concurrency slot is only held while it runs."""
+    await concurrency.acquire()
+    started = None
+    try:
+        await _timed_acquire(estimated)
+        print(f"   [Async] Sending request for: '{topic}'")
+        started = time.perf_counter()
+        response = await model.generate_content_async(prompt)
+    except BaseException as e:
+        concurrency.release(started or time.perf_counter(), e, articles)
+        if started is not None:  # not just cancelled while waiting for quota
+            _record_request("async", started)
+        _release_tokens(estimated)  # reserved as soon as _timed_acquire started
+        raise
+    concurrency.release(started, None, articles)
+    _record_request("async", started, response)
+    rate_limiter.settle(estimated, _total_tokens(response))
+    return response
+
+
+def generate_content(prompt: str, use_cache: bool = True, refresh: bool = CACHE_REFRESH) -> str:
+    """
+    Sends the prompt to the Gemini API and returns the raw text response.
+    Identical prompts are answered from the response cache unless `use_cache` is
+    False; `refresh` skips the lookup but still stores the new answer.
+    Throttled and failed requests are retried with backoff (see resilience.py).
+    """
+    try:
+        cache = get_response_cache() if use_cache else None
+        if cache and not refresh:
+            cached = cache.get(MODEL_NAME, prompt)
+            _record_cache_lookup(cached is not None)
+            if cached is not None:
+                return cached
+
+        model = get_model()
+        estimated = estimate_tokens(prompt)
+        response = call_with_retry(lambda: _request(model, prompt, estimated), get_breaker("gemini"),
+                                   label="Gemini request")
+
+        if cache:
+            cache.put(MODEL_NAME, prompt, response.text)
         return response.text
     except Exception as e:
         print(f"An error occurred during content generation: {e}")
@@ -67,24 +278,113 @@ def generate_content(prompt: str) -> str:
         raise e
 
 
-# The async function would need a similar change if you plan to use it in the future
-async def generate_content_async(prompt: str, topic: str) -> str:
+async def generate_content_async(prompt: str, topic: str, use_cache: bool = True,
+                                 refresh: bool = CACHE_REFRESH, articles: int = 1) -> str:
     """
     Sends the prompt to the Gemini API asynchronously and returns the raw text.
+    Waiting for a concurrency slot or for quota only suspends this coroutine,
+    so other topics keep running, and so does backing off before a retry or
+    while the circuit breaker holds calls to a failing API. Cache lookups run
+    in a worker thread to keep SQLite off the event loop.
     """
-    print(f"   [Async] Sending request for: '{topic}'")
     try:
-        API_KEY = os.getenv("GOOGLE_API_KEY")
-        if not API_KEY:
-            raise ValueError("API key not found. Please set the GOOGLE_API_KEY in the sidebar.")
-
-        genai.configure(api_key=API_KEY)
+        cache = get_response_cache() if use_cache else None
+        if cache and not refresh:
+            cached = await asyncio.to_thread(cache.get, MODEL_NAME, prompt)
+            _record_cache_lookup(cached is not None)
+            if cached is not None:
+                print(f"   [Async] Cache hit for: '{topic}'")
+                return cached
 
-        model = genai.GenerativeModel(MODEL_NAME)
-        time.sleep(4)
-        response = await model.generate_content_async(prompt)
+        model = await _get_model_async()
+        estimated = estimate_tokens(prompt, articles)
+        response = await call_with_retry_async(
+            lambda: _request_async(model, prompt, topic, estimated, articles), get_breaker("gemini"),
+            label=f"Gemini request for '{topic}'")
         print(f"   [Async] Received response for: '{topic}'")
+
+        if cache:
+            await asyncio.to_thread(cache.put, MODEL_NAME, prompt, response.text)
         return response.text
     except Exception as e:
         print(f"An error occurred during async generation for '{topic}': {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+async def generate_batch_async(topics: list[str], use_cache: bool = True,
+                               refresh: bool = CACHE_REFRESH) -> list[str | None]:
+    """
+    Generates one article per topic with a single request and returns the
+    raw text of each, in topic order. Articles missing from a malformed
+    answer are retried with their own single-topic request; None marks a
+    topic whose retry failed as well.
+    """
+    if len(topics) == 1:
+        return [await generate_content_async(prompt_orchestrator(topics[0]), topics[0], use_cache, refresh)]
+
+    raw_text = await generate_content_async(batch_prompt_orchestrator(topics), f"{len(topics)} topics",
+                                            use_cache, refresh, articles=len(topics))
+    parts = split_batch_response(raw_text, len(topics))
+    missing = [index for index, part in enumerate(parts) if part is None]
+    if missing:
+        print(f"   [Async] Batch answer lacks {len(missing)} of {len(topics)} articles; retrying them one by one.")
+        retries = await asyncio.gather(
+            *(generate_content_async(prompt_orchestrator(topics[index]), topics[index], use_cache, refresh)
+              for index in missing),
+            return_exceptions=True)
+        for index, result in zip(missing, retries):
+            parts[index] = None if isinstance(result, BaseException) else result
+    return parts
+
+def generate_content_stream(prompt: str, use_cache: bool = True, refresh: bool = CACHE_REFRESH) -> Iterator[str]:
+    """
+    Sends the prompt to the Gemini API and yields the response text chunk by
+    chunk as it arrives. A cached answer is yielded as a single chunk.
+    Opening the stream is retried like any request; once text has been
+    yielded, a failure is raised to the caller.
+    """
+    cache = get_response_cache() if use_cache else None
+    if cache and not refresh:
+        cached = cache.get(MODEL_NAME, prompt)
+        _record_cache_lookup(cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_stream():
+        waited = time.perf_counter()
+        rate_limiter.acquire(estimated)
+        metrics.observe("gemini_rate_limit_wait_seconds", time.perf_counter() - waited)
+        opened = time.perf_counter()
+        try:
+            return opened, model.generate_content(prompt, stream=True)
+        except Exception:
+            _record_request("stream", opened)
+            _release_tokens(estimated)
+            raise
+
+    started = response = None
+    try:
+        model = get_model()
+        estimated = estimate_tokens(prompt)
+        started, response = call_with_retry(open_stream, get_breaker("gemini"), label="Gemini stream")
+        parts = []
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # e.g. a final chunk that only carries the finish reason
+            parts.append(text)
+            yield text
+        # Usage metadata is complete once the stream has been consumed
+        _record_request("stream", started, response)
+        rate_limiter.settle(estimated, _total_tokens(response))
+    except Exception as e:
+        if started is not None:  # failed while streaming, after open_stream succeeded
+            _record_request("stream", started)
+            _release_tokens(estimated, response)
+        print(f"An error occurred during streamed content generation: {e}")
+        raise e
+
+    if cache:
+        cache.put(MODEL_NAME, prompt, "".join(parts))
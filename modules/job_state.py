@@ -0,0 +1,97 @@
+# File: modules/job_state.py
+
+import threading
+import time
+from concurrent.futures import Future
+
+from .storage import DB_FILE, connect, get_storage_engine
+
+# Lifecycle of a topic within a job. "failed" topics are retried on --resume.
+PENDING = "pending"
+GENERATED = "generated"
+STORED = "stored"
+PUBLISHED = "published"
+FAILED = "failed"
+# Skipped as a near-duplicate of a stored article or an earlier topic (see dedup.py)
+DUPLICATE = "duplicate"
+
+_UPSERT = """
+INSERT INTO topic_jobs (job, topic, state, attempts, error, article_id, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (job, topic) DO UPDATE SET
+    state = excluded.state,
+    attempts = topic_jobs.attempts + excluded.attempts,
+    error = excluded.error,
+    article_id = COALESCE(excluded.article_id, topic_jobs.article_id),
+    updated_at = excluded.updated_at
+"""
+
+
+class JobTracker:
+    """
+    Records the state of every topic of a named job in the `topic_jobs` table.
+
+    Updates are queued on the shared storage engine, so they are committed in
+    the same batched transactions as the articles instead of one fsync each.
+    """
+
+    def __init__(self, job: str, db_file: str = DB_FILE):
+        self.job = job
+        self._reader = connect(db_file)
+        # The pipeline and the work queue read from worker threads; one query at a time on the shared connection
+        self._lock = threading.Lock()
+
+    def _query(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def lookup(self, topic: str) -> tuple[str, int | None] | None:
+        """Returns (state, article_id) of a topic from an earlier run, or None if it was never seen."""
+        rows = self._query("SELECT state, article_id FROM topic_jobs WHERE job = ? AND topic = ?", (self.job, topic))
+        return rows[0] if rows else None
+
+    def is_done(self, topic: str, publishing: bool) -> bool:
+        """
+        True when the topic needs no more work: its article is stored (or,
+        when publishing, published), or it was skipped as a duplicate. A
+        topic whose publish failed keeps its article_id, so only the publish
+        is retried.
+        """
+        row = self.lookup(topic)
+        if not row:
+            return False
+        return row[0] in (PUBLISHED, DUPLICATE) or (row[1] is not None and not publishing)
+
+    def adopt_stored(self, topic: str, since: float) -> int | None:
+        """
+        Records the newest article stored for `topic` since `since` (epoch
+        seconds) as the topic's result, e.g. one stored by a worker that died
+        before it could record it. Returns its id, or None if there is none.
+        """
+        rows = self._query(
+            "SELECT id FROM articles WHERE topic = ? AND published_at >= datetime(?, 'unixepoch') "
+            "ORDER BY id DESC LIMIT 1", (topic, int(since)))
+        if not rows:
+            return None
+        self.record(topic, STORED, article_id=rows[0][0]).result()
+        return rows[0][0]
+
+    def _params(self, topic: str, state: str, error: str | None, article_id: int | None) -> tuple:
+        attempts = 1 if state == PENDING else 0  # every new attempt starts as pending
+        return self.job, topic, state, attempts, error, article_id, time.time()
+
+    def record(self, topic: str, state: str, error: str | None = None, article_id: int | None = None) -> Future:
+        """
+        Queues a state change and returns immediately; the returned future
+        resolves once it is committed. Updates are applied in queue order.
+        """
+        return get_storage_engine().execute(_UPSERT, self._params(topic, state, error, article_id))
+
+    def summary(self) -> dict:
+        """Number of topics of this job in each state."""
+        get_storage_engine().flush()
+        return dict(self._query("SELECT state, COUNT(*) FROM topic_jobs WHERE job = ? GROUP BY state", (self.job,)))
+
+    def close(self):
+        with self._lock:
+            self._reader.close()
@@ -0,0 +1,78 @@
+# File: modules/media_registry.py
+
+import hashlib
+import os
+import threading
+import time
+
+from .storage import DB_FILE, connect
+
+# A remembered media ID is re-checked against the site after this many seconds,
+# in case the image was deleted from the Media Library in the meantime.
+VERIFY_INTERVAL = float(os.getenv("WP_MEDIA_VERIFY_INTERVAL", str(24 * 3600)))
+
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content; the file is only re-read when its size or mtime changes."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        cached = _hash_cache.get(key)
+    if cached:
+        return cached
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    with _hash_lock:
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+class MediaRegistry:
+    """Maps (content hash, site) to the WordPress media ID the file was uploaded as."""
+
+    def __init__(self, db_file: str = DB_FILE, verify_interval: float = VERIFY_INTERVAL):
+        self.verify_interval = verify_interval
+        self._lock = threading.Lock()
+        self._conn = connect(db_file)
+
+    def lookup(self, content_hash: str, site_url: str) -> tuple[int, bool] | None:
+        """Returns (media_id, needs_verification), or None if the file was never uploaded to this site."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT media_id, verified_at FROM media_registry WHERE content_hash = ? AND site_url = ?",
+                (content_hash, site_url)).fetchone()
+        if not row:
+            return None
+        return row[0], time.time() - row[1] > self.verify_interval
+
+    def remember(self, content_hash: str, site_url: str, media_id: int, filename: str | None = None):
+        """Records an upload, or marks an existing entry as freshly verified."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media_registry (content_hash, site_url, media_id, filename, verified_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, site_url, media_id, filename, time.time()))
+
+    def forget(self, content_hash: str, site_url: str):
+        """Drops an entry whose media no longer exists on the site."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM media_registry WHERE content_hash = ? AND site_url = ?", (content_hash, site_url))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_media_registry() -> MediaRegistry:
+    """Returns the process-wide media registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MediaRegistry()
+        return _registry
@@ -0,0 +1,231 @@
+# File: modules/metrics.py
+
+import bisect
+import json
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port for the /metrics endpoint of the batch scripts; unset = no endpoint.
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Upper bounds (seconds) of the latency buckets: 1 ms ... 2 min
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Upper bounds of size buckets, e.g. rows per batch or tokens per request
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+HELP = {
+    "pipeline_stage_seconds": "Time one article spent in a pipeline stage.",
+    "prompt_build_seconds": "Time to build a prompt.",
+    "gemini_request_seconds": "Duration of Gemini API requests.",
+    "gemini_rate_limit_wait_seconds": "Time spent waiting for the local rate limiter.",
+    "gemini_tokens": "Tokens per Gemini request, from the response usage metadata.",
+    "gemini_tokens_total": "Tokens used, from the response usage metadata.",
+    "gemini_requests_total": "Gemini requests by outcome.",
+    "response_cache_lookups_total": "Response cache lookups by result.",
+    "post_processor_seconds": "Time spent in post_processor.",
+    "storage_batch_seconds": "Duration of one storage write transaction.",
+    "storage_batch_rows": "Articles written per storage transaction.",
+    "wordpress_request_seconds": "Duration of WordPress REST requests.",
+    "wordpress_requests_total": "WordPress REST requests by outcome.",
+    "gemini_concurrency_limit": "Current adaptive limit on in-flight Gemini requests.",
+    "gemini_concurrency_changes_total": "Changes of the adaptive concurrency limit by reason.",
+    "outbox_articles_total": "Articles settled by the publisher daemon by outcome.",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus exposes it."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile (0..1), interpolated linearly within the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms, keyed by name and labels.
+
+    Recording takes one lock and a few integer updates, cheap enough for
+    every request and every article.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    def histograms(self, name: str) -> dict:
+        """All histograms of one metric, as {labels dict as tuple: Histogram}."""
+        with self._lock:
+            return {labels: histogram for (metric, labels), histogram in self._histograms.items() if metric == name}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def to_dict(self) -> dict:
+        """JSON-friendly snapshot: counters, gauges and count/sum/p50/p95/p99 of each histogram."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            gauges = [{"name": name, "labels": dict(labels), "value": value}
+                      for (name, labels), value in sorted(self._gauges.items())]
+            histograms = [
+                {"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                 "p50": histogram.quantile(0.5), "p95": histogram.quantile(0.95), "p99": histogram.quantile(0.99),
+                 "buckets": dict(zip([*map(str, histogram.buckets), "+Inf"], histogram.counts))}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        def label_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"')) for key, value in pairs]
+            return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+                lines.append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} gauge"]
+                lines.append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                cumulative = 0
+                for bound, count in zip([*histogram.buckets, math.inf], histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, width: int = 30) -> str:
+        """Human-readable end-of-run summary with a bar chart per histogram."""
+        def fmt(value: float, name: str) -> str:
+            if name.endswith("_seconds"):
+                return f"{value * 1000:.1f} ms" if value < 1 else f"{value:.2f} s"
+            return f"{value:g}"
+
+        lines = ["=" * 60, "Metrics report", "=" * 60]
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = [(key, histogram) for key, histogram in sorted(self._histograms.items()) if histogram.count]
+        for (name, labels), histogram in histograms:
+            label = ", ".join(f"{key}={value}" for key, value in labels)
+            lines.append(f"{name}{' [' + label + ']' if label else ''}: n={histogram.count} "
+                         f"mean={fmt(histogram.sum / histogram.count, name)} "
+                         f"p50={fmt(histogram.quantile(0.5), name)} p95={fmt(histogram.quantile(0.95), name)} "
+                         f"p99={fmt(histogram.quantile(0.99), name)}")
+            peak = max(histogram.counts)
+            lower = 0.0
+            for bound, count in zip([*histogram.buckets, math.inf], histogram.counts):
+                if count:
+                    bar = "#" * max(1, round(count / peak * width))
+                    upper = "inf" if bound == math.inf else fmt(bound, name)
+                    lines.append(f"    {fmt(lower, name):>9} .. {upper:<9} {bar} {count}")
+                lower = bound
+        for title, values in (("Counters:", counters), ("Gauges:", gauges)):
+            if not values:
+                continue
+            lines.append(title)
+            for (name, labels), value in values:
+                label = ", ".join(f"{key}={value}" for key, value in labels)
+                lines.append(f"    {name}{' [' + label + ']' if label else ''}: {value:g}")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = metrics.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(metrics.to_dict()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics at http://{host}:{port}/metrics and /metrics.json")
+    return server
@@ -0,0 +1,428 @@
+# File: modules/pipeline.py
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, Awaitable, Callable, Iterable
+
+from .dedup import NearDuplicateIndex
+from .generation import (BATCH_SIZE, MAX_CONCURRENCY, generate_batch_async, generate_content_async,
+                         prompt_orchestrator)
+from .job_state import DUPLICATE, FAILED, GENERATED, PENDING, PUBLISHED, STORED, JobTracker
+from .metrics import metrics
+from .processing import post_processor
+from .resilience import backoff_delay, is_retryable, retry_after
+from .storage import PublishRequest, article_storage_manager_async, get_article, mark_published
+
+# Per-stage concurrency. Generation is bounded by the API quota (the adaptive
+# limit in generation.py decides how many requests are really in flight, so
+# there are enough workers for its maximum), storage by how many rows we want
+# in one batch, publishing by what the site tolerates.
+GENERATION_WORKERS = int(os.getenv("PIPELINE_GENERATION_WORKERS", str(MAX_CONCURRENCY)))
+PROCESSING_WORKERS = int(os.getenv("PIPELINE_PROCESSING_WORKERS", "2"))
+STORAGE_WORKERS = int(os.getenv("PIPELINE_STORAGE_WORKERS", "32"))
+PUBLISH_WORKERS = int(os.getenv("PIPELINE_PUBLISH_WORKERS", "4"))
+# Items waiting between two stages; a full queue pauses the stage before it.
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "50"))
+# How often an article whose request kept failing transiently (after the
+# retries in resilience.py) goes back to the end of its stage's queue.
+REQUEUE_LIMIT = int(os.getenv("PIPELINE_REQUEUE_LIMIT", "2"))
+# Base delay of those requeues, doubled on every further requeue.
+REQUEUE_DELAY = float(os.getenv("PIPELINE_REQUEUE_DELAY", "15"))
+
+_DONE = object()  # end-of-stream marker, one per downstream worker
+
+
+@dataclass
+class Article:
+    """One topic as it moves through the pipeline."""
+    topic: str
+    raw_content: str | None = None
+    title: str | None = None
+    html_content: str | None = None
+    article_id: int | None = None
+    post_id: int | None = None  # the WordPress post, when the publisher reports it
+    duplicate_of: str | None = None  # set when dropped as a near-duplicate
+    requeues: int = 0  # times sent back to a stage after a transient failure
+
+
+class ContentPipeline:
+    """
+    topic source -> generation -> processing -> storage -> (optional) publishing
+
+    The topic source is any iterable of topics, or an async iterable for
+    sources that have to wait for their topics (e.g. a work queue).
+
+    Stages are joined by bounded asyncio queues and each has its own worker
+    count, so a slow database or WordPress site only fills its own queue and
+    never holds a generation slot. At most a few queue lengths of topics are
+    in memory, however long the topic list is.
+
+    With a `tracker`, every topic's progress is recorded; with `resume` as
+    well, topics finished by an earlier run are skipped and stored-but-not-
+    published articles go straight to the publishing stage. `on_state` is
+    called with every state change, e.g. to drive a progress display.
+
+    With a `generation_batch_size` above 1, each generation worker takes up
+    to that many queued topics at once and asks for all of them in one
+    request (see `generate_batch_async`). Likewise, given a
+    `publish_batch_size`, the publisher is called with a list of up to that
+    many stored articles (see `wordpress_batch_publisher`).
+
+    Instead of a publisher, a `publish_request` queues every stored article
+    in the publish outbox, in the same transaction as the article; the
+    publisher daemon (publisher.py) posts them at the site's pace.
+
+    A stage whose request fails with a transient error (throttling, an
+    unreachable upstream) even after retrying puts the article back behind
+    the others, up to `REQUEUE_LIMIT` times, instead of failing it, so a
+    partial outage slows the run down rather than emptying it.
+
+    With a `dedup` index, topics that are near-duplicates of a stored article
+    or of an earlier topic are dropped before generation, and generated
+    bodies that repeat a stored one before storage (or only reported, if
+    the index is in "flag" mode).
+    """
+
+    def __init__(self, topics: Iterable[str] | AsyncIterable[str],
+                 publisher: Callable[[Article], Awaitable[bool]] | None = None,
+                 generation_workers: int = GENERATION_WORKERS,
+                 generation_batch_size: int = BATCH_SIZE,
+                 processing_workers: int = PROCESSING_WORKERS,
+                 storage_workers: int = STORAGE_WORKERS,
+                 publish_workers: int = PUBLISH_WORKERS,
+                 publish_batch_size: int | None = None,
+                 queue_size: int = QUEUE_SIZE,
+                 tracker: JobTracker | None = None,
+                 resume: bool = False,
+                 on_state: Callable[[Article, str, str | None], None] | None = None,
+                 dedup: NearDuplicateIndex | None = None,
+                 publish_request: PublishRequest | None = None):
+        self.topics = topics
+        self.publisher = publisher
+        self.publish_request = publish_request
+        self.tracker = tracker
+        self.resume = resume
+        self.on_state = on_state
+        self.dedup = dedup
+        self._stopped = False
+        self.workers = {
+            "generation": generation_workers,
+            "processing": processing_workers,
+            "storage": storage_workers,
+            "publishing": publish_workers if publisher else 0,
+        }
+        self.batch_sizes = {"generation": max(1, generation_batch_size), "publishing": max(1, publish_batch_size or 1)}
+        # Stages whose handler takes a list of articles
+        self.batched = {"generation": generation_batch_size > 1, "publishing": publish_batch_size is not None}
+        self.queue_size = queue_size
+        self.stats = {"topics": 0, "skipped": 0, "duplicates": 0, "generated": 0, "stored": 0, "published": 0,
+                      "failed": 0, "requeued": 0}
+
+    async def run(self) -> dict:
+        """Runs every stage until the topic source is exhausted and all queues are drained."""
+        to_generate = asyncio.Queue(self.queue_size)
+        to_process = asyncio.Queue(self.queue_size)
+        to_store = asyncio.Queue(self.queue_size)
+        to_publish = asyncio.Queue(self.queue_size) if self.publisher else None
+
+        await asyncio.gather(
+            self._source(to_generate),
+            self._stage("generation", self._generate_batch if self.batched["generation"] else self._generate,
+                        to_generate, to_process, "processing"),
+            self._stage("processing", self._process, to_process, to_store, "storage"),
+            self._stage("storage", self._store, to_store, to_publish, "publishing"),
+            *([self._stage("publishing", self._publish_batch if self.batched["publishing"] else self._publish,
+                           to_publish, None, None)] if self.publisher else []),
+        )
+        return self.stats
+
+    def stop(self):
+        """Stops feeding new topics; articles already in flight are finished. Safe to call from any thread."""
+        self._stopped = True
+
+    def _record(self, article: Article, state: str, error: str | None = None):
+        if self.tracker:
+            self.tracker.record(article.topic, state, error, article.article_id)
+        if self.on_state:
+            self.on_state(article, state, error)
+
+    def _resumed_article(self, topic: str) -> Article | None:
+        """Returns the stored article to publish, or None to process the topic normally."""
+        row = self.tracker.lookup(topic)
+        if not row or row[1] is None:
+            return None
+        stored = get_article(row[1])
+        if not stored:
+            return None
+        return Article(topic=topic, title=stored[0], html_content=stored[1], article_id=row[1])
+
+    async def _iter_topics(self):
+        if hasattr(self.topics, "__aiter__"):
+            async for topic in self.topics:
+                yield topic
+        else:
+            for topic in self.topics:
+                yield topic
+
+    async def _source(self, output: asyncio.Queue):
+        publishing = self.publisher is not None
+        async for topic in self._iter_topics():
+            if self._stopped:
+                break
+            self.stats["topics"] += 1
+            article = None
+            if self.resume and self.tracker:
+                # Disk reads, kept off the event loop
+                if await asyncio.to_thread(self.tracker.is_done, topic, publishing):
+                    self.stats["skipped"] += 1
+                    continue
+                if publishing:
+                    article = await asyncio.to_thread(self._resumed_article, topic)
+            if article is None:
+                article = Article(topic=topic)
+                self._record(article, PENDING)
+            await output.put(article)
+        for _ in range(self.workers["generation"]):
+            await output.put(_DONE)
+
+    @staticmethod
+    async def _take(inbox: asyncio.Queue, batch_size: int, timeout: float | None = None) -> list[Article] | None:
+        """
+        Waits for one article, then takes up to `batch_size` - 1 more that
+        are already queued. Returns an empty list if nothing arrived within
+        `timeout` seconds, and None at the end marker.
+        """
+        if timeout is None:
+            article = await inbox.get()
+        else:
+            getter = asyncio.ensure_future(inbox.get())
+            try:
+                await asyncio.wait({getter}, timeout=timeout)
+            finally:
+                getter.cancel()  # no-op once it has its article
+            try:
+                article = await getter
+            except asyncio.CancelledError:
+                return []
+        if article is _DONE:
+            return None
+        batch = [article]
+        while len(batch) < batch_size:
+            try:
+                article = inbox.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if article is _DONE:
+                inbox.put_nowait(_DONE)  # only end markers follow; leave it for the next take
+                break
+            batch.append(article)
+        return batch
+
+    async def _stage(self, name: str, handler: Callable[[Article], Awaitable[bool]],
+                     inbox: asyncio.Queue, outbox: asyncio.Queue | None, next_stage: str | None):
+        batch_size = self.batch_sizes.get(name, 1)
+        batched = self.batched.get(name, False)
+        deferred = []  # (due, article) requeued after a transient failure
+
+        def take_deferred() -> list[Article]:
+            now = time.monotonic()
+            due = [item for item in deferred if item[0] <= now][:batch_size]
+            for item in due:
+                deferred.remove(item)
+            return [article for _, article in due]
+
+        def requeue(article: Article, error: Exception) -> bool:
+            if article.requeues >= REQUEUE_LIMIT or not is_retryable(error):
+                return False
+            article.requeues += 1
+            delay = backoff_delay(article.requeues, REQUEUE_DELAY, REQUEUE_DELAY * 8, retry_after(error))
+            deferred.append((time.monotonic() + delay, article))
+            self.stats["requeued"] += 1
+            metrics.inc("pipeline_requeues_total", stage=name)
+            print(f"   [{name}] Requeued '{article.topic}' (transient failure), retrying in {delay:.0f} s.")
+            return True
+
+        async def worker():
+            while True:
+                batch = take_deferred()
+                if not batch:
+                    # Wait for input only until the next requeued article is due
+                    timeout = max(0.0, min(due for due, _ in deferred) - time.monotonic()) if deferred else None
+                    batch = await self._take(inbox, batch_size, timeout)
+                    if batch == []:
+                        continue
+                if batch is None:
+                    if not deferred:
+                        return
+                    # Requeued articles are still due: keep the end marker for later and wait for them
+                    await inbox.put(_DONE)
+                    await asyncio.sleep(max(0.05, min(due for due, _ in deferred) - time.monotonic()))
+                    continue
+                errors = [f"{name} produced no result"] * len(batch)
+                failure = None
+                started = time.perf_counter()
+                try:
+                    # A batch handler takes the list and returns one result per article
+                    results = await handler(batch) if batched else [await handler(batch[0])]
+                except Exception as e:
+                    print(f"   [{name}] Failed for {', '.join(repr(article.topic) for article in batch)}: {e}")
+                    results, errors, failure = [False] * len(batch), [str(e)] * len(batch), e
+                elapsed = time.perf_counter() - started
+                for article, passed, error in zip(batch, results, errors):
+                    metrics.observe("pipeline_stage_seconds", elapsed, stage=name)
+                    # A batch handler may also return the error of a single article in its place
+                    if isinstance(passed, Exception):
+                        if requeue(article, passed):
+                            continue
+                        passed, error = False, str(passed)
+                    if failure is not None and requeue(article, failure):
+                        continue
+                    if not passed and self.dedup:
+                        self.dedup.release(article.topic)
+                    if article.duplicate_of:
+                        self.stats["duplicates"] += 1
+                        self._record(article, DUPLICATE, article.duplicate_of)
+                    elif not passed:
+                        self.stats["failed"] += 1
+                        self._record(article, FAILED, error)
+                    elif outbox is not None:
+                        await outbox.put(article)
+
+        await asyncio.gather(*(worker() for _ in range(self.workers[name])))
+        if outbox is not None:
+            for _ in range(self.workers[next_stage]):
+                await outbox.put(_DONE)
+
+    def _is_duplicate(self, article: Article, duplicate) -> bool:
+        """Reports a near-duplicate; True if the article should be dropped."""
+        if duplicate is None:
+            return False
+        print(f"Near-duplicate {duplicate.kind}: '{article.topic}' is {duplicate}.")
+        if self.dedup.skip:
+            article.duplicate_of = str(duplicate)
+        return self.dedup.skip
+
+    async def _generate(self, article: Article) -> bool:
+        if article.article_id is not None:  # resumed, only needs publishing
+            return True
+        if self.dedup and self._is_duplicate(article, await asyncio.to_thread(
+                self.dedup.claim_topic, article.topic)):
+            return False
+        print(f"Processing topic: '{article.topic}'")
+        prompt = prompt_orchestrator(article.topic)
+        article.raw_content = await generate_content_async(prompt, article.topic)
+        if not article.raw_content:
+            print(f"Failed to generate content for '{article.topic}'. Skipping.")
+            return False
+        self.stats["generated"] += 1
+        self._record(article, GENERATED)
+        return True
+
+    async def _generate_batch(self, articles: list[Article]) -> list[bool]:
+        results = [True] * len(articles)
+        pending = []
+        for index, article in enumerate(articles):
+            if article.article_id is not None:  # resumed, only needs publishing
+                continue
+            if self.dedup and self._is_duplicate(article, await asyncio.to_thread(
+                    self.dedup.claim_topic, article.topic)):
+                results[index] = False
+                continue
+            pending.append(index)
+        if not pending:
+            return results
+
+        print(f"Processing {len(pending)} topics in one request: {', '.join(repr(articles[i].topic) for i in pending)}")
+        raw_contents = await generate_batch_async([articles[index].topic for index in pending])
+        for index, raw_content in zip(pending, raw_contents):
+            article = articles[index]
+            article.raw_content = raw_content
+            if not raw_content:
+                print(f"Failed to generate content for '{article.topic}'. Skipping.")
+                results[index] = False
+                continue
+            self.stats["generated"] += 1
+            self._record(article, GENERATED)
+        return results
+
+    async def _process(self, article: Article) -> bool:
+        if article.article_id is not None:
+            return True
+        # post_processor takes microseconds, so it runs inline on the loop
+        started = time.perf_counter()
+        article.title, article.html_content = post_processor(article.raw_content)
+        metrics.observe("post_processor_seconds", time.perf_counter() - started)
+        article.raw_content = None  # no longer needed, free it early
+        return bool(article.title and article.html_content)
+
+    async def _store(self, article: Article) -> bool:
+        if article.article_id is not None:
+            return True
+        if self.dedup and self._is_duplicate(article, await asyncio.to_thread(
+                self.dedup.claim_article, article.topic, article.html_content)):
+            return False
+        article.article_id = await article_storage_manager_async(article.title, article.html_content, article.topic,
+                                                                 self.publish_request)
+        if article.article_id is None:
+            return False
+        if self.dedup:
+            await asyncio.to_thread(self.dedup.add, article.article_id, article.topic, article.html_content)
+        self.stats["stored"] += 1
+        self._record(article, STORED)
+        return True
+
+    def _published(self, article: Article):
+        self.stats["published"] += 1
+        if article.article_id is not None:
+            mark_published(article.article_id, article.post_id)
+        self._record(article, PUBLISHED)
+
+    async def _publish(self, article: Article) -> bool:
+        if not await self.publisher(article):
+            return False
+        self._published(article)
+        return True
+
+    async def _publish_batch(self, articles: list[Article]) -> list:
+        results = await self.publisher(articles)
+        for article, result in zip(articles, results):
+            if result is True:
+                self._published(article)
+        return results
+
+
+def wordpress_publisher(publisher, status: str = "publish",
+                        image_path: str | None = None) -> Callable[[Article], Awaitable[bool]]:
+    """Adapts an AsyncWordPressPublisher to the pipeline's publishing stage."""
+    async def publish(article: Article) -> bool:
+        # Transient failures are raised, so the pipeline requeues the article
+        article.post_id = await publisher.publish(article.title, article.html_content, status, image_path,
+                                                  raise_transient=True)
+        return article.post_id is not None
+
+    return publish
+
+
+def wordpress_batch_publisher(publisher, status: str = "publish",
+                              image_path: str | None = None) -> Callable[[list[Article]], Awaitable[list]]:
+    """
+    Adapts an AsyncWordPressPublisher to a batched publishing stage (pass
+    `publish_batch_size`, e.g. WP_BATCH_SIZE): the articles are created
+    through the REST batch endpoint, and one that failed transiently is
+    requeued on its own.
+    """
+    async def publish(articles: list[Article]) -> list:
+        post_ids = await publisher.publish_batch([(article.title, article.html_content) for article in articles],
+                                                 status, image_path, return_transient=True)
+        results = []
+        for article, post_id in zip(articles, post_ids):
+            if isinstance(post_id, Exception):
+                results.append(post_id)
+                continue
+            article.post_id = post_id
+            results.append(post_id is not None)
+        return results
+
+    return publish
@@ -3,73 +3,209 @@
 
 import re
 
-def post_processor(raw_text: str) -> tuple[str | None, str | None]:
+# Patterns are compiled once at import. Headings and paragraphs are matched
+# case-insensitively, exactly like the original r'<h1.*?>(.*?)</h1>' searches.
+_WRAPPER_TAGS = ("<body>", "</body>", "<html>", "</html>")
+_WRAPPER_RE = re.compile(r"</?(?:body|html)>")
+_INNER_TAG_RE = re.compile(r"<[^<]+?>")
+_OPEN_RE = {tag: re.compile(f"<{tag}", re.IGNORECASE) for tag in ("h1", "h2", "p")}
+_CLOSE_RE = {tag: re.compile(f"</{tag}>", re.IGNORECASE) for tag in ("h1", "h2", "p")}
+
+# Delimiters around each article of a multi-topic answer (see batch_prompt_orchestrator)
+BATCH_START = "<!-- ARTICLE {number} START -->"
+BATCH_END = "<!-- ARTICLE {number} END -->"
+_BATCH_BLOCK_RE = re.compile(
+    r"<!--\s*ARTICLE\s+(\d+)\s+START\s*-->(.*?)<!--\s*ARTICLE\s+\1\s+END\s*-->", re.IGNORECASE | re.DOTALL)
+
+
+def _clean_wrappers(text: str) -> str:
+    """Removes a surrounding ```html fence and stray <html>/<body> tags."""
+    if text.startswith("```"):
+        if text.startswith("```html\n"):
+            text = text[8:]
+        elif text.startswith("```\n"):
+            text = text[4:]
+        if text.endswith("\n```"):
+            text = text[:-4]
+
+    # One scan decides whether any wrapper is present; the tag-by-tag replace
+    # is kept because its order matters when removing one tag glues another together.
+    if _WRAPPER_RE.search(text):
+        for tag in _WRAPPER_TAGS:
+            text = text.replace(tag, "")
+    return text
+
+
+def _next_block(text: str, tag: str, start: int) -> tuple[int, int, int, int] | None:
     """
-    Cleans raw, model-generated HTML, removes common wrappers,
-    extracts the title from the <h1> tag, and returns the cleaned HTML content.
+    Finds the next `<tag ...>...</tag>` at or after `start` and returns
+    (block start, inner start, inner end, block end), or None.
+
+    If the first opening tag has no closing match, no later one can have one
+    either, so a single forward scan is enough.
     """
-    if not raw_text:
-        return None, None
+    opening = _OPEN_RE[tag].search(text, start)
+    if not opening:
+        return None
+    inner_start = text.find(">", opening.end()) + 1
+    if not inner_start:
+        return None
+    closing = _CLOSE_RE[tag].search(text, inner_start)
+    if not closing:
+        return None
+    return opening.start(), inner_start, closing.start(), closing.end()
+
+
+def _extract_blocks(text: str, tag: str) -> tuple[str | None, str]:
+    """
+    Walks the text once, returning the inner HTML of the first `tag` block and
+    the text with every such block removed.
+    """
+    first_inner = None
+    pieces = []
+    position = 0
+    block = _next_block(text, tag, 0)
+    while block:
+        block_start, inner_start, inner_end, block_end = block
+        if first_inner is None:
+            first_inner = text[inner_start:inner_end]
+        pieces.append(text[position:block_start])
+        position = block_end
+        block = _next_block(text, tag, position)
+    if first_inner is None:
+        return None, text
+    pieces.append(text[position:])
+    return first_inner, "".join(pieces)
 
-    # --- 1. Aggressive Cleaning Stage ---
 
-    # Start with stripping any leading/trailing whitespace
-    cleaned_text = raw_text.strip()
+def _shorten(text: str) -> str:
+    return text[:50] + "..." if len(text) > 50 else text
 
-    # Remove Markdown code blocks if they still appear (e.g., ```html)
-    if cleaned_text.startswith('```'):
-        cleaned_text = re.sub(r'^```(html)?\n', '', cleaned_text)
-        cleaned_text = re.sub(r'\n```$', '', cleaned_text)
 
-    # Remove any stray <body> or <html> tags that might wrap the content
-    cleaned_text = cleaned_text.replace("<body>", "").replace("</body>", "")
-    cleaned_text = cleaned_text.replace("<html>", "").replace("</html>", "")
+def post_processor(raw_text: str) -> tuple[str | None, str | None]:
+    """
+    Cleans raw, model-generated HTML, removes common wrappers,
+    extracts the title from the <h1> tag, and returns the cleaned HTML content.
 
-    # --- 2. Extraction and Finalization Stage ---
+    The title heading is found and removed in the same forward walk; the
+    <h2>, <p> and plain-text fallbacks are only scanned when no <h1> exists.
+    """
+    if not raw_text:
+        return None, None
 
-    # Find the title within the first h1 tag
-    # The regex looks for an <h1> tag, captures its content non-greedily, and closes it.
-    # It is case-insensitive (re.IGNORECASE) and handles newlines inside the tag (re.DOTALL)
-    title_match = re.search(r'<h1.*?>(.*?)</h1>', cleaned_text, re.IGNORECASE | re.DOTALL)
+    cleaned_text = _clean_wrappers(raw_text.strip())
 
-    if title_match:
-        # The title is just the text content of the H1 tag.
-        # We also strip any potential HTML tags that might be inside the h1 tag itself.
-        title_text = re.sub('<[^<]+?>', '', title_match.group(1)) # Remove tags
-        title = title_text.strip()
+    # Title from the first h1; every h1 is dropped to avoid duplicate titles in WordPress
+    title_html, content = _extract_blocks(cleaned_text, "h1")
+    if title_html is not None:
+        title = _INNER_TAG_RE.sub("", title_html).strip()
     else:
-        # Fallback 1: Try to find h2 tags
-        h2_match = re.search(r'<h2.*?>(.*?)</h2>', cleaned_text, re.IGNORECASE | re.DOTALL)
-        if h2_match:
-            title_text = re.sub('<[^<]+?>', '', h2_match.group(1))
-            title = title_text.strip()
+        # Fallback 1: the first h2 becomes the title and all h2 tags are removed
+        title_html, content = _extract_blocks(cleaned_text, "h2")
+        if title_html is not None:
+            title = _INNER_TAG_RE.sub("", title_html).strip()
         else:
-            # Fallback 2: Try to extract from the first paragraph or any text
-            p_match = re.search(r'<p.*?>(.*?)</p>', cleaned_text, re.IGNORECASE | re.DOTALL)
-            if p_match:
-                # Take first 50 characters from first paragraph as title
-                title_text = re.sub('<[^<]+?>', '', p_match.group(1))
-                title = title_text.strip()[:50] + "..." if len(title_text.strip()) > 50 else title_text.strip()
+            # Fallback 2: first 50 characters of the first paragraph
+            paragraph = _next_block(cleaned_text, "p", 0)
+            if paragraph:
+                title = _shorten(_INNER_TAG_RE.sub("", cleaned_text[paragraph[1]:paragraph[2]]).strip())
             else:
-                # Fallback 3: Extract any text content and use first line
-                text_content = re.sub('<[^<]+?>', '', cleaned_text)
-                lines = [line.strip() for line in text_content.split('\n') if line.strip()]
-                if lines:
-                    title = lines[0][:50] + "..." if len(lines[0]) > 50 else lines[0]
-                else:
-                    title = "Untitled Article"
-
-    # Remove the H1 tag from the content since we've extracted it as the title
-    # This prevents duplicate titles when publishing to WordPress
-    content_without_h1 = re.sub(r'<h1.*?>.*?</h1>', '', cleaned_text, flags=re.IGNORECASE | re.DOTALL)
-    
-    # Also remove H2 tags if we used them for title extraction
-    if not title_match and h2_match:
-        content_without_h1 = re.sub(r'<h2.*?>.*?</h2>', '', content_without_h1, flags=re.IGNORECASE | re.DOTALL)
-    
-    full_html_content = content_without_h1.strip()
+                # Fallback 3: first line of the remaining text content
+                text_content = _INNER_TAG_RE.sub("", cleaned_text)
+                lines = [line.strip() for line in text_content.split("\n") if line.strip()]
+                title = _shorten(lines[0]) if lines else "Untitled Article"
+
+    full_html_content = content.strip()
 
     if not full_html_content:
         return None, None
 
-    return title, full_html_content
\ No newline at end of file
+    return title, full_html_content
+
+
+def split_batch_response(raw_text: str, count: int) -> list[str | None]:
+    """
+    Separates a multi-topic answer into the raw text of each of its `count`
+    articles, in topic order. An article whose delimiters are missing,
+    mismatched or repeated, or which holds no usable content, is None so
+    the caller can retry that topic on its own.
+    """
+    parts = [None] * count
+    seen = set()
+    for match in _BATCH_BLOCK_RE.finditer(raw_text or ""):
+        index = int(match.group(1)) - 1
+        if not 0 <= index < count:
+            continue
+        if index in seen:  # ambiguous: do not guess which one is meant
+            parts[index] = None
+            continue
+        seen.add(index)
+        text = match.group(2).strip()
+        parts[index] = text if post_processor(text)[1] else None
+    return parts
+
+
+def batch_post_processor(raw_text: str, count: int) -> list[tuple[str | None, str | None]]:
+    """`post_processor` for each article of a multi-topic answer; (None, None) where it is malformed."""
+    return [post_processor(part) if part else (None, None) for part in split_batch_response(raw_text, count)]
+
+
+class StreamingPostProcessor:
+    """
+    Incremental companion to `post_processor` for streamed responses.
+
+    `feed()` takes each chunk as it arrives and returns the title once the
+    first <h1> has closed, plus any newly completed sections (a section ends
+    where the next <h2> begins). These are for previewing only; `finish()`
+    returns exactly what `post_processor` gives for the whole text.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._text = ""
+        self._emitted = 0  # offset in self._text up to which sections were returned
+        self.title = None
+
+    def feed(self, chunk: str) -> tuple[str | None, list[str]]:
+        """Adds a chunk; returns (title if it just became known, newly completed sections)."""
+        self._chunks.append(chunk)
+        self._text += chunk
+        text = self._text
+
+        if self._emitted == 0:
+            start = len(text) - len(text.lstrip())
+            if text.startswith("```", start):
+                newline = text.find("\n", start)
+                if newline < 0:
+                    return None, []  # wait for the rest of the fence line
+                start = newline + 1
+            self._emitted = start
+
+        new_title = None
+        if self.title is None:
+            block = _next_block(text, "h1", 0)
+            if block:
+                self.title = _INNER_TAG_RE.sub("", text[block[1]:block[2]]).strip()
+                new_title = self.title
+
+        # Everything before the last <h2> is complete, unless an <h1> is still open.
+        boundary = self._emitted
+        for opening in _OPEN_RE["h2"].finditer(text, self._emitted + 1):
+            boundary = opening.start()
+        pending_h1 = _OPEN_RE["h1"].search(text, self._emitted, boundary)
+        if pending_h1 and not _next_block(text, "h1", pending_h1.start()):
+            boundary = pending_h1.start()
+        if boundary <= self._emitted:
+            return new_title, []
+
+        section = text[self._emitted:boundary]
+        self._emitted = boundary
+        _, section = _extract_blocks(section, "h1")
+        for tag in _WRAPPER_TAGS:
+            section = section.replace(tag, "")
+        section = section.strip()
+        return new_title, [section] if section else []
+
+    def finish(self) -> tuple[str | None, str | None]:
+        """Returns the final (title, html) for the complete response."""
+        return post_processor("".join(self._chunks))
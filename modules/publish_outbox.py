@@ -0,0 +1,304 @@
+# File: modules/publish_outbox.py
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable
+
+from .metrics import metrics
+from .rate_limiter import TokenBucket
+from .resilience import backoff_delay
+from .storage import DB_FILE, connect
+
+# Batch requests the daemon has in flight at once, and posts per second it
+# sends at most (a batch request counts once per post in it, as WordPress
+# runs every post of a batch as a request of its own).
+PUBLISHER_CONCURRENCY = int(os.getenv("PUBLISHER_CONCURRENCY", "2"))
+PUBLISHER_RPS = float(os.getenv("PUBLISHER_RPS", "1"))
+# Articles claimed at once; they are posted in batches of up to WP_BATCH_SIZE.
+PUBLISHER_CLAIM_BATCH = int(os.getenv("PUBLISHER_CLAIM_BATCH", "25"))
+# A claimed article belongs to its daemon for this long. It must outlast the
+# retries of one publish attempt, or another daemon could post it again.
+PUBLISHER_LEASE_SECONDS = float(os.getenv("PUBLISHER_LEASE_SECONDS", "900"))
+# Attempts per article, and the backoff between them (full jitter, doubling up to the maximum)
+PUBLISHER_MAX_ATTEMPTS = int(os.getenv("PUBLISHER_MAX_ATTEMPTS", "6"))
+PUBLISHER_RETRY_DELAY = float(os.getenv("PUBLISHER_RETRY_DELAY", "60"))
+PUBLISHER_MAX_RETRY_DELAY = float(os.getenv("PUBLISHER_MAX_RETRY_DELAY", "3600"))
+# Longest sleep while nothing is due; articles stored meanwhile wait at most this long.
+PUBLISHER_POLL_INTERVAL = float(os.getenv("PUBLISHER_POLL_INTERVAL", "5"))
+
+# States of an outbox row; a failed article is retried with `retry_failed`
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class OutboxItem:
+    """One claimed article. The token fences it: only its holder can settle it."""
+    article_id: int
+    title: str | None
+    content: str | None
+    status: str
+    image_path: str | None
+    attempts: int
+    token: str
+
+
+class PublishOutbox:
+    """
+    The `publish_outbox` table, drained by `OutboxPublisher`.
+
+    Rows are added by the storage engine together with their articles (see
+    `PublishRequest`). A claim leases due rows by pushing their `publish_at`
+    to the end of the lease, so a row whose daemon died becomes due again
+    on its own; every claim is one `UPDATE ... RETURNING` under the write
+    lock, so several daemons can share the database.
+    """
+
+    def __init__(self, db_file: str = DB_FILE, max_attempts: int = PUBLISHER_MAX_ATTEMPTS,
+                 retry_delay: float = PUBLISHER_RETRY_DELAY, max_retry_delay: float = PUBLISHER_MAX_RETRY_DELAY):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()  # one transaction at a time on the shared connection
+        self._conn = connect(db_file)  # registers article_body() for the article_text view
+        self._conn.isolation_level = None
+
+    def _transaction(self, work: Callable):
+        # BEGIN IMMEDIATE takes the write lock up front, so a claim never
+        # fails halfway on a lock upgrade
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def claim(self, limit: int, lease_seconds: float = PUBLISHER_LEASE_SECONDS) -> list[OutboxItem]:
+        """Leases up to `limit` due articles, earliest first, with their title and body."""
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def claim(conn):
+            # Articles whose daemons died too often are given up on, not retried forever
+            conn.execute(
+                """
+                UPDATE publish_outbox SET state = ?, error = 'lease expired ' || attempts || ' times',
+                    lease_token = NULL, updated_at = ?
+                WHERE state = ? AND publish_at <= ? AND attempts >= ?
+                """, (FAILED, now, LEASED, now, self.max_attempts))
+            return conn.execute(
+                """
+                UPDATE publish_outbox SET state = ?, lease_token = ?, publish_at = ?, attempts = attempts + 1,
+                    updated_at = ?
+                WHERE article_id IN (
+                    SELECT article_id FROM publish_outbox
+                    WHERE state IN (?, ?) AND publish_at <= ?
+                    ORDER BY publish_at LIMIT ?
+                )
+                RETURNING article_id, post_status, image_path, attempts
+                """, (LEASED, token, now + lease_seconds, now, PENDING, LEASED, now, limit)).fetchall()
+
+        claimed = self._transaction(claim)
+        if not claimed:
+            return []
+        # Bodies are decompressed after the commit, so the write lock is only held for the claim
+        ids = [row[0] for row in claimed]
+        with self._lock:
+            texts = {article_id: (title, content) for article_id, title, content in self._conn.execute(
+                f"SELECT id, title, content FROM article_text WHERE id IN ({', '.join('?' * len(ids))})", ids)}
+        return [OutboxItem(article_id, *texts.get(article_id, (None, None)), status, image_path, attempts, token)
+                for article_id, status, image_path, attempts in claimed]
+
+    def finish(self, outcomes: list[tuple[OutboxItem, str, int | None, str | None]]) -> int:
+        """
+        Settles claimed articles as (item, state, post_id, error): DONE with
+        the new post (the article is marked published too), FAILED, or
+        PENDING to retry after a backoff. Returns how many were still held.
+        """
+        now = time.time()
+
+        def finish(conn):
+            held = 0
+            for item, state, post_id, error in outcomes:
+                publish_at = now
+                if state == PENDING:
+                    if item.attempts >= self.max_attempts:
+                        state = FAILED
+                    else:
+                        publish_at = now + backoff_delay(item.attempts, self.retry_delay, self.max_retry_delay)
+                settled = conn.execute(
+                    """
+                    UPDATE publish_outbox SET state = ?, post_id = ?, error = ?, publish_at = ?, lease_token = NULL,
+                        updated_at = ?
+                    WHERE article_id = ? AND lease_token = ? AND state = ?
+                    """, (state, post_id, error, publish_at, now, item.article_id, item.token, LEASED)).rowcount
+                if settled and state == DONE:
+                    conn.execute("UPDATE articles SET status = 'published', post_id = ? WHERE id = ?",
+                                 (post_id, item.article_id))
+                held += settled
+            return held
+
+        return self._transaction(finish) if outcomes else 0
+
+    def next_due(self) -> float | None:
+        """When the earliest pending or leased article is due, or None if there is none."""
+        with self._lock:
+            return self._conn.execute("SELECT MIN(publish_at) FROM publish_outbox WHERE state IN (?, ?)",
+                                      (PENDING, LEASED)).fetchone()[0]
+
+    def counts(self) -> dict:
+        """Number of articles in each state."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM publish_outbox GROUP BY state"))
+
+    def failures(self, limit: int = 20) -> list[tuple[int, str, str | None]]:
+        """(article_id, title, error) of the most recent failures."""
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT o.article_id, a.title, o.error FROM publish_outbox o LEFT JOIN articles a ON a.id = o.article_id
+                WHERE o.state = ? ORDER BY o.updated_at DESC LIMIT ?
+                """, (FAILED, limit)).fetchall()
+
+    def retry_failed(self) -> int:
+        """Puts failed articles back in the outbox with a fresh attempt budget."""
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE publish_outbox SET state = ?, attempts = 0, error = NULL, publish_at = ?, updated_at = ? "
+            "WHERE state = ?", (PENDING, now, now, FAILED)).rowcount)
+
+    def close(self):
+        self._conn.close()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_publish_outbox() -> PublishOutbox:
+    """Returns the process-wide outbox connection, e.g. for status displays."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = PublishOutbox()
+        return _outbox
+
+
+class OutboxPublisher:
+    """
+    The publisher daemon: claims due articles from the outbox and posts them
+    through an AsyncWordPressPublisher, independently of generation.
+
+    At most `concurrency` batch requests are in flight, and a token bucket
+    holds the daemon to `rps` posts per second, whatever the outbox holds.
+    An article that failed transiently (after the publisher's own retries)
+    goes back to the outbox with a growing delay; one WordPress rejected, or
+    that ran out of attempts, is marked failed. With `wait`, the daemon
+    keeps polling for new and scheduled articles; otherwise it returns once
+    nothing is due.
+
+    Publishing is at-least-once: if a daemon dies after WordPress created a
+    post but before the outbox recorded it, the post is created again when
+    the lease expires.
+    """
+
+    def __init__(self, outbox: PublishOutbox, publisher, concurrency: int = PUBLISHER_CONCURRENCY,
+                 rps: float = PUBLISHER_RPS, claim_batch: int = PUBLISHER_CLAIM_BATCH,
+                 lease_seconds: float = PUBLISHER_LEASE_SECONDS, poll_interval: float = PUBLISHER_POLL_INTERVAL,
+                 wait: bool = True):
+        self.outbox = outbox
+        self.publisher = publisher
+        self.concurrency = max(1, concurrency)
+        self.claim_batch = max(1, claim_batch)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.wait = wait
+        # Refills at `rps` posts per second, with bursts of up to one second's worth (at least one post)
+        self._bucket = TokenBucket(max(rps, 1), max(rps, 1) / rps) if rps > 0 else None
+        self._stopped = False
+        self.stats = {"claimed": 0, "published": 0, "retried": 0, "failed": 0}
+
+    def stop(self):
+        """Stops claiming; batches in flight are finished."""
+        self._stopped = True
+
+    async def run(self) -> dict:
+        slots = asyncio.Semaphore(self.concurrency)
+        in_flight = set()
+        while not self._stopped:
+            await slots.acquire()
+            items = await asyncio.to_thread(self.outbox.claim, self.claim_batch, self.lease_seconds)
+            if items:
+                self.stats["claimed"] += len(items)
+                task = asyncio.create_task(self._publish(items))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                task.add_done_callback(lambda _: slots.release())
+                continue
+            slots.release()
+            if in_flight:
+                # Their retries or the rest of a burst may be due soon
+                await asyncio.wait(in_flight, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            elif not self.wait:
+                break
+            else:
+                next_due = await asyncio.to_thread(self.outbox.next_due)
+                delay = self.poll_interval if next_due is None else next_due - time.time()
+                await asyncio.sleep(min(max(delay, 0.05), self.poll_interval))
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return self.stats
+
+    async def _throttle(self, posts: int):
+        if self._bucket is None:
+            return
+        now = time.monotonic()
+        # One unit per post; the last reservation tells when the whole batch fits
+        delay = max(self._bucket.reserve(1, now) for _ in range(posts))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _publish(self, items: list[OutboxItem]):
+        outcomes = [(item, FAILED, None, "article no longer stored") for item in items if item.title is None]
+        groups = {}
+        for item in items:
+            if item.title is not None:
+                groups.setdefault((item.status, item.image_path), []).append(item)
+        for (status, image_path), group in groups.items():
+            await self._throttle(len(group))
+            try:
+                results = await self.publisher.publish_batch([(item.title, item.content) for item in group],
+                                                             status, image_path, return_transient=True)
+            except Exception as e:  # e.g. the featured image could not be uploaded
+                results = [e] * len(group)
+            for item, result in zip(group, results):
+                if isinstance(result, Exception):
+                    error = str(result).splitlines()[0] if str(result) else type(result).__name__
+                    outcomes.append((item, PENDING, None, error))
+                elif result is None:
+                    # Rejected, or failed in a way that may have created it: retrying could post it twice
+                    outcomes.append((item, FAILED, None, "WordPress did not confirm the post (see the publisher log)"))
+                else:
+                    outcomes.append((item, DONE, result, None))
+        await asyncio.to_thread(self.outbox.finish, outcomes)
+        for item, state, _, error in outcomes:
+            if state == DONE:
+                outcome = "published"
+            elif state == PENDING and item.attempts < self.outbox.max_attempts:
+                outcome = "retried"
+                print(f"   [Outbox] Article {item.article_id} will be retried (attempt {item.attempts}): {error}")
+            else:
+                outcome = "failed"
+                print(f"   [Outbox] Article {item.article_id} failed: {error}")
+            self.stats[outcome] += 1
+            metrics.inc("outbox_articles_total", outcome=outcome)
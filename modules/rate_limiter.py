@@ -0,0 +1,76 @@
+# File: modules/rate_limiter.py
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A bucket holding up to `capacity` units that refills continuously at
+    `capacity` units per `period` seconds.
+
+    Callers reserve units up front and are told how long to wait, so nobody
+    holds a lock while sleeping and waiters are served in arrival order.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, units: float, now: float) -> float:
+        """Takes `units` from the bucket and returns the seconds until they are actually available."""
+        self._refill(now)
+        self._level -= min(units, self.capacity)
+        if self._level >= 0:
+            return 0.0
+        return -self._level / self.rate
+
+    def give_back(self, units: float, now: float):
+        """Returns (or, with a negative value, charges) units after the real cost is known."""
+        self._refill(now)
+        self._level = min(self.capacity, self._level + units)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by every caller in the process.
+
+    `acquire()` blocks the calling thread, `acquire_async()` only suspends the
+    calling coroutine, so other tasks keep running on the event loop.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            return max(self._requests.reserve(1, now), self._tokens.reserve(tokens, now))
+
+    def acquire(self, tokens: int = 0):
+        """Waits (blocking) until one request and `tokens` tokens fit within the quota."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int = 0):
+        """Waits (without blocking the event loop) until one request and `tokens` tokens fit within the quota."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int | None):
+        """Corrects the token bucket once the response reports how many tokens were really used."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens.give_back(estimated_tokens - actual_tokens, time.monotonic())
@@ -0,0 +1,274 @@
+# File: modules/resilience.py
+
+import asyncio
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+
+from .metrics import metrics
+
+# Attempts per call (first try included) and the exponential backoff between them.
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+# Consecutive upstream failures that open a circuit, and how long it stays
+# open before one probe request is let through (doubling while probes fail).
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+BREAKER_MAX_RESET = float(os.getenv("BREAKER_MAX_RESET", "300"))
+
+# Statuses that say "not processed, try later", safe to retry even for a POST
+# that creates something. 500 and 504 may have been processed.
+_SAFE_STATUSES = {429, 502, 503}
+_RETRY_IN_RE = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+# Some SDK errors carry their status only in the message: "429 Resource has been exhausted"
+_STATUS_PREFIX_RE = re.compile(r"([45]\d\d)\b")
+
+
+def status_code(error: BaseException) -> int | None:
+    """The HTTP status behind an SDK, requests or httpx error, if any."""
+    for code in (getattr(error, "code", None), getattr(error, "status_code", None),
+                 getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(code, int):
+            return code
+    match = _STATUS_PREFIX_RE.match(str(error))
+    return int(match.group(1)) if match else None
+
+
+def _is_connection_error(error: BaseException, idempotent: bool) -> bool:
+    names = {cls.__name__ for cls in type(error).__mro__}
+    # Connecting failed: nothing was sent, always safe to retry
+    if names & {"ConnectError", "ConnectTimeout", "ConnectionRefusedError", "PoolTimeout"}:
+        return True
+    # The request may have arrived; only repeat it if doing so twice is harmless
+    return idempotent and bool(names & {"ConnectionError", "TimeoutError", "Timeout", "TimeoutException",
+                                        "RemoteProtocolError", "ReadError"})
+
+
+def safe_to_resend(code: int) -> bool:
+    """Whether a response with this status says the request was not processed, so even a POST may be sent again."""
+    return code in _SAFE_STATUSES
+
+
+def is_retryable(error: BaseException, idempotent: bool = True) -> bool:
+    """Whether repeating the call may succeed: throttling, 5xx, timeouts and dropped connections."""
+    code = status_code(error)
+    if code is not None:
+        return safe_to_resend(code) or (idempotent and (code == 408 or 500 <= code < 600))
+    return _is_connection_error(error, idempotent)
+
+
+def upstream_failed(error: BaseException) -> bool:
+    """Whether the error means the service itself is failing (what a circuit breaker counts)."""
+    code = status_code(error)
+    if code is not None:
+        return code >= 500
+    return _is_connection_error(error, True)
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds the server asked us to wait: a Retry-After header or a "retry in 12.5s" hint."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    match = _RETRY_IN_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY,
+                  server_delay: float | None = None) -> float:
+    """
+    "Full jitter" exponential backoff: a random delay up to base * 2^(attempt-1),
+    so callers that failed together do not retry together. A server-requested
+    delay is a lower bound.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+    if server_delay is not None:
+        delay = max(delay, min(server_delay, cap) + random.uniform(0, base / 2))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Stops dispatching to an upstream that keeps failing.
+
+    Closed: calls go through. After `failures` consecutive upstream failures
+    it opens: callers wait until `reset_timeout` has passed, then a single
+    probe call is let through (half-open) while the others keep waiting.
+    A successful probe closes the circuit; a failed one opens it again for
+    twice as long, up to `max_reset_timeout`. `pause()` additionally holds
+    dispatch for a server-requested Retry-After.
+
+    Waiting is a plain sleep (blocking or awaited), so one instance serves
+    threads and event loops alike.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET,
+                 max_reset_timeout: float = BREAKER_MAX_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._open_for = reset_timeout
+        self._open_until = 0.0
+        self._paused_until = 0.0
+        self._probing = False
+
+    def _permit(self) -> tuple[float, bool]:
+        """(seconds to wait, whether this caller is the probe); wait 0 means go now."""
+        with self._lock:
+            now = time.monotonic()
+            if self._paused_until > now:
+                return self._paused_until - now, False
+            if self.state == "closed":
+                return 0.0, False
+            if self.state == "open" and now >= self._open_until:
+                self._set_state("half_open")
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return 0.0, True
+            return max(self._open_until - now, 0.25), False
+
+    def wait(self) -> bool:
+        """Blocks until a call may be made; returns True if it is the half-open probe."""
+        while True:
+            delay, probe = self._permit()
+            if delay <= 0:
+                return probe
+            time.sleep(min(delay, 5.0))
+
+    async def wait_async(self) -> bool:
+        """Like `wait`, but only suspends the calling coroutine."""
+        while True:
+            delay, probe = self._permit()
+            if delay <= 0:
+                return probe
+            await asyncio.sleep(min(delay, 5.0))
+
+    def pause(self, seconds: float):
+        """Holds every call to this upstream for `seconds` (e.g. a Retry-After on a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._probing = False
+            if self.state != "closed":
+                self._open_for = self.reset_timeout
+                self._set_state("closed")
+                print(f"   [Breaker] {self.name}: upstream is back, circuit closed.")
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            probe_failed = self.state == "half_open"
+            self._probing = False
+            if probe_failed or (self.state == "closed" and self._consecutive >= self.failures):
+                if probe_failed:
+                    self._open_for = min(self._open_for * 2, self.max_reset_timeout)
+                self._open_until = time.monotonic() + self._open_for
+                self._set_state("open")
+                print(f"   [Breaker] {self.name}: {self._consecutive} failures in a row, "
+                      f"pausing calls for {self._open_for:.0f} s.")
+
+    def abandon_probe(self):
+        """The probe was cancelled before it told us anything; let another caller probe."""
+        with self._lock:
+            self._probing = False
+
+    def _set_state(self, state: str):
+        # Caller holds the lock
+        self.state = state
+        metrics.set("circuit_breaker_open", 0 if state == "closed" else 1, upstream=self.name)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker of one upstream, created on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _after_failure(breaker: CircuitBreaker | None, error: Exception, attempt: int, attempts: int,
+                   idempotent: bool, label: str) -> float | None:
+    """Books a failed attempt; returns the delay before the next one, or None to give up."""
+    retryable = is_retryable(error, idempotent)
+    if breaker:
+        if upstream_failed(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()  # e.g. a 400 or 429: the service is up
+    if not retryable or attempt >= attempts:
+        return None
+    server_delay = retry_after(error)
+    if breaker and server_delay:
+        breaker.pause(server_delay)
+    delay = backoff_delay(attempt, server_delay=server_delay)
+    reason = str(status_code(error) or type(error).__name__)
+    metrics.inc("retries_total", upstream=breaker.name if breaker else label, reason=reason)
+    print(f"   [Retry] {label}: attempt {attempt}/{attempts} failed ({reason}), retrying in {delay:.1f} s.")
+    return delay
+
+
+def call_with_retry(call, breaker: CircuitBreaker | None = None, attempts: int = RETRY_ATTEMPTS,
+                    idempotent: bool = True, label: str = "request"):
+    """Runs `call()` until it succeeds, backing off between retryable failures; re-raises the last error."""
+    for attempt in range(1, attempts + 1):
+        probe = breaker.wait() if breaker else False
+        try:
+            result = call()
+        except Exception as e:
+            delay = _after_failure(breaker, e, attempt, attempts, idempotent, label)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        except BaseException:
+            if probe:
+                breaker.abandon_probe()
+            raise
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+async def call_with_retry_async(call, breaker: CircuitBreaker | None = None, attempts: int = RETRY_ATTEMPTS,
+                                idempotent: bool = True, label: str = "request"):
+    """Async counterpart of `call_with_retry`; `call()` returns a new awaitable for every attempt."""
+    for attempt in range(1, attempts + 1):
+        probe = await breaker.wait_async() if breaker else False
+        try:
+            result = await call()
+        except Exception as e:
+            delay = _after_failure(breaker, e, attempt, attempts, idempotent, label)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            if probe:
+                breaker.abandon_probe()
+            raise
+        if breaker:
+            breaker.record_success()
+        return result
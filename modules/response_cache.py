@@ -0,0 +1,120 @@
+# File: modules/response_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# The cache lives in its own file next to articles.db so it can be deleted independently.
+CACHE_DB_FILE = os.getenv("RESPONSE_CACHE_DB", "response_cache.db")
+CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+# RESPONSE_CACHE=0 disables the cache, RESPONSE_CACHE_REFRESH=1 ignores stored answers but still saves new ones.
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+CACHE_REFRESH = os.getenv("RESPONSE_CACHE_REFRESH", "0") == "1"
+
+# Eviction scans the table, so it only runs every this many writes.
+_EVICT_EVERY = 100
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses keyed by (model name, prompt hash).
+
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored
+    the least recently used ones are dropped.
+    """
+
+    def __init__(self, db_file: str = CACHE_DB_FILE, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str) -> str | None:
+        """Returns the cached response, or None on a miss or an expired entry."""
+        key = self.make_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, model: str, prompt: str, response: str):
+        """Stores a response, replacing any previous entry for the same prompt."""
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(model, prompt), model, response, now, now))
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute("""
+        DELETE FROM responses WHERE key IN (
+            SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+        """, (self.max_entries,))
+
+    def evict(self):
+        """Drops expired entries and trims the cache down to `max_entries`."""
+        with self._lock:
+            self._evict(time.time())
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Returns the process-wide cache, or None when it is disabled with RESPONSE_CACHE=0."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,100 @@
+# File: modules/search.py
+
+import re
+import threading
+
+from .storage import DB_FILE, connect
+
+SNIPPET_TOKENS = 24
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_RE = re.compile(r"<[^>]*>|<[^>]*$|^[^<]*>")
+
+_SEARCH = f"""
+SELECT a.id, a.title, a.topic, a.published_at,
+       snippet(articles_fts, 1, '[[', ']]', ' … ', {SNIPPET_TOKENS}), articles_fts.rank
+FROM articles_fts
+JOIN articles a ON a.id = articles_fts.rowid
+WHERE articles_fts MATCH ?
+ORDER BY articles_fts.rank
+LIMIT ? OFFSET ?
+"""
+
+
+def match_query(text: str, prefix: bool = False) -> str:
+    """
+    Turns free text into an FTS5 query matching all of its words, so user
+    input can never be a syntax error. Words are stemmed by the index, so
+    "garden" also finds "gardening". With `prefix`, the last word also
+    matches any longer word; that is slower on common short prefixes.
+    """
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _clean_snippet(snippet: str) -> str:
+    # Snippets are cut from the stored HTML; drop whole and truncated tags
+    return " ".join(_TAG_RE.sub(" ", snippet).split())
+
+
+class ArticleSearch:
+    """Ranked full-text search over the `articles_fts` index."""
+
+    def __init__(self, db_file: str = DB_FILE):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+
+    def search(self, text: str, limit: int = 20, offset: int = 0, raw: bool = False) -> list[dict]:
+        """
+        Best matches first, each as a dict with id, title, topic,
+        published_at, snippet (matches wrapped in [[ ]]) and rank (bm25,
+        lower is better). With `raw`, `text` is passed to FTS5 as a query
+        expression (AND/OR/NOT, "phrases", column filters such as title:solar).
+        """
+        query = text if raw else match_query(text)
+        if not query:
+            return []
+        with self._lock:
+            rows = self._conn.execute(_SEARCH, (query, limit, offset)).fetchall()
+        return [
+            {"id": article_id, "title": title, "topic": topic, "published_at": published_at,
+             "snippet": _clean_snippet(snippet), "rank": rank}
+            for article_id, title, topic, published_at, snippet, rank in rows
+        ]
+
+    def count(self, text: str, raw: bool = False) -> int:
+        """Number of articles matching `text`."""
+        query = text if raw else match_query(text)
+        if not query:
+            return 0
+        with self._lock:
+            # Joined like `search`, so articles deleted by other tools and not yet reindexed are not counted
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+                "WHERE articles_fts MATCH ?", (query,)).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+def get_article_search() -> ArticleSearch:
+    """Returns the process-wide search connection."""
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = ArticleSearch()
+        return _search
+
+
+def search_articles(text: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Ranked full-text search over the stored articles; see `ArticleSearch.search`."""
+    return get_article_search().search(text, limit, offset)
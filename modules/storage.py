@@ -1,37 +1,766 @@
 # File: /content_automation/content_system/storage.py
 
+import argparse
+import asyncio
+import atexit
+import datetime
+import os
+import queue
 import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from .metrics import SIZE_BUCKETS, metrics
+
+try:
+    import zstandard
+except ImportError:  # optional: bodies are zlib-compressed without it
+    zstandard = None
 
 # Database configuration is kept within its relevant module
 DB_FILE = "articles.db"
+# Inserts are grouped into one transaction until either limit is reached.
+BATCH_SIZE = int(os.getenv("STORAGE_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "0.2"))
+# Article bodies are stored compressed in their own table: zstd when the
+# zstandard package is installed, zlib otherwise. Either can always be read
+# back (zstd bodies need zstandard), so the codec can be changed at any time.
+BODY_CODEC = os.getenv("BODY_CODEC", "zstd" if zstandard else "zlib")
+BODY_LEVEL = int(os.getenv("BODY_COMPRESSION_LEVEL", "9" if BODY_CODEC == "zstd" else "6"))
+# Size of a trained zstd dictionary (see `train_body_dictionary`)
+BODY_DICT_SIZE = int(os.getenv("BODY_DICT_SIZE", str(64 * 1024)))
+# Bodies moved per transaction when an older database is migrated
+MIGRATION_BATCH = 500
+# Publish status of an article (the job states of the same name, see job_state.py)
+ARTICLE_STATUSES = ("stored", "published")
+
+
+@dataclass(frozen=True)
+class PublishRequest:
+    """How the publisher daemon (publisher.py) should post an article stored with it."""
+    status: str = "publish"  # WordPress post status, e.g. "publish" or "draft"
+    image_path: str | None = None  # featured image
+    publish_at: float | None = None  # Unix time; None posts it as soon as possible
+
+
+_ARTICLE_BODIES = """
+    CREATE TABLE IF NOT EXISTS article_bodies (
+        article_id INTEGER PRIMARY KEY,
+        codec TEXT NOT NULL,
+        dict_id INTEGER,
+        size INTEGER NOT NULL,
+        body BLOB NOT NULL
+    )
+    """
+
+SCHEMA = [
+    # Metadata only; listings and lookups never page through the bodies.
+    # `post_id` is the WordPress post once the article is published.
+    """
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        topic TEXT,
+        published_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        status TEXT NOT NULL DEFAULT 'stored',
+        post_id INTEGER
+    )
+    """,
+    # Newest-first listings, alone or filtered by topic or status (see ArticleCatalog);
+    # each index ends in the rowid, which makes (published_at, id) a keyset cursor
+    "CREATE INDEX IF NOT EXISTS articles_published_at ON articles (published_at)",
+    "CREATE INDEX IF NOT EXISTS articles_topic ON articles (topic, published_at)",
+    "CREATE INDEX IF NOT EXISTS articles_status ON articles (status, published_at)",
+    # Compressed HTML bodies (`size` is the uncompressed length in bytes),
+    # optionally with a dictionary from `body_dictionaries`
+    _ARTICLE_BODIES,
+    """
+    CREATE TABLE IF NOT EXISTS body_dictionaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codec TEXT NOT NULL,
+        data BLOB NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+    # Articles with their decompressed bodies, for readers that want the text.
+    # article_body() is registered on every connection opened by `connect()`;
+    # only reading this view (and search snippets) needs it, never a write.
+    """
+    CREATE VIEW IF NOT EXISTS article_text AS
+    SELECT a.id, a.title, article_body(b.codec, b.dict_id, b.body) AS content, a.topic, a.published_at
+    FROM articles a JOIN article_bodies b ON b.article_id = a.id
+    """,
+    # Articles waiting for the publisher daemon (see publish_outbox.py). A row is
+    # written in the same transaction as its article, so nothing stored for
+    # publishing is lost. `publish_at` is when the article is next due: its
+    # scheduled time, the end of a lease while it is being posted, or the
+    # next attempt after a failure.
+    """
+    CREATE TABLE IF NOT EXISTS publish_outbox (
+        article_id INTEGER PRIMARY KEY,
+        post_status TEXT NOT NULL,
+        image_path TEXT,
+        publish_at REAL NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_token TEXT,
+        error TEXT,
+        post_id INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS publish_outbox_due ON publish_outbox (state, publish_at)",
+    # WordPress media already uploaded, keyed by file content hash and site
+    """
+    CREATE TABLE IF NOT EXISTS media_registry (
+        content_hash TEXT NOT NULL,
+        site_url TEXT NOT NULL,
+        media_id INTEGER NOT NULL,
+        filename TEXT,
+        verified_at REAL NOT NULL,
+        PRIMARY KEY (content_hash, site_url)
+    )
+    """,
+    # Per-topic progress of batch runs, so a crashed run can be resumed
+    """
+    CREATE TABLE IF NOT EXISTS topic_jobs (
+        job TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        state TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        article_id INTEGER,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (job, topic)
+    )
+    """,
+    # MinHash signatures of stored articles' topics and bodies, and their LSH
+    # band buckets, for near-duplicate detection (see dedup.py)
+    """
+    CREATE TABLE IF NOT EXISTS minhash_signatures (
+        kind TEXT NOT NULL,
+        ref INTEGER NOT NULL,
+        signature BLOB NOT NULL,
+        PRIMARY KEY (kind, ref)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS minhash_buckets (
+        kind TEXT NOT NULL,
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        ref INTEGER NOT NULL,
+        PRIMARY KEY (kind, band, bucket, ref)
+    ) WITHOUT ROWID
+    """,
+    # Full-text index over the articles. It stores no copy of the text
+    # (content='article_text'); the body is decompressed only to cut snippets
+    # from it. StorageEngine indexes each article as it writes it, from the
+    # text it already has, rather than triggers that would call article_body()
+    # and break every writer not opened through `connect()` (the sqlite3 CLI,
+    # scripts, exported copies). Articles such writers add, edit or delete are
+    # reindexed by `rebuild_search_index` (python -m modules.storage --reindex).
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+        title, content, topic,
+        content='article_text', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    # A deleted article takes its body along, whoever deletes it
+    """
+    CREATE TRIGGER IF NOT EXISTS article_bodies_delete AFTER DELETE ON articles BEGIN
+        DELETE FROM article_bodies WHERE article_id = old.id;
+    END
+    """,
+]
+
+# Search index triggers of earlier versions; dropped by `connect()`. The first
+# three read articles.content, from before compressed bodies; the others
+# called article_body(), which writers outside `connect()` do not have.
+_OLD_TRIGGERS = ("articles_fts_insert", "articles_fts_delete", "articles_fts_update", "article_bodies_fts_update")
+
+
+class BodyCodec:
+    """
+    Compresses article bodies for one database file and decompresses them on
+    access. Trained zstd dictionaries are read from `body_dictionaries` the
+    first time a body needs them and kept, since they never change.
+    """
+
+    def __init__(self, db_file: str = DB_FILE):
+        self.db_file = db_file
+        self._dictionaries = {}
+        self._lock = threading.Lock()
+
+    def compress(self, text: str, dict_id: int | None = None) -> tuple[str, int | None, int, bytes]:
+        """
+        Returns (codec, dict_id, size, body) as stored in `article_bodies`;
+        `dict_id` only applies to zstd.
+        """
+        data = text.encode("utf-8")
+        if BODY_CODEC == "zstd":
+            if zstandard is None:
+                raise RuntimeError("BODY_CODEC=zstd needs the zstandard package (pip install zstandard).")
+            dictionary = self._dictionary(dict_id) if dict_id else None
+            compressor = zstandard.ZstdCompressor(level=BODY_LEVEL, dict_data=dictionary)
+            return "zstd", dict_id, len(data), compressor.compress(data)
+        return "zlib", None, len(data), zlib.compress(data, BODY_LEVEL)
+
+    def decompress(self, codec: str, dict_id: int | None, body: bytes) -> str:
+        if codec == "zlib":
+            data = zlib.decompress(body)
+        elif codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("This article body is zstd-compressed; install the zstandard package to read it.")
+            dictionary = self._dictionary(dict_id) if dict_id else None
+            data = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(body)
+        else:
+            raise ValueError(f"Unknown body codec '{codec}'.")
+        return data.decode("utf-8")
+
+    def latest_dictionary(self) -> int | None:
+        """Id of the newest trained dictionary, used for new bodies; None if there is none."""
+        if BODY_CODEC != "zstd" or zstandard is None:
+            return None
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return conn.execute("SELECT MAX(id) FROM body_dictionaries WHERE codec = 'zstd'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _dictionary(self, dict_id: int):
+        with self._lock:
+            dictionary = self._dictionaries.get(dict_id)
+        if dictionary is None:
+            # A connection of its own: this may run inside a query of another one
+            conn = sqlite3.connect(self.db_file)
+            try:
+                row = conn.execute("SELECT data FROM body_dictionaries WHERE id = ?", (dict_id,)).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                raise ValueError(f"Body dictionary {dict_id} is missing from {self.db_file}.")
+            dictionary = zstandard.ZstdCompressionDict(row[0])
+            with self._lock:
+                self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+
+_codecs = {}
+_codecs_lock = threading.Lock()
+
+
+def get_body_codec(db_file: str = DB_FILE) -> BodyCodec:
+    """The process-wide codec of one database file."""
+    with _codecs_lock:
+        codec = _codecs.get(db_file)
+        if codec is None:
+            codec = _codecs[db_file] = BodyCodec(db_file)
+        return codec
+
+
+def register_body_functions(conn: sqlite3.Connection, codec: BodyCodec):
+    """Makes article_body(codec, dict_id, body) available to SQL on `conn` (the article_text view needs it)."""
+    conn.create_function("article_body", 3, codec.decompress, deterministic=True)
+
 
-def article_storage_manager(title: str, content: str, topic: str):
-    """Saves the processed content into a SQLite3 database."""
-    if not title or not content:
-        print("Skipping storage due to empty title or content.")
+def _migrate_bodies(conn: sqlite3.Connection, db_file: str):
+    """
+    Moves the bodies of a database from before compressed storage into
+    `article_bodies`, MIGRATION_BATCH per transaction, then drops the old
+    column and vacuums the freed space back to the file system. Safe to
+    interrupt, and to run from several processes at once.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+    if "content" not in columns:
         return
+    print(f"Moving article bodies in {db_file} into compressed storage (one-time migration)...")
+    codec = get_body_codec(db_file)
+    conn.execute("BEGIN IMMEDIATE")
+    # The old search index and its triggers read articles.content; they are recreated afterwards
+    for trigger in _OLD_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS articles_fts")
+    conn.execute(_ARTICLE_BODIES)
+    conn.commit()
 
+    moved = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if "content" not in [row[1] for row in conn.execute("PRAGMA table_info(articles)")]:
+                conn.commit()
+                return  # another process finished the migration
+            rows = conn.execute("SELECT id, content FROM articles WHERE content != '' ORDER BY id LIMIT ?",
+                                (MIGRATION_BATCH,)).fetchall()
+            if not rows:
+                conn.execute("ALTER TABLE articles DROP COLUMN content")
+                conn.commit()
+                break
+            conn.executemany(
+                "INSERT OR REPLACE INTO article_bodies (article_id, codec, dict_id, size, body) VALUES (?, ?, ?, ?, ?)",
+                [(article_id, *codec.compress(content)) for article_id, content in rows])
+            conn.executemany("UPDATE articles SET content = '' WHERE id = ?", [(row[0],) for row in rows])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        moved += len(rows)
+        print(f"   moved {moved} bodies...")
+    print(f"Migration done: {moved} bodies compressed.")
     try:
-        # The DB file will be created in the root directory where main.py is run
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS articles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            topic TEXT,
-            published_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        cursor.execute("INSERT INTO articles (title, content, topic) VALUES (?, ?, ?)", (title, content, topic))
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        # Another process holds the database; the space is reused by new articles instead
+        print(f"Could not vacuum {db_file} after the migration: {e}")
 
+
+def _add_status_columns(conn: sqlite3.Connection):
+    """Adds the publish status to an articles table from before it, taken from the job states."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+    if not columns or "status" in columns:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "status" not in [row[1] for row in conn.execute("PRAGMA table_info(articles)")]:
+            conn.execute("ALTER TABLE articles ADD COLUMN status TEXT NOT NULL DEFAULT 'stored'")
+            conn.execute("ALTER TABLE articles ADD COLUMN post_id INTEGER")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'topic_jobs'").fetchone():
+                conn.execute("UPDATE articles SET status = 'published' WHERE id IN "
+                             "(SELECT article_id FROM topic_jobs WHERE state = 'published')")
         conn.commit()
-        print(f"Successfully saved article: '{title}'")
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def connect(db_file: str = DB_FILE) -> sqlite3.Connection:
+    """Opens a connection to the article database with the shared pragmas and schema applied."""
+    # The DB file will be created in the root directory where main.py is run
+    conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last
+    # transactions but never corrupts the database.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
+    register_body_functions(conn, get_body_codec(db_file))
+    _migrate_bodies(conn, db_file)
+    _add_status_columns(conn)
+    new_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'").fetchone() is None
+    for trigger in _OLD_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if new_index:
+        # Title matches count most, then topic, then body; stored in the index so
+        # `ORDER BY rank` uses it without computing bm25() in the query.
+        conn.execute("INSERT INTO articles_fts (articles_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')")
+        # Backfill articles stored before the search index existed
+        conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+    conn.commit()
+    return conn
+
+
+class StorageEngine:
+    """
+    Owns one long-lived connection and a background writer thread.
+
+    Articles are queued and written in batches with `executemany`, one
+    transaction per batch, flushed when `batch_size` articles are waiting or
+    `flush_interval` seconds after the first one arrived. Other small writes
+    (e.g. job-state updates) can ride along in the same transactions via
+    `execute()`. An article submitted with a `PublishRequest` gets its
+    outbox row in the same transaction.
+    """
+
+    def __init__(self, db_file: str = DB_FILE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._conn = connect(db_file)
+        self._codec = get_body_codec(db_file)
+        # New bodies use the newest trained dictionary, if any
+        self._dict_id = self._codec.latest_dictionary()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, title: str, content: str, topic: str, publish: PublishRequest | None = None) -> Future:
+        """Queues an article; the future resolves to its row id (or None if it was not saved)."""
+        future = Future()
+        if not title or not content:
+            print("Skipping storage due to empty title or content.")
+            future.set_result(None)
+            return future
+        if self._closed:
+            raise RuntimeError("StorageEngine is closed.")
+        self._queue.put((("article", (title, content, topic, publish)), future))
+        return future
+
+    def execute(self, sql: str, params: tuple = ()) -> Future:
+        """Queues a write statement to run in the next batch transaction."""
+        if self._closed:
+            raise RuntimeError("StorageEngine is closed.")
+        future = Future()
+        self._queue.put((("statement", (sql, params)), future))
+        return future
+
+    async def execute_async(self, sql: str, params: tuple = ()):
+        await asyncio.wrap_future(self.execute(sql, params))
+
+    def save(self, title: str, content: str, topic: str, publish: PublishRequest | None = None) -> int | None:
+        """Queues an article and blocks until its batch is committed."""
+        return self.submit(title, content, topic, publish).result()
+
+    async def save_async(self, title: str, content: str, topic: str,
+                         publish: PublishRequest | None = None) -> int | None:
+        """Queues an article and waits for its batch without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(title, content, topic, publish))
+
+    def flush(self):
+        """Blocks until everything queued so far has been written."""
+        barrier = Future()
+        self._queue.put((None, barrier))
+        barrier.result()
+
+    def close(self):
+        """Writes the remaining queue and closes the connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._conn.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if item[0] is None:  # flush barrier: write now
+                    break
+            self._write(batch)
+            if stop:
+                return
+
+    def _insert_articles(self, rows: list, bodies: list) -> list[int]:
+        """Inserts articles with their bodies, search entries and outbox rows; call inside a transaction."""
+        self._conn.executemany(
+            "INSERT INTO articles (title, topic) VALUES (?, ?)", [(title, topic) for title, _, topic, _ in rows])
+        # A single writer inserts consecutive AUTOINCREMENT ids.
+        last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        self._conn.executemany(
+            "INSERT INTO article_bodies (article_id, codec, dict_id, size, body) VALUES (?, ?, ?, ?, ?)",
+            [(article_id, *body) for article_id, body in zip(ids, bodies)])
+        # Indexed from the text at hand: nothing is decompressed
+        self._conn.executemany(
+            "INSERT INTO articles_fts (rowid, title, content, topic) VALUES (?, ?, ?, ?)",
+            [(article_id, title, content, topic) for article_id, (title, content, topic, _) in zip(ids, rows)])
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO publish_outbox (article_id, post_status, image_path, publish_at, created_at, "
+            "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(article_id, publish.status, publish.image_path, publish.publish_at or now, now, now)
+             for article_id, (_, _, _, publish) in zip(ids, rows) if publish])
+        return ids
+
+    def _write_each(self, rows: list, statements: list) -> list[int | None]:
+        """
+        Writes a batch whose transaction failed again, one article or
+        statement per transaction, so one bad item no longer costs the
+        others. Returns the article ids, None for the ones that failed.
+        """
+        ids = []
+        for row in rows:
+            try:
+                body = self._codec.compress(row[1], self._dict_id)
+                with self._conn:
+                    ids.extend(self._insert_articles([row], [body]))
+                print(f"Successfully saved article: '{row[0]}'")
+            except (sqlite3.Error, RuntimeError, zlib.error) as e:
+                ids.append(None)
+                print(f"Database error saving '{row[0]}': {e}")
+        for sql, params in statements:
+            try:
+                with self._conn:
+                    self._conn.execute(sql, params)
+            except sqlite3.Error as e:
+                print(f"Database error: {e}")
+        return ids
+
+    def _write(self, batch: list):
+        rows = [op[1] for op, _ in batch if op is not None and op[0] == "article"]
+        statements = [op[1] for op, _ in batch if op is not None and op[0] == "statement"]
+        ids = [None] * len(rows)
+        if rows or statements:
+            started = time.perf_counter()
+            try:
+                # Compressed before the transaction starts, so it holds the write lock only for the inserts
+                bodies = [self._codec.compress(content, self._dict_id) for _, content, _, _ in rows]
+                with self._conn:
+                    if rows:
+                        ids = self._insert_articles(rows, bodies)
+                    for sql, params in statements:
+                        self._conn.execute(sql, params)
+                for title, _, _, _ in rows:
+                    print(f"Successfully saved article: '{title}'")
+            except (sqlite3.Error, RuntimeError, zlib.error) as e:
+                print(f"Database error: {e}; writing the batch one item at a time.")
+                ids = self._write_each(rows, statements)
+            metrics.observe("storage_batch_seconds", time.perf_counter() - started)
+            metrics.observe("storage_batch_rows", len(rows), SIZE_BUCKETS)
+
+        row_ids = iter(ids)
+        for op, future in batch:
+            future.set_result(next(row_ids) if op is not None and op[0] == "article" else None)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_storage_engine() -> StorageEngine:
+    """Returns the process-wide storage engine, starting it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = StorageEngine()
+            atexit.register(_engine.close)
+        return _engine
+
+
+def article_storage_manager(title: str, content: str, topic: str, publish: PublishRequest | None = None) -> int | None:
+    """
+    Saves the processed content into a SQLite3 database. With `publish`, the
+    article is also queued for the publisher daemon in the same transaction.
+    """
+    return get_storage_engine().save(title, content, topic, publish)
+
+
+async def article_storage_manager_async(title: str, content: str, topic: str,
+                                        publish: PublishRequest | None = None) -> int | None:
+    """Async variant of `article_storage_manager` for the event-loop pipeline."""
+    return await get_storage_engine().save_async(title, content, topic, publish)
+
+
+def get_article(article_id: int, db_file: str = DB_FILE) -> tuple[str, str, str] | None:
+    """Returns (title, content, topic) of a stored article, or None. Only this article's body is decompressed."""
+    conn = sqlite3.connect(db_file)
+    try:
+        row = conn.execute(
+            """
+            SELECT a.title, b.codec, b.dict_id, b.body, a.topic
+            FROM articles a JOIN article_bodies b ON b.article_id = a.id
+            WHERE a.id = ?
+            """, (article_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    title, codec, dict_id, body, topic = row
+    return title, get_body_codec(db_file).decompress(codec, dict_id, body), topic
+
+
+def _timestamp(value: str | datetime.date) -> str:
+    # published_at is stored as "YYYY-MM-DD HH:MM:SS" (UTC), which sorts as text
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+class ArticleCatalog:
+    """
+    Metadata queries over the stored articles, newest first. They only read
+    the `articles` table and its indexes, never a body.
+
+    Pages are fetched by keyset: `page` returns a cursor, the (published_at,
+    id) of the last row, and the next page starts right after it. Every
+    filter combination is served by an index that ends in that order, so a
+    page deep into a large archive costs the same as the first one.
+    """
+
+    def __init__(self, db_file: str = DB_FILE):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _filters(topic: str | None, since, until, status: str | None) -> tuple[list[str], list]:
+        if status is not None and status not in ARTICLE_STATUSES:
+            raise ValueError(f"Unknown status '{status}'. Choose from: {', '.join(ARTICLE_STATUSES)}")
+        where, params = [], []
+        if topic is not None:
+            where.append("topic = ?")
+            params.append(topic)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if since is not None:
+            where.append("published_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            where.append("published_at < ?")
+            params.append(_timestamp(until))
+        return where, params
+
+    def page(self, topic: str | None = None, since: str | datetime.date | None = None,
+             until: str | datetime.date | None = None, status: str | None = None, limit: int = 50,
+             after: tuple[str, int] | None = None) -> tuple[list[dict], tuple[str, int] | None]:
+        """
+        One page of articles as dicts with id, title, topic, published_at,
+        status and post_id, filtered by exact topic, stored time (`since`
+        inclusive, `until` exclusive; dates or datetimes in UTC) and status
+        ("stored" or "published"). Pass the returned cursor as `after` for
+        the next page; it is None after the last one.
+        """
+        where, params = self._filters(topic, since, until, status)
+        if after is not None:
+            where.append("(published_at, id) < (?, ?)")
+            params.extend(after)
+        sql = "SELECT id, title, topic, published_at, status, post_id FROM articles"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY published_at DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit + 1)).fetchall()
+        articles = [
+            {"id": article_id, "title": title, "topic": topic, "published_at": published_at,
+             "status": status, "post_id": post_id}
+            for article_id, title, topic, published_at, status, post_id in rows[:limit]
+        ]
+        cursor = (articles[-1]["published_at"], articles[-1]["id"]) if len(rows) > limit else None
+        return articles, cursor
+
+    def count(self, topic: str | None = None, since: str | datetime.date | None = None,
+              until: str | datetime.date | None = None, status: str | None = None) -> int:
+        """Number of articles `page` pages through with the same filters (an index-only scan)."""
+        where, params = self._filters(topic, since, until, status)
+        sql = "SELECT COUNT(*) FROM articles" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_article_catalog() -> ArticleCatalog:
+    """Returns the process-wide catalog connection."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ArticleCatalog()
+        return _catalog
+
+
+def list_articles(topic: str | None = None, since: str | datetime.date | None = None,
+                  until: str | datetime.date | None = None, status: str | None = None, limit: int = 50,
+                  after: tuple[str, int] | None = None) -> tuple[list[dict], tuple[str, int] | None]:
+    """A page of stored articles, newest first; see `ArticleCatalog.page`."""
+    return get_article_catalog().page(topic, since, until, status, limit, after)
+
+
+def mark_published(article_id: int, post_id: int | None = None) -> Future:
+    """Queues the publish status of a stored article; the future resolves once it is committed."""
+    return get_storage_engine().execute(
+        "UPDATE articles SET status = 'published', post_id = ? WHERE id = ?", (post_id, article_id))
+
+
+def train_body_dictionary(db_file: str = DB_FILE, samples: int = 2000, size: int = BODY_DICT_SIZE) -> int:
+    """
+    Trains a zstd dictionary on the newest `samples` stored bodies and saves
+    it; bodies written from then on (by newly started engines) use it. The
+    boilerplate every article shares then costs nothing per article, which
+    matters most for short bodies. Returns the dictionary's id.
+    """
+    if zstandard is None:
+        raise RuntimeError("Training a body dictionary needs the zstandard package (pip install zstandard).")
+    conn = connect(db_file)
+    try:
+        rows = conn.execute("SELECT content FROM article_text ORDER BY id DESC LIMIT ?", (samples,)).fetchall()
+        if len(rows) < 10:
+            raise ValueError(f"Only {len(rows)} stored articles; store more before training a dictionary.")
+        dictionary = zstandard.train_dictionary(size, [content.encode("utf-8") for content, in rows])
+        with conn:
+            cursor = conn.execute("INSERT INTO body_dictionaries (codec, data, created_at) VALUES ('zstd', ?, ?)",
+                                  (dictionary.as_bytes(), time.time()))
+        print(f"Trained a {len(dictionary.as_bytes()) // 1024} KB body dictionary on {len(rows)} articles.")
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def rebuild_search_index(db_file: str = DB_FILE) -> int:
+    """
+    Rebuilds `articles_fts` from the stored articles, picking up articles
+    added, edited or deleted without going through StorageEngine (e.g. with
+    the sqlite3 CLI). Returns the number of articles indexed.
+    """
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        return conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def body_stats(db_file: str = DB_FILE) -> dict:
+    """Stored vs. uncompressed body bytes per codec, read without decompressing anything."""
+    conn = connect(db_file)
+    try:
+        rows = conn.execute(
+            "SELECT codec, dict_id IS NOT NULL, COUNT(*), SUM(size), SUM(length(body)) "
+            "FROM article_bodies GROUP BY 1, 2").fetchall()
+    finally:
+        conn.close()
+    return {f"{codec}+dict" if with_dict else codec: {"articles": count, "bytes": size, "stored_bytes": stored}
+            for codec, with_dict, count, size, stored in rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the compressed article bodies (python -m modules.storage).")
+    parser.add_argument("--db", default=DB_FILE, help="database file (default: %(default)s)")
+    parser.add_argument("--train-dictionary", action="store_true", help="train a zstd dictionary on stored bodies")
+    parser.add_argument("--reindex", action="store_true",
+                        help="rebuild the search index, e.g. after editing articles with other tools")
+    args = parser.parse_args()
+
+    if args.reindex:
+        print(f"Search index rebuilt: {rebuild_search_index(args.db)} articles.")
+
+    if args.train_dictionary:
+        train_body_dictionary(args.db)
+    for codec, stats in body_stats(args.db).items():
+        ratio = stats["bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"{codec}: {stats['articles']} articles, {stats['bytes'] / 1e6:.1f} MB stored in "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)")
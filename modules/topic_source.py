@@ -0,0 +1,138 @@
+# File: modules/topic_source.py
+
+import csv
+import hashlib
+import io
+import json
+import os
+from typing import IO, Iterator
+
+# Accepted by iter_rows(); the format is picked from the file extension.
+SUPPORTED_EXTENSIONS = (".xlsx", ".xlsm", ".csv", ".jsonl")
+
+
+def _source_name(source) -> str:
+    return source if isinstance(source, str) else getattr(source, "name", "")
+
+
+def _rewind(source):
+    """Uploaded files are read several times (columns, preview, topics), so start from the top each time."""
+    if not isinstance(source, str) and hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _open_text(source) -> IO[str]:
+    if isinstance(source, str):
+        return open(source, newline="", encoding="utf-8-sig")
+    return io.TextIOWrapper(source, newline="", encoding="utf-8-sig")
+
+
+def _iter_excel_rows(source, sheet: str | None) -> Iterator[dict]:
+    from openpyxl import load_workbook  # only needed for spreadsheets
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [str(name) if name is not None else f"Column {i + 1}" for i, name in enumerate(header)]
+        for values in rows:
+            yield dict(zip(names, values))
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(source) -> Iterator[dict]:
+    handle = _open_text(source)
+    try:
+        yield from csv.DictReader(handle)
+    finally:
+        if isinstance(source, str):
+            handle.close()
+        else:
+            handle.detach()  # leave the caller's binary file open
+
+
+def _iter_jsonl_rows(source) -> Iterator[dict]:
+    handle = _open_text(source)
+    try:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            # A bare string per line is treated as a one-column file.
+            yield record if isinstance(record, dict) else {"Topics": record}
+    finally:
+        if isinstance(source, str):
+            handle.close()
+        else:
+            handle.detach()
+
+
+def iter_rows(source, sheet: str | None = None) -> Iterator[dict]:
+    """
+    Lazily yields the rows of an Excel, CSV or JSONL file as dicts keyed by column name.
+    `source` is a path or a binary file object with a `name` (e.g. a Streamlit upload).
+    """
+    extension = os.path.splitext(_source_name(source))[1].lower()
+    _rewind(source)
+    if extension in (".xlsx", ".xlsm"):
+        return _iter_excel_rows(source, sheet)
+    if extension == ".csv":
+        return _iter_csv_rows(source)
+    if extension == ".jsonl":
+        return _iter_jsonl_rows(source)
+    raise ValueError(f"Unsupported topic file '{_source_name(source)}'. Use one of: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+
+def read_columns(source, sheet: str | None = None) -> list[str]:
+    """Returns the column names, reading only the first row."""
+    first = next(iter_rows(source, sheet), None)
+    return list(first.keys()) if first else []
+
+
+def preview_rows(source, limit: int = 5, sheet: str | None = None) -> list[dict]:
+    """Returns the first `limit` rows without reading the rest of the file."""
+    rows = []
+    for row in iter_rows(source, sheet):
+        rows.append(row)
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def iter_topics(source, column_name: str, dedupe: bool = True, sheet: str | None = None) -> Iterator[str]:
+    """
+    Lazily yields the non-empty topics of one column, skipping exact repeats
+    (case- and whitespace-insensitive) when `dedupe` is set.
+    """
+    try:
+        rows = iter_rows(source, sheet)
+        first = next(rows, None)
+        if first is None:
+            return
+        if column_name not in first:
+            print(f"Error: Column '{column_name}' not found in {_source_name(source)}.")
+            return
+
+        # 8-byte digests keep the dedup set small on very long files.
+        seen = set()
+        row = first
+        while row is not None:
+            value = row.get(column_name)
+            topic = str(value).strip() if value is not None else ""
+            if topic and dedupe:
+                digest = hashlib.blake2b(" ".join(topic.casefold().split()).encode(), digest_size=8).digest()
+                if digest in seen:
+                    topic = ""
+                seen.add(digest)
+            if topic:
+                yield topic
+            row = next(rows, None)
+    except FileNotFoundError:
+        print(f"Error: The file '{_source_name(source)}' was not found.")
+    except Exception as e:
+        print(f"An error occurred while reading the topic file: {e}")
@@ -1,17 +1,48 @@
 # File: modules/wordpress_publisher.py
 
+import asyncio
 import os
 import requests
 import json
 import base64
-from dotenv import load_dotenv
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlparse
+import httpx
+from requests.adapters import HTTPAdapter
 
-# It's still good practice to have this for local testing if you use a .env file
-load_dotenv()
+from .media_registry import file_hash, get_media_registry
+from .metrics import metrics
+from .resilience import call_with_retry, call_with_retry_async, get_breaker, is_retryable, safe_to_resend
+
+# Bulk publishing settings: how many posts may be in flight and how long a request may take.
+PUBLISH_PARALLELISM = int(os.getenv("WP_PUBLISH_PARALLELISM", "8"))
+PUBLISH_TIMEOUT = float(os.getenv("WP_PUBLISH_TIMEOUT", "60"))
+# Posts created per request to the REST batch endpoint (WordPress 5.6+ accepts
+# up to 25 by default); 1 creates every post with a request of its own.
+PUBLISH_BATCH_SIZE = int(os.getenv("WP_BATCH_SIZE", "25"))
+
+# Sites whose batch endpoint answered, and sites found to have none (or to
+# refuse posts in batches), which get one request per post
+_batch_sites = set()
+_no_batch_sites = set()
+
+
+@lru_cache(maxsize=8)
+def _build_wp_config(wp_url: str, wp_user: str, wp_password: str) -> tuple[str, dict]:
+    api_base = f"{wp_url}/wp-json/wp/v2"
+    credentials = f"{wp_user}:{wp_password}"
+    token = base64.b64encode(credentials.encode())
+    headers = {'Authorization': f'Basic {token.decode("utf-8")}'}
+    return api_base, headers
 
 
 def get_wp_config():
-    """Reads WordPress configuration from environment variables."""
+    """
+    Reads WordPress configuration from environment variables.
+    The API base and auth header are built once per set of credentials.
+    """
     WP_URL = os.getenv("WP_URL")
     WP_USER = os.getenv("WP_USER")
     # In your Streamlit app, you named the password key 'wp_password'
@@ -23,17 +54,97 @@ def get_wp_config():
         raise ValueError(
             "WordPress credentials (WP_URL, WP_USER, WP_PASSWORD/WP_APP_PASSWORD) are not set in the environment.")
 
-    api_base = f"{WP_URL}/wp-json/wp/v2"
-    credentials = f"{WP_USER}:{WP_APP_PASSWORD}"
-    token = base64.b64encode(credentials.encode())
-    headers = {'Authorization': f'Basic {token.decode("utf-8")}'}
+    api_base, headers = _build_wp_config(WP_URL, WP_USER, WP_APP_PASSWORD)
+    return api_base, dict(headers)
 
-    return api_base, headers
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """One keep-alive session per process, so consecutive calls reuse the TLS connection."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=PUBLISH_PARALLELISM)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _media_request(image_path: str, headers: dict) -> tuple[dict, bytes]:
+    filename = os.path.basename(image_path)
+    with open(image_path, 'rb') as f:
+        image_data = f.read()
+
+    file_headers = headers.copy()
+    file_headers['Content-Disposition'] = f'attachment; filename={filename}'
+    file_headers['Content-Type'] = 'image/png'
+    return file_headers, image_data
+
+
+def _observe(endpoint: str, started: float, status):
+    metrics.observe("wordpress_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+    metrics.inc("wordpress_requests_total", endpoint=endpoint, status=str(status))
+
+
+def _timed(endpoint: str, send):
+    """Runs a request function, recording its duration and status code (or "error")."""
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = send()
+        status = response.status_code
+        return response
+    finally:
+        _observe(endpoint, started, status)
+
+
+async def _timed_async(endpoint: str, request):
+    """Awaits a request, recording its duration and status code (or "error")."""
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = await request
+        status = response.status_code
+        return response
+    finally:
+        _observe(endpoint, started, status)
+
+
+def _batch_url(api_base: str) -> str:
+    # api_base is .../wp-json/wp/v2; the batch route lives next to it
+    return api_base.rsplit("/wp/v2", 1)[0] + "/batch/v1"
+
+
+def _breaker(api_base: str):
+    """One circuit breaker per site, shared by all of its endpoints."""
+    return get_breaker(f"wordpress {urlparse(api_base).netloc}")
+
+
+def _raise_if_unavailable(response):
+    # Throttling and server errors become exceptions, so they are retried and counted by the breaker
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+
+def _send(endpoint: str, api_base: str, send, idempotent: bool = True):
+    """
+    Runs a request function with retries and backoff. Requests that create
+    something (idempotent=False) are only repeated when the site says it did
+    not process them (429, 502, 503) or the connection was never made.
+    """
+    return call_with_retry(lambda: _raise_if_unavailable(_timed(endpoint, send)), _breaker(api_base),
+                           idempotent=idempotent, label=f"WordPress {endpoint}")
 
 
 def upload_image_to_wordpress(image_path: str, article_title: str) -> int | None:
     """
     Uploads an image to the WordPress Media Library and returns its ID.
+    Alt text and title are sent as query parameters of the upload itself.
     """
     if not image_path or not os.path.exists(image_path):
         print("   [WP] Image path not provided or file does not exist. Skipping image upload.")
@@ -42,26 +153,16 @@ def upload_image_to_wordpress(image_path: str, article_title: str) -> int | None
     try:
         api_base, headers = get_wp_config()
         media_url = f"{api_base}/media"
-        filename = os.path.basename(image_path)
+        file_headers, image_data = _media_request(image_path, headers)
 
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-
-        file_headers = headers.copy()
-        file_headers['Content-Disposition'] = f'attachment; filename={filename}'
-        file_headers['Content-Type'] = 'image/png'
-
-        print(f"   [WP] Uploading {filename} to WordPress...")
-        response = requests.post(media_url, headers=file_headers, data=image_data, timeout=60, verify=False)
+        print(f"   [WP] Uploading {os.path.basename(image_path)} to WordPress...")
+        response = _send("media", api_base, lambda: _get_session().post(
+            media_url, headers=file_headers, data=image_data,
+            params={'alt_text': article_title, 'title': article_title}, timeout=PUBLISH_TIMEOUT, verify=False),
+            idempotent=False)
         response.raise_for_status()
 
         media_id = response.json()['id']
-
-        # Optional: Update the alt text
-        update_url = f"{api_base}/media/{media_id}"
-        update_payload = {'alt_text': article_title, 'title': article_title}
-        requests.post(update_url, headers=headers, json=update_payload, verify=False)
-
         print(f"   [WP] Image uploaded successfully. Media ID: {media_id}")
         return media_id
 
@@ -70,27 +171,78 @@ def upload_image_to_wordpress(image_path: str, article_title: str) -> int | None
         return None
 
 
-def create_wordpress_post(title: str, content: str, status: str, featured_media_id: int | None) -> bool:
+def _media_exists(api_base: str, headers: dict, media_id: int) -> bool:
+    """False only when WordPress says the media item is gone; transient errors count as 'still there'."""
+    try:
+        response = _send("media_check", api_base, lambda: _get_session().get(
+            f"{api_base}/media/{media_id}", headers=headers, params={'_fields': 'id'},
+            timeout=PUBLISH_TIMEOUT, verify=False))
+        return response.status_code not in (404, 410)
+    except requests.exceptions.RequestException:
+        return True
+
+
+def get_or_upload_media(image_path: str, article_title: str) -> int | None:
     """
-    Creates a new post in WordPress.
+    Returns the media ID of this image on the configured site, uploading it only
+    the first time. Uploads are remembered by file content hash, so the same
+    featured image is shared by every article (its alt text is the first article's title).
     """
+    if not image_path or not os.path.exists(image_path):
+        print("   [WP] Image path not provided or file does not exist. Skipping image upload.")
+        return None
+
     try:
-        # Get the latest credentials EVERY time the function is called
         api_base, headers = get_wp_config()
-        posts_url = f"{api_base}/posts"
+        content_hash = file_hash(image_path)
+    except (ValueError, OSError) as e:
+        print(f"   [WP] Error uploading image to WordPress: {e}")
+        return None
+
+    registry = get_media_registry()
+    known = registry.lookup(content_hash, api_base)
+    if known:
+        media_id, needs_check = known
+        if not needs_check:
+            return media_id
+        if _media_exists(api_base, headers, media_id):
+            registry.remember(content_hash, api_base, media_id, os.path.basename(image_path))
+            return media_id
+        print(f"   [WP] Media {media_id} was deleted from the site. Uploading it again.")
+        registry.forget(content_hash, api_base)
+
+    media_id = upload_image_to_wordpress(image_path, article_title)
+    if media_id:
+        registry.remember(content_hash, api_base, media_id, os.path.basename(image_path))
+    return media_id
+
+
+def _post_payload(title: str, content: str, status: str, featured_media_id: int | None) -> dict:
+    payload = {
+        'title': title,
+        'content': content,
+        'status': status
+    }
 
-        payload = {
-            'title': title,
-            'content': content,
-            'status': status
-        }
+    if featured_media_id:
+        payload['featured_media'] = featured_media_id
+    return payload
 
-        if featured_media_id:
-            payload['featured_media'] = featured_media_id
+
+def create_wordpress_post(title: str, content: str, status: str, featured_media_id: int | None) -> bool:
+    """
+    Creates a new post in WordPress. Throttled requests and unreachable sites
+    are retried with backoff; False means the post could not be created.
+    """
+    try:
+        api_base, headers = get_wp_config()
+        posts_url = f"{api_base}/posts"
+        payload = _post_payload(title, content, status, featured_media_id)
 
         print(f"   [WP] Creating post '{title}' as a '{status}'...")
         # Note: verify=False suppresses the InsecureRequestWarning. This is okay for TasteWP.
-        response = requests.post(posts_url, headers=headers, json=payload, timeout=60, verify=False)
+        response = _send("posts", api_base, lambda: _get_session().post(
+            posts_url, headers=headers, json=payload, timeout=PUBLISH_TIMEOUT, verify=False), idempotent=False)
         response.raise_for_status()
 
         # Check if the response contains JSON before trying to parse it
@@ -111,4 +263,260 @@ def create_wordpress_post(title: str, content: str, status: str, featured_media_
         print(f"   [WP] Error creating post in WordPress: {error_message}")
         if hasattr(e, 'response') and e.response is not None:
             print(f"   [WP] Response Body: {e.response.text if e.response.text else 'No Response'}")
-        return False
\ No newline at end of file
+        return False
+
+
+class AsyncWordPressPublisher:
+    """
+    Publishes many posts concurrently over one pooled keep-alive HTTP client.
+
+    Use it as an async context manager (or call `aclose()`), so the pooled
+    connections are closed when the batch is done:
+
+        async with AsyncWordPressPublisher() as publisher:
+            await publisher.create_post(title, content, "publish", None)
+    """
+
+    def __init__(self, max_parallel: int = PUBLISH_PARALLELISM, timeout: float = PUBLISH_TIMEOUT):
+        self.max_parallel = max_parallel
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        # One lock per image, so concurrent posts wait for a single upload instead of racing
+        self._media_locks = {}
+        # verify=False for the same reason as the sync client (self-signed TasteWP sites).
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_parallel, max_keepalive_connections=max_parallel),
+            timeout=httpx.Timeout(timeout),
+            verify=False,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _send(self, endpoint: str, api_base: str, send, idempotent: bool = True):
+        """Async counterpart of `_send`; the parallelism slot is only held while a request is in flight."""
+        async def attempt():
+            async with self._semaphore:
+                return _raise_if_unavailable(await _timed_async(endpoint, send()))
+
+        return await call_with_retry_async(attempt, _breaker(api_base), idempotent=idempotent,
+                                           label=f"WordPress {endpoint}")
+
+    async def upload_image(self, image_path: str, article_title: str) -> int | None:
+        """Uploads an image (alt text included in the same request) and returns its media ID."""
+        if not image_path or not os.path.exists(image_path):
+            print("   [WP] Image path not provided or file does not exist. Skipping image upload.")
+            return None
+
+        try:
+            api_base, headers = get_wp_config()
+            file_headers, image_data = await asyncio.to_thread(_media_request, image_path, headers)
+            response = await self._send("media", api_base, lambda: self._client.post(
+                f"{api_base}/media", headers=file_headers, content=image_data,
+                params={'alt_text': article_title, 'title': article_title}), idempotent=False)
+            response.raise_for_status()
+            media_id = response.json()['id']
+            print(f"   [WP] Image uploaded successfully. Media ID: {media_id}")
+            return media_id
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            print(f"   [WP] Error uploading image to WordPress: {e}")
+            return None
+
+    async def _media_exists(self, api_base: str, headers: dict, media_id: int) -> bool:
+        try:
+            response = await self._send("media_check", api_base, lambda: self._client.get(
+                f"{api_base}/media/{media_id}", headers=headers, params={'_fields': 'id'}))
+            return response.status_code not in (404, 410)
+        except httpx.HTTPError:
+            return True
+
+    async def get_or_upload_image(self, image_path: str, article_title: str) -> int | None:
+        """Async counterpart of `get_or_upload_media`: uploads each distinct image once per site."""
+        if not image_path or not os.path.exists(image_path):
+            print("   [WP] Image path not provided or file does not exist. Skipping image upload.")
+            return None
+
+        try:
+            api_base, headers = get_wp_config()
+            content_hash = await asyncio.to_thread(file_hash, image_path)
+        except (ValueError, OSError) as e:
+            print(f"   [WP] Error uploading image to WordPress: {e}")
+            return None
+
+        lock = self._media_locks.setdefault((content_hash, api_base), asyncio.Lock())
+        async with lock:
+            registry = get_media_registry()
+            known = await asyncio.to_thread(registry.lookup, content_hash, api_base)
+            if known:
+                media_id, needs_check = known
+                if not needs_check:
+                    return media_id
+                if await self._media_exists(api_base, headers, media_id):
+                    await asyncio.to_thread(registry.remember, content_hash, api_base, media_id,
+                                            os.path.basename(image_path))
+                    return media_id
+                print(f"   [WP] Media {media_id} was deleted from the site. Uploading it again.")
+                await asyncio.to_thread(registry.forget, content_hash, api_base)
+
+            media_id = await self.upload_image(image_path, article_title)
+            if media_id:
+                await asyncio.to_thread(registry.remember, content_hash, api_base, media_id,
+                                        os.path.basename(image_path))
+            return media_id
+
+    async def create_post(self, title: str, content: str, status: str, featured_media_id: int | None,
+                          raise_transient: bool = False) -> int | None:
+        """
+        Creates a post and returns its ID, or None if WordPress rejected it.
+        With `raise_transient`, a failure that outlasted the retries but may
+        pass later (throttling, site down) is raised instead, e.g. so the
+        pipeline can requeue the article.
+        """
+        try:
+            api_base, headers = get_wp_config()
+            payload = _post_payload(title, content, status, featured_media_id)
+            print(f"   [WP] Creating post '{title}' as a '{status}'...")
+            response = await self._send("posts", api_base, lambda: self._client.post(
+                f"{api_base}/posts", headers=headers, json=payload), idempotent=False)
+            response.raise_for_status()
+            post_id = response.json().get('id')
+            print(f"   [WP] Successfully created post. Post ID: {post_id}")
+            return post_id
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"   [WP] Error creating post in WordPress: {e}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"   [WP] Response Body: {e.response.text or 'No Response'}")
+            if raise_transient and is_retryable(e, idempotent=False):
+                raise
+            return None
+
+    async def _create_each(self, posts: list[tuple[str, str]], status: str, featured_media_id: int | None,
+                           return_transient: bool) -> list:
+        results = await asyncio.gather(*(self.create_post(title, content, status, featured_media_id,
+                                                          raise_transient=return_transient)
+                                         for title, content in posts), return_exceptions=True)
+        for result in results:
+            # create_post only lets transient errors through; anything else is a bug to surface
+            if isinstance(result, BaseException) and not (isinstance(result, Exception)
+                                                          and is_retryable(result, idempotent=False)):
+                raise result
+        return list(results)
+
+    async def _create_chunk(self, posts: list[tuple[str, str]], status: str, featured_media_id: int | None,
+                            return_transient: bool) -> list:
+        try:
+            api_base, headers = get_wp_config()
+        except ValueError as e:
+            print(f"   [WP] Error creating posts in WordPress: {e}")
+            return [None] * len(posts)
+        if len(posts) == 1 or api_base in _no_batch_sites:
+            return await self._create_each(posts, status, featured_media_id, return_transient)
+
+        payload = {"validation": "normal", "requests": [
+            {"method": "POST", "path": "/wp/v2/posts", "body": _post_payload(title, content, status, featured_media_id)}
+            for title, content in posts]}
+        print(f"   [WP] Creating {len(posts)} posts in one batch request as '{status}'...")
+        try:
+            response = await self._send("batch", api_base, lambda: self._client.post(
+                _batch_url(api_base), headers=headers, json=payload), idempotent=False)
+            if response.status_code in (400, 404, 405):
+                # No batch route (WordPress before 5.6, or disabled), or a lower server-side limit
+                print(f"   [WP] Batch requests are not available on this site ({response.status_code}); "
+                      f"creating posts one by one.")
+                _no_batch_sites.add(api_base)
+                return await self._create_each(posts, status, featured_media_id, return_transient)
+            response.raise_for_status()
+            items = response.json()["responses"]
+            _batch_sites.add(api_base)
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            print(f"   [WP] Error creating posts in WordPress: {e}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"   [WP] Response Body: {e.response.text or 'No Response'}")
+            # Only errors that say nothing was created are worth repeating as a whole
+            if return_transient and is_retryable(e, idempotent=False):
+                return [e] * len(posts)
+            return [None] * len(posts)
+
+        results = [None] * len(posts)
+        retry = []
+        for index, item in enumerate(items[:len(posts)]):
+            code = item.get("status", 500)
+            body = item.get("body") if isinstance(item.get("body"), dict) else {}
+            if code < 300 and body.get("id"):
+                results[index] = body["id"]
+                print(f"   [WP] Successfully created post. Post ID: {body['id']}")
+            elif body.get("code") == "rest_batch_not_allowed":
+                _no_batch_sites.add(api_base)
+                retry.append(index)
+            elif safe_to_resend(code):
+                retry.append(index)  # this item was turned away on its own; give it a request of its own
+            else:
+                # Rejected, or a 500/504 after which the post may exist: sending it again could duplicate it
+                print(f"   [WP] Error creating post '{posts[index][0]}' in WordPress: {code} {body.get('message', '')}")
+        retry.extend(range(len(items), len(posts)))  # items the site did not answer for
+        if retry:
+            created = await self._create_each([posts[index] for index in retry], status, featured_media_id,
+                                              return_transient)
+            for index, post_id in zip(retry, created):
+                results[index] = post_id
+        return results
+
+    async def create_posts(self, posts: list[tuple[str, str]], status: str, featured_media_id: int | None,
+                           return_transient: bool = False) -> list:
+        """
+        Creates (title, content) posts through the REST batch endpoint,
+        PUBLISH_BATCH_SIZE per request, and returns each one's post ID (or
+        None), in order. Items the site turned away on their own (429, 502,
+        503: not processed) are retried with a request of their own; other
+        failed items get None, as they may have been created. Sites without
+        batch support get one request per post. With `return_transient`, a
+        post whose failure may pass later gets the error in place of its ID,
+        so the caller can requeue just that post; nothing is raised for a
+        single post.
+        """
+        chunks = [posts[start:start + PUBLISH_BATCH_SIZE] for start in range(0, len(posts), max(1, PUBLISH_BATCH_SIZE))]
+        results = []
+        try:
+            api_base = get_wp_config()[0]
+        except ValueError:
+            api_base = None
+        if len(chunks) > 1 and api_base not in _batch_sites and api_base not in _no_batch_sites:
+            # Find out whether the site takes batches before sending the rest
+            results.append(await self._create_chunk(chunks.pop(0), status, featured_media_id, return_transient))
+        results.extend(await asyncio.gather(*(self._create_chunk(chunk, status, featured_media_id, return_transient)
+                                              for chunk in chunks)))
+        return [post_id for chunk in results for post_id in chunk]
+
+    async def publish_batch(self, articles: list[tuple[str, str]], status: str = "publish",
+                            image_path: str | None = None, return_transient: bool = False) -> list:
+        """Looks up or uploads the shared featured image (if any) once and creates the posts in batches."""
+        featured_media_id = await self.get_or_upload_image(image_path, articles[0][0]) if image_path and articles else None
+        return await self.create_posts(articles, status, featured_media_id, return_transient)
+
+    async def publish(self, title: str, content: str, status: str = "publish",
+                      image_path: str | None = None, raise_transient: bool = False) -> int | None:
+        """Looks up or uploads the featured image (if any) and creates the post."""
+        featured_media_id = await self.get_or_upload_image(image_path, title) if image_path else None
+        return await self.create_post(title, content, status, featured_media_id, raise_transient)
+
+
+async def publish_articles_async(articles: list[tuple[str, str]], status: str = "publish",
+                                 image_path: str | None = None,
+                                 max_parallel: int = PUBLISH_PARALLELISM) -> list[int | None]:
+    """
+    Publishes (title, content) pairs in batch requests, several at a time;
+    returns the post ID (or None) for each one, in order.
+    """
+    async with AsyncWordPressPublisher(max_parallel=max_parallel) as publisher:
+        return await publisher.publish_batch(articles, status, image_path)
+
+
+def publish_articles(articles: list[tuple[str, str]], status: str = "publish",
+                     image_path: str | None = None, max_parallel: int = PUBLISH_PARALLELISM) -> list[int | None]:
+    """Blocking wrapper around `publish_articles_async` for sync callers such as Streamlit."""
+    return asyncio.run(publish_articles_async(articles, status, image_path, max_parallel))
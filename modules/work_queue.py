@@ -0,0 +1,369 @@
+# File: modules/work_queue.py
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from .job_state import DUPLICATE, FAILED, PUBLISHED, STORED, JobTracker
+from .metrics import metrics
+from .storage import DB_FILE
+
+# Where the queue lives: "sqlite:///path/to/file.db" (or a plain path). The
+# default shares articles.db with the workers on this machine.
+WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL", f"sqlite:///{DB_FILE}")
+# A claimed topic belongs to its worker for this long; heartbeats renew the
+# lease every third of it, so only a worker that died or hung loses its topics.
+LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "300"))
+# Claims (including ones whose lease expired) before a topic is marked failed.
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+# Topics claimed at once, and held by one worker at most (in flight or
+# waiting in its pipeline), so a fast worker does not starve the others.
+CLAIM_BATCH = int(os.getenv("WORK_QUEUE_CLAIM_BATCH", "10"))
+MAX_HELD = int(os.getenv("WORK_QUEUE_MAX_HELD", "40"))
+
+# States of a work item; a topic that ran out of attempts is FAILED, as in topic_jobs
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS work_items (
+        queue TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        state TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_token TEXT,
+        lease_expires REAL,
+        error TEXT,
+        enqueued_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (queue, topic)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS work_items_claim ON work_items (queue, state, lease_expires)",
+]
+
+
+@dataclass(frozen=True)
+class Lease:
+    """One claimed topic. The token fences it: only its holder can renew or finish it."""
+    queue: str
+    topic: str
+    token: str
+    attempts: int
+    enqueued_at: float
+
+
+class WorkQueue(ABC):
+    """
+    A durable queue of topics that many workers claim from under leases.
+
+    Backends must make `claim` atomic across processes (and machines, for a
+    networked backend), so a topic is only ever leased to one worker at a
+    time, and must reject `renew` / `finish` calls whose token no longer
+    holds the lease.
+    """
+
+    @abstractmethod
+    def enqueue(self, queue: str, topics: Iterable[str]) -> int:
+        """Adds topics not already in the queue; returns how many were new."""
+
+    @abstractmethod
+    def claim(self, queue: str, owner: str, limit: int, lease_seconds: float = LEASE_SECONDS) -> list[Lease]:
+        """Leases up to `limit` queued topics (or ones whose lease expired), oldest first."""
+
+    @abstractmethod
+    def renew(self, leases: list[Lease], lease_seconds: float = LEASE_SECONDS) -> list[Lease]:
+        """Extends the leases still held and returns them; the others were lost."""
+
+    @abstractmethod
+    def finish(self, outcomes: list[tuple[Lease, str, str | None]]) -> int:
+        """
+        Settles leases as (lease, state, error): DONE, FAILED, or QUEUED to
+        give the topic back for another attempt. Returns how many were still held.
+        """
+
+    @abstractmethod
+    def counts(self, queue: str) -> dict:
+        """Number of topics in each state."""
+
+    @abstractmethod
+    def retry_failed(self, queue: str) -> int:
+        """Puts failed topics back in the queue with a fresh attempt budget."""
+
+    def close(self):
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    WorkQueue on a SQLite file in WAL mode. Every claim is one
+    `UPDATE ... RETURNING` statement, which SQLite runs under its write lock,
+    so any number of worker processes on this machine can share the file.
+    Workers on other machines need a networked backend (SQLite locking is
+    not reliable on network filesystems); register one with `register_backend`.
+    """
+
+    def __init__(self, db_file: str = DB_FILE, max_attempts: int = MAX_ATTEMPTS):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()  # one transaction at a time on the shared connection
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], object]):
+        # BEGIN IMMEDIATE takes the write lock up front, so a claim never
+        # fails halfway on a lock upgrade
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, queue: str, topics: Iterable[str]) -> int:
+        now = time.time()
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_items (queue, topic, state, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((queue, topic, QUEUED, now, now) for topic in topics))
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def claim(self, queue: str, owner: str, limit: int, lease_seconds: float = LEASE_SECONDS) -> list[Lease]:
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def claim(conn):
+            # Topics whose workers died too often are given up on, not retried forever
+            conn.execute(
+                """
+                UPDATE work_items SET state = ?, error = 'lease expired ' || attempts || ' times', lease_owner = NULL,
+                    lease_token = NULL, lease_expires = NULL, updated_at = ?
+                WHERE queue = ? AND state = ? AND lease_expires < ? AND attempts >= ?
+                """, (FAILED, now, queue, LEASED, now, self.max_attempts))
+            return conn.execute(
+                """
+                UPDATE work_items SET state = ?, lease_owner = ?, lease_token = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE rowid IN (
+                    SELECT rowid FROM work_items
+                    WHERE queue = ? AND (state = ? OR (state = ? AND lease_expires < ?))
+                    ORDER BY rowid LIMIT ?
+                )
+                RETURNING topic, attempts, enqueued_at
+                """, (LEASED, owner, token, now + lease_seconds, now, queue, QUEUED, LEASED, now, limit)).fetchall()
+
+        return [Lease(queue, topic, token, attempts, enqueued_at)
+                for topic, attempts, enqueued_at in self._transaction(claim)]
+
+    def renew(self, leases: list[Lease], lease_seconds: float = LEASE_SECONDS) -> list[Lease]:
+        expires = time.time() + lease_seconds
+
+        def renew(conn):
+            return [lease for lease in leases if conn.execute(
+                "UPDATE work_items SET lease_expires = ? WHERE queue = ? AND topic = ? AND lease_token = ? AND state = ?",
+                (expires, lease.queue, lease.topic, lease.token, LEASED)).rowcount]
+
+        return self._transaction(renew) if leases else []
+
+    def finish(self, outcomes: list[tuple[Lease, str, str | None]]) -> int:
+        now = time.time()
+
+        def finish(conn):
+            held = 0
+            for lease, state, error in outcomes:
+                if state == QUEUED and lease.attempts >= self.max_attempts:
+                    state = FAILED
+                held += conn.execute(
+                    """
+                    UPDATE work_items SET state = ?, error = ?, lease_owner = NULL, lease_token = NULL,
+                        lease_expires = NULL, updated_at = ?
+                    WHERE queue = ? AND topic = ? AND lease_token = ?
+                    """, (state, error, now, lease.queue, lease.topic, lease.token)).rowcount
+            return held
+
+        return self._transaction(finish) if outcomes else 0
+
+    def counts(self, queue: str) -> dict:
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM work_items WHERE queue = ? GROUP BY state", (queue,)).fetchall())
+
+    def retry_failed(self, queue: str) -> int:
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE work_items SET state = ?, attempts = 0, error = NULL, updated_at = ? WHERE queue = ? AND state = ?",
+            (QUEUED, time.time(), queue, FAILED)).rowcount)
+
+    def close(self):
+        self._conn.close()
+
+
+_BACKENDS = {"sqlite": lambda location: SQLiteWorkQueue(location or DB_FILE)}
+
+
+def register_backend(scheme: str, factory: Callable[[str], WorkQueue]):
+    """Makes `open_work_queue("<scheme>://...")` build a queue with `factory(location)`."""
+    _BACKENDS[scheme] = factory
+
+
+def open_work_queue(url: str = WORK_QUEUE_URL) -> WorkQueue:
+    """Opens the queue at `url` ("sqlite:///articles.db", or a plain file path)."""
+    scheme, separator, location = url.partition("://")
+    if not separator:
+        scheme, location = "sqlite", url
+    elif scheme == "sqlite":
+        location = location[1:] if location.startswith("/") else location
+    factory = _BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"No work queue backend for '{scheme}://' (known: {', '.join(sorted(_BACKENDS))}).")
+    return factory(location)
+
+
+def worker_id() -> str:
+    """host:pid, unique across the processes and machines sharing a queue."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueConsumer:
+    """
+    Feeds a ContentPipeline from a work queue: iterate it (asynchronously) as
+    the pipeline's topic source and pass `on_state` as its state callback,
+    inside `async with consumer:`, which keeps the leases alive.
+
+    Topics are claimed in small batches as the pipeline asks for more, up to
+    `max_held` at a time. An empty queue ends the iteration once no other
+    worker holds a lease either (a dead worker's topics come back when its
+    leases expire) and no failed topic is back in it; with `wait`, it keeps polling for new topics. While
+    they are in flight a heartbeat renews their leases and settles finished
+    ones (stored or published -> done, failed -> back to the queue until
+    MAX_ATTEMPTS). Topics the job's tracker already has as finished, e.g.
+    when the worker that stored them died before settling, are settled
+    without being generated again. Leases still held on exit are given back.
+    """
+
+    def __init__(self, work_queue: WorkQueue, queue: str, tracker: JobTracker, publishing: bool = False,
+                 owner: str | None = None, claim_batch: int = CLAIM_BATCH, max_held: int = MAX_HELD,
+                 lease_seconds: float = LEASE_SECONDS, wait: bool = False, poll_interval: float = 5.0):
+        self.work_queue = work_queue
+        self.queue = queue
+        self.tracker = tracker
+        self.publishing = publishing
+        self.owner = owner or worker_id()
+        self.claim_batch = claim_batch
+        self.max_held = max(max_held, claim_batch)
+        self.lease_seconds = lease_seconds
+        self.wait = wait  # keep polling an empty queue instead of stopping
+        self.poll_interval = poll_interval
+        self._held = {}  # topic -> Lease
+        self._settled = []  # (lease, state, error) waiting for the next heartbeat
+        self._heartbeat_task = None
+        self._room = asyncio.Event()  # set whenever a held topic is settled
+        self._stopped = False
+        self.stats = {"claimed": 0, "done": 0, "requeued": 0, "lost": 0}
+
+    async def __aenter__(self):
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._heartbeat_task.cancel()
+        for lease in self._held.values():  # e.g. the run was interrupted
+            self._settled.append((lease, QUEUED, "worker stopped"))
+        self._held.clear()
+        await self.flush()
+
+    def stop(self):
+        """Claims nothing more; topics already claimed are finished."""
+        self._stopped = True
+
+    async def __aiter__(self):
+        while not self._stopped:
+            if len(self._held) + self.claim_batch > self.max_held:
+                self._room.clear()
+                await self._room.wait()
+                continue
+            leases = await asyncio.to_thread(self.work_queue.claim, self.queue, self.owner, self.claim_batch,
+                                             self.lease_seconds)
+            if not leases:
+                # Settles our own finished topics, so they no longer count as
+                # leased and the failed ones are back in the queue
+                await self.flush()
+                counts = await asyncio.to_thread(self.work_queue.counts, self.queue)
+                if counts.get(QUEUED):
+                    continue  # topics given back since the claim get their next attempt now
+                if not self.wait and not counts.get(LEASED):
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.stats["claimed"] += len(leases)
+            metrics.inc("work_queue_claims_total", len(leases))
+            todo = []
+            for lease in leases:
+                if await asyncio.to_thread(self._already_done, lease):
+                    self._settle(lease, DONE, None)
+                else:
+                    self._held[lease.topic] = lease  # held (and renewed) until settled or handed back
+                    todo.append(lease.topic)
+            for topic in todo:
+                yield topic
+
+    def _already_done(self, lease: Lease) -> bool:
+        if lease.attempts > 1 and not self.tracker.is_done(lease.topic, self.publishing):
+            # An earlier holder may have stored the article and died before recording it
+            self.tracker.adopt_stored(lease.topic, lease.enqueued_at)
+        return self.tracker.is_done(lease.topic, self.publishing)
+
+    def on_state(self, article, state: str, error: str | None):
+        """Pipeline state callback: settles the lease once the topic reached a final state."""
+        lease = self._held.get(article.topic)
+        if lease is None:
+            return
+        final = PUBLISHED if self.publishing else STORED
+        if state in (final, DUPLICATE):
+            del self._held[article.topic]
+            self._settle(lease, DONE, error)
+        elif state == FAILED:
+            del self._held[article.topic]
+            self._settle(lease, QUEUED, error)
+
+    def _settle(self, lease: Lease, state: str, error: str | None):
+        self._settled.append((lease, state, error))
+        self._room.set()
+        self.stats["done" if state == DONE else "requeued"] += 1
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.flush()
+
+    async def flush(self):
+        """Settles finished topics and renews the leases of the ones still in flight."""
+        settled, self._settled = self._settled, []
+        held = list(self._held.values())
+        await asyncio.to_thread(self.work_queue.finish, settled)
+        renewed = set(await asyncio.to_thread(self.work_queue.renew, held, self.lease_seconds))
+        for lease in held:
+            if lease not in renewed and self._held.get(lease.topic) == lease:
+                del self._held[lease.topic]
+                self.stats["lost"] += 1
+                print(f"   [Queue] Lease on '{lease.topic}' expired; another worker may take it over.")
+                self._room.set()
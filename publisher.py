@@ -0,0 +1,98 @@
+# File: /content_automation/publisher.py
+
+import argparse
+import asyncio
+import signal
+import time
+
+from modules.metrics import METRICS_PORT, metrics, start_metrics_server
+from modules.publish_outbox import (PUBLISHER_CLAIM_BATCH, PUBLISHER_CONCURRENCY, PUBLISHER_RPS, OutboxPublisher,
+                                    PublishOutbox)
+from modules.storage import DB_FILE
+
+
+async def run_publisher(db_file: str = DB_FILE, concurrency: int = PUBLISHER_CONCURRENCY, rps: float = PUBLISHER_RPS,
+                        claim_batch: int = PUBLISHER_CLAIM_BATCH, wait: bool = True,
+                        metrics_port: int | None = None) -> dict:
+    """Posts the articles of the publish outbox to WordPress as they fall due."""
+    from modules.wordpress_publisher import AsyncWordPressPublisher
+
+    outbox = await asyncio.to_thread(PublishOutbox, db_file)
+    wp_publisher = AsyncWordPressPublisher(max_parallel=concurrency)
+    daemon = OutboxPublisher(outbox, wp_publisher, concurrency=concurrency, rps=rps, claim_batch=claim_batch,
+                             wait=wait)
+
+    # Ctrl-C or SIGTERM stop claiming and let the batches in flight finish,
+    # so their articles are not posted again when the leases expire
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, daemon.stop)
+        except NotImplementedError:  # Windows
+            pass
+
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    print(f"--- Publisher draining the outbox of {db_file}: {concurrency} requests in flight, "
+          f"{rps:g} posts/s at most ---")
+    start_time = time.time()
+    try:
+        stats = await daemon.run()
+    finally:
+        await wp_publisher.aclose()
+        outbox.close()
+
+    print("-" * 50)
+    print(f"Publisher finished in {time.time() - start_time:.2f} seconds: claimed {stats['claimed']}, "
+          f"published {stats['published']}, to be retried {stats['retried']}, failed {stats['failed']}.")
+    return stats
+
+
+def print_status(db_file: str = DB_FILE):
+    outbox = PublishOutbox(db_file)
+    try:
+        counts = outbox.counts()
+        failures = outbox.failures(10)
+        next_due = outbox.next_due()
+    finally:
+        outbox.close()
+    print(f"Publish outbox: {sum(counts.values())} articles, "
+          + ", ".join(f"{state}: {count}" for state, count in sorted(counts.items())))
+    if next_due:
+        print(f"Next article due {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_due))}.")
+    for article_id, title, error in failures:
+        print(f"   failed: {article_id} '{title}': {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Publish the articles queued in the publish outbox to WordPress, at the site's pace. "
+                    "Runs until stopped; several publishers may share the database.")
+    parser.add_argument("--db", default=DB_FILE, help="article database (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=PUBLISHER_CONCURRENCY,
+                        help="batch requests in flight (default: %(default)s)")
+    parser.add_argument("--rps", type=float, default=PUBLISHER_RPS,
+                        help="posts per second at most, 0 for no limit (default: %(default)s)")
+    parser.add_argument("--claim-batch", type=int, default=PUBLISHER_CLAIM_BATCH, help="articles claimed at once")
+    parser.add_argument("--once", action="store_true", help="exit once nothing is due instead of waiting")
+    parser.add_argument("--status", action="store_true", help="only print how many articles are in each state")
+    parser.add_argument("--retry-failed", action="store_true", help="put failed articles back in the outbox")
+    parser.add_argument("--metrics-port", type=int, default=int(METRICS_PORT) if METRICS_PORT else None,
+                        help="serve metrics on this port")
+    args = parser.parse_args()
+
+    if args.retry_failed:
+        outbox = PublishOutbox(args.db)
+        try:
+            print(f"Requeued {outbox.retry_failed()} failed articles.")
+        finally:
+            outbox.close()
+    if not args.status and not args.retry_failed:
+        try:
+            asyncio.run(run_publisher(args.db, args.concurrency, args.rps, args.claim_batch, not args.once,
+                                      args.metrics_port))
+        except KeyboardInterrupt:
+            print("Publisher stopped.")
+        print(metrics.report())
+    print_status(args.db)
@@ -0,0 +1,123 @@
+# File: /content_automation/worker.py
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+
+from modules.dedup import open_dedup_index
+from modules.generation import (CONCURRENCY, MAX_CONCURRENCY, MIN_CONCURRENCY, REQUESTS_PER_MINUTE,
+                                TOKENS_PER_MINUTE, concurrency)
+from modules.job_state import JobTracker
+from modules.metrics import METRICS_PORT, metrics, start_metrics_server
+from modules.pipeline import ContentPipeline, wordpress_batch_publisher
+from modules.response_cache import get_response_cache
+from modules.work_queue import CLAIM_BATCH, LEASE_SECONDS, WORK_QUEUE_URL, QueueConsumer, open_work_queue, worker_id
+
+
+async def run_worker(queue: str, url: str = WORK_QUEUE_URL, publish: bool = False, wait: bool = False,
+                     claim_batch: int = CLAIM_BATCH, lease_seconds: float = LEASE_SECONDS,
+                     metrics_port: int | None = None) -> dict:
+    """Claims topics from the queue and runs them through the staged pipeline until the queue is drained."""
+    work_queue = await asyncio.to_thread(open_work_queue, url)
+    # Progress is recorded under the queue's name, shared by every worker of the queue
+    tracker = JobTracker(queue)
+    consumer = QueueConsumer(work_queue, queue, tracker, publishing=publish, claim_batch=claim_batch,
+                             lease_seconds=lease_seconds, wait=wait)
+
+    wp_publisher = None
+    publish_batch_size = None
+    if publish:
+        from modules.wordpress_publisher import PUBLISH_BATCH_SIZE, AsyncWordPressPublisher
+        wp_publisher = AsyncWordPressPublisher()
+        publish_batch_size = PUBLISH_BATCH_SIZE
+
+    dedup = await asyncio.to_thread(open_dedup_index)
+    pipeline = ContentPipeline(
+        consumer,
+        publisher=wordpress_batch_publisher(wp_publisher) if wp_publisher else None,
+        publish_batch_size=publish_batch_size,
+        tracker=tracker,
+        resume=True,  # stored-but-unpublished topics only need publishing
+        on_state=consumer.on_state,
+        dedup=dedup,
+    )
+
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    print(f"--- Worker {consumer.owner} consuming '{queue}' from {url} ---")
+    start_time = time.time()
+    try:
+        async with consumer:
+            stats = await pipeline.run()
+    finally:
+        if wp_publisher:
+            await wp_publisher.aclose()
+        work_queue.close()
+
+    print("-" * 50)
+    print(f"Worker {consumer.owner} finished in {time.time() - start_time:.2f} seconds: "
+          f"claimed {consumer.stats['claimed']}, done {consumer.stats['done']}, "
+          f"given back {consumer.stats['requeued']}, leases lost {consumer.stats['lost']}.")
+    print(f"Generated: {stats['generated']}, stored: {stats['stored']}, published: {stats['published']}, "
+          f"failed: {stats['failed']}, near-duplicates: {stats['duplicates']}.")
+    print(f"Gemini concurrency settled at {concurrency.snapshot()['limit']} in-flight requests.")
+    cache = get_response_cache()
+    if cache:
+        cache_stats = cache.stats()
+        print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses.")
+    return stats
+
+
+def _share_gemini_quota(processes: int):
+    """
+    Gives each worker process started here its share of the API key's quota.
+    Every process has its own rate limiter, so each would otherwise use the
+    whole of GEMINI_RPM / GEMINI_TPM / GEMINI_MAX_CONCURRENCY. Spawned
+    processes read these settings when they import modules.generation, from
+    the environment inherited from this one (.env values included).
+    """
+    max_concurrency = max(MIN_CONCURRENCY, MAX_CONCURRENCY // processes)
+    os.environ["GEMINI_RPM"] = str(max(1, REQUESTS_PER_MINUTE // processes))
+    os.environ["GEMINI_TPM"] = str(max(1, TOKENS_PER_MINUTE // processes))
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(max_concurrency)
+    os.environ["GEMINI_CONCURRENCY"] = str(min(CONCURRENCY, max_concurrency))
+    print(f"--- Each process gets {os.environ['GEMINI_RPM']} requests and {os.environ['GEMINI_TPM']} tokens "
+          f"per minute, up to {max_concurrency} in flight ---")
+
+
+def _worker_process(args, index: int):
+    # Each process serves metrics on its own port
+    port = args.metrics_port + index if args.metrics_port else None
+    asyncio.run(run_worker(args.queue, args.url, args.publish, args.wait, args.claim_batch, args.lease, port))
+    print(metrics.report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate articles for topics claimed from a shared work queue (see coordinator.py). "
+                    "Start as many workers as you like, on this machine or others sharing the queue.")
+    parser.add_argument("--queue", default="topics.xlsx:Topics", help="queue to consume (default: %(default)s)")
+    parser.add_argument("--url", default=WORK_QUEUE_URL, help="work queue location (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start on this machine")
+    parser.add_argument("--publish", action="store_true", help="also publish every stored article to WordPress")
+    parser.add_argument("--wait", action="store_true", help="keep polling for new topics instead of exiting")
+    parser.add_argument("--claim-batch", type=int, default=CLAIM_BATCH, help="topics claimed at once")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease length in seconds")
+    parser.add_argument("--metrics-port", type=int, default=int(METRICS_PORT) if METRICS_PORT else None,
+                        help="serve metrics on this port (process n uses port + n)")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _worker_process(args, 0)
+    else:
+        print(f"--- Starting {args.processes} worker processes on {worker_id().split(':')[0]} ---")
+        _share_gemini_quota(args.processes)
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_worker_process, args=(args, index)) for index in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()